@@ -1,7 +1,15 @@
 from src.utils import Config, setup_logger, UserManager
-from src.storage import KVStore
-from src.slack import SlackClient, MessageFormatter
-from src.github import GitHubClient, GitHubWebhookHandler, CodeContextExtractor
+from src.storage import KVStore, KVError
+from src.slack import MessageFormatter, SlackOutbox, create_slack_client
+from src.github import (GitHubWebhookHandler, CodeContextExtractor, SnippetCache,
+                        create_github_client, get_snippet_cache)
+from src.utils.resilience import CircuitOpenError
+from src.utils.admission import (AdmissionRejected, get_admission_controller,
+                                 REPLY, COMMENT, REVIEW, BACKGROUND)
+from src.utils.profiler import profile_requests
+from src.utils.deadline import clear_deadline, start_deadline, has_budget
+from src.utils.background import run_ordered
+from src.utils.recent_ids import RecentIds
 from api.webhook_request import WebhookRequest
 import json
 import sys
@@ -12,17 +20,32 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 logger = setup_logger()
 config = Config()
+snippet_cache = get_snippet_cache(config)
+admission = get_admission_controller(config)
+recent_deliveries = RecentIds()
 
 
 class handler(WebhookRequest):
+    SOURCE = 'github'
+
     PULL_REQUEST_REVIEW_COMMENT = 'pull_request_review_comment'
     PULL_REQUEST_REVIEW = 'pull_request_review'
+    PULL_REQUEST = 'pull_request'
     PING = 'ping'
 
+    PR_METADATA_ACTIONS = ('opened', 'reopened', 'synchronize', 'edited', 'closed',
+                           'ready_for_review', 'converted_to_draft')
+    # GitHub lets a delivery be redelivered for three days
+    DELIVERY_CLAIM_TTL = 3 * 24 * 60 * 60
+
+    claimed_delivery = None
+
+    @profile_requests('github_webhook')
     def do_POST(self):
+        start_deadline(config.request_budget_seconds)
+        admitted = False
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            payload_bytes = self.rfile.read(content_length)
+            payload_bytes = self.read_body()
 
             signature = self.headers.get('X-Hub-Signature-256', '')
             event_type = self.headers.get('X-GitHub-Event', '')
@@ -34,15 +57,35 @@ class handler(WebhookRequest):
                 self.response(401, 'Error', 'Invalid signature')
                 return
 
-            payload = json.loads(payload_bytes.decode('utf-8'))
-
-            logger.info(f'Received GitHub webhook: {event_type}')
+            logger.info('Received GitHub webhook: %s', event_type)
 
             if event_type == self.PING:
                 self.response(200, 'pong')
                 return
 
-            # Early exit: Check if PR author is registered before any processing
+            # Redeliveries and events that reached two instances share the
+            # delivery GUID, so they are turned away before any decoding
+            kv_store = KVStore.from_config(config)
+            delivery_id = self.headers.get('X-GitHub-Delivery', '')
+            if delivery_id and not self.claim_delivery(kv_store, delivery_id):
+                self.response(200, f'Delivery {delivery_id} already received')
+                return
+
+            payload = json.loads(payload_bytes.decode('utf-8'))
+
+            # Everything past this point talks to KV, GitHub or Slack, so it
+            # counts against the instance's concurrency limit
+            admission.acquire(self.priority(event_type, payload))
+            admitted = True
+
+            # PR lifecycle events keep the open-PR index current for every
+            # author, registered or not, so it is complete when they register
+            if event_type == self.PULL_REQUEST:
+                self.handle_pull_request(
+                    kv_store, webhook_handler.parse_pull_request(payload))
+                return
+
+            # Early exit: Check if anyone to notify is registered before any processing
             # This avoids unnecessary webhook parsing, KV lookups, and GitHub API calls
             pr_author = payload.get('pull_request', {}).get(
                 'user', {}).get('login', '')
@@ -51,169 +94,73 @@ class handler(WebhookRequest):
                 self.response(200, 'No PR author, skipping')
                 return
 
-            # Initialize only KV store and user manager for registration check
-            kv_store = KVStore(config.kv_rest_api_url,
-                               config.kv_rest_api_token)
+            # Author, reviewers, assignees and, for a follow-up, the earlier
+            # participants of its thread, resolved in one round trip
             user_manager = UserManager(kv_store)
 
-            slack_user_id = user_manager.get_slack_user_id(pr_author)
-            if not slack_user_id:
-                self.response(200, 'User not registered, skipping')
+            thread_root = None
+            if event_type == self.PULL_REQUEST_REVIEW_COMMENT and 'participants' in config.notify_roles:
+                thread_root = (payload.get('comment') or {}).get('in_reply_to_id')
+            recipients = user_manager.resolve_recipients(
+                webhook_handler.notify_logins(payload, config.notify_roles),
+                exclude=webhook_handler.actor(payload), thread_root=thread_root)
+            if not recipients:
+                self.response(200, 'No registered recipients, skipping')
                 return
 
-            # User is registered, proceed with full processing
-            logger.info(
-                f'Processing event for registered user: GitHub={pr_author}, Slack={slack_user_id}')
-
-            github_client = GitHubClient(
-                config.github_app_id,
-                config.github_private_key
-            )
-            slack_client = SlackClient(config.slack_bot_token)
-            code_extractor = CodeContextExtractor()
+            # Someone is registered, proceed with full processing
+            logger.info('Processing event for %s registered user(s): %s',
+                        len(recipients), ', '.join(recipients.values()))
 
             if event_type == self.PULL_REQUEST_REVIEW_COMMENT:
-                comment_data = webhook_handler.parse_review_comment(payload)
-                if not comment_data:
+                event_data = webhook_handler.parse_review_comment(payload)
+                if not event_data:
                     self.response(
                         code=200,
                         message='Comment ignored',
                         should_log=False
                     )
                     return
-
-                comment_id = comment_data['comment_id']
-                if kv_store.is_processed('comment', str(comment_id)):
-                    self.response(
-                        200,
-                        f'Comment {comment_id} already processed'
-                    )
-                    return
-
-                logger.info(f'Notifying registered user about new comment')
-
-                installation_id = comment_data['installation_id']
-                repo_full_name = comment_data['repo_full_name']
-                file_path = comment_data.get('file_path', '')
-                commit_id = comment_data.get('commit_id', '')
-                line = comment_data.get('line', 0)
-
-                file_content = ''
-                if file_path and commit_id:
-                    file_content = github_client.get_file_content(
-                        installation_id, repo_full_name, file_path, commit_id
-                    )
-
-                context = None
-                if file_content and line:
-                    context = code_extractor.extract_from_file(
-                        file_content, line)
-                elif comment_data.get('diff_hunk'):
-                    context = code_extractor.extract_from_diff(
-                        comment_data['diff_hunk'], line
-                    )
-
-                code_context = ''
-                if context:
-                    code_context = code_extractor.format_for_slack(
-                        context, file_path)
-
-                blocks, text = MessageFormatter.format_review_comment(
-                    comment_data, code_context
-                )
-
-                slack_response = slack_client.send_dm(
-                    slack_user_id,
-                    blocks,
-                    text
-                )
-
-                if slack_response:
-                    thread_ts = slack_response.get(
-                        'message_ts') or slack_response.get('ts')
-
-                    logger.info(
-                        f'Slack response: thread_ts={thread_ts}, channel={slack_response.get("channel")}')
-
-                    comment_saved = kv_store.save_comment_mapping(comment_id, {
-                        'channel': slack_response['channel'],
-                        'thread_ts': thread_ts,
-                        'message_ts': slack_response.get('ts')
-                    })
-
-                    thread_saved = kv_store.save_thread_mapping(thread_ts, {
-                        'comment_id': comment_id,
-                        'installation_id': installation_id,
-                        'repo_full_name': repo_full_name,
-                        'pr_number': comment_data['pr_number'],
-                        'type': 'review_comment'
-                    })
-
-                    if not comment_saved or not thread_saved:
-                        logger.error(
-                            f'KV save failed: comment_saved={comment_saved}, thread_saved={thread_saved}')
-
-                    kv_store.save_last_processed('comment', str(comment_id))
-
-                    self.response(
-                        200,
-                        f'Forwarded comment {comment_id} to Slack (mappings saved: {comment_saved and thread_saved})'
-                    )
-                    return
-                else:
-                    self.response(
-                        500,
-                        'Error',
-                        'Failed to send to Slack',
-                    )
-                    return
+                process = self.process_review_comment
 
             elif event_type == self.PULL_REQUEST_REVIEW:
-                review_data = webhook_handler.parse_review(payload)
-                if not review_data:
+                event_data = webhook_handler.parse_review(payload)
+                if not event_data:
                     self.response(
                         200,
                         'Review ignored',
                         should_log=False
                     )
                     return
+                process = self.process_review
 
-                review_id = review_data['review_id']
-                if kv_store.is_processed('review', str(review_id)):
-                    self.response(
-                        200,
-                        f'Review {review_id} already processed'
-                    )
-                    return
-
-                logger.info(f'Notifying registered user about new review')
-
-                blocks, text = MessageFormatter.format_review(review_data)
+            else:
+                self.response(200, 'Event processed', should_log=False)
+                return
 
-                slack_response = slack_client.send_dm(
-                    slack_user_id,
-                    blocks,
-                    text
-                )
+            if not config.github_async_processing:
+                self.response(*process(kv_store, recipients, event_data))
+                return
 
-                if slack_response:
-                    processed_saved = kv_store.save_last_processed(
-                        'review', str(review_id))
+            # Acknowledge and process out of band. Events on one PR go to the
+            # same worker and are handled in delivery order, so a follow-up
+            # never overtakes the comment whose Slack thread it goes into.
+            # The admission slot is released by process_admitted
+            self.response(202, 'Event accepted')
+            admitted = False
+            run_ordered((event_data['repo_full_name'], event_data['pr_number']), self.process_admitted,
+                        process, kv_store, recipients, event_data,
+                        budget=config.request_budget_seconds)
+            return
 
-                    self.response(
-                        200,
-                        f'Forwarded review {review_id} to Slack (processed saved: {processed_saved})'
-                    )
-                    return
-                else:
-                    self.response(
-                        500,
-                        'Error',
-                        'Failed to send to Slack'
-                    )
-                    return
+        except AdmissionRejected as e:
+            self.shed(e)
+            return
 
-            self.response(200, 'Event processed', should_log=False)
+        except (KVError, CircuitOpenError) as e:
+            # A dependency is down or failing fast: report it as unavailable
+            # rather than as a bug in the request
+            self.response(503, 'Error', str(e))
             return
 
         except Exception as e:
@@ -223,3 +170,277 @@ class handler(WebhookRequest):
                 str(e),
             )
             return
+
+        finally:
+            if admitted:
+                admission.release()
+            # Failed or shed deliveries stay eligible for redelivery
+            if self.claimed_delivery and (self.response_code is None or self.response_code == 429
+                                          or self.response_code >= 500):
+                self.release_delivery(kv_store, self.claimed_delivery)
+
+    def claim_delivery(self, kv_store, delivery_id):
+        # The ring answers repeats on this instance without a round trip;
+        # the atomic KV claim catches the ones another instance took
+        if not recent_deliveries.add(delivery_id):
+            return False
+        try:
+            claimed = kv_store.claim_processed('delivery', delivery_id, ttl=self.DELIVERY_CLAIM_TTL)
+        except KVError as e:
+            # The per-comment and per-review checks still catch duplicates
+            logger.warning('Could not claim delivery %s: %s', delivery_id, e)
+            claimed = True
+        except Exception:
+            # Left in the ring, GitHub's redelivery would be dropped as a
+            # repeat of a delivery that was never handled
+            recent_deliveries.discard(delivery_id)
+            raise
+        if claimed:
+            self.claimed_delivery = delivery_id
+        return claimed
+
+    def release_delivery(self, kv_store, delivery_id):
+        # The response is already sent and the budget may be spent; the
+        # release runs without the request's deadline, bounded by the
+        # store's own timeouts
+        recent_deliveries.discard(delivery_id)
+        clear_deadline()
+        kv_store.release_processed('delivery', delivery_id)
+
+    @classmethod
+    def priority(cls, event_type, payload):
+        # Classified from the payload alone, before any lookup: follow-ups
+        # in a conversation first, then new comments, then reviews. PR
+        # lifecycle updates and actions that are ignored anyway go last
+        action = payload.get('action')
+        if event_type == cls.PULL_REQUEST_REVIEW_COMMENT and action == 'created':
+            if (payload.get('comment') or {}).get('in_reply_to_id'):
+                return REPLY
+            return COMMENT
+        if event_type == cls.PULL_REQUEST_REVIEW and action == 'submitted':
+            return REVIEW
+        return BACKGROUND
+
+    def process_admitted(self, process, kv_store, recipients, event_data):
+        try:
+            result = process(kv_store, recipients, event_data)
+            self.log(*result[1:])
+        finally:
+            admission.release()
+
+    def process_review_comment(self, kv_store, recipients, comment_data):
+        # Returns the response as (code, message[, error]); the caller sends
+        # it, or only logs it when the event was acknowledged already.
+        # recipients maps each Slack user to notify to their GitHub login
+        code_extractor = CodeContextExtractor()
+
+        comment_id = comment_data['comment_id']
+        root_comment_id = comment_data.get('in_reply_to_id')
+        deliveries = []
+        pending = recipients
+        if root_comment_id:
+            notified, threads = kv_store.get_reply_state(comment_id, root_comment_id)
+            pending = self.pending(recipients, notified)
+            if not pending:
+                return 200, f'Comment {comment_id} already processed'
+            # Recipients with a Slack thread for the comment it replies to
+            # get it there; the others get it as a conversation of their
+            # own, which becomes their thread for the rest of this one
+            deliveries = self.reply_deliveries(comment_data, pending, threads)
+            threaded = {mapping['recipient'] for _, _, mapping in deliveries}
+            pending = {user: login for user, login in pending.items() if user not in threaded}
+
+        if pending:
+            notified, pr_metadata = kv_store.get_comment_state(
+                comment_id, comment_data['repo_full_name'], comment_data['pr_number'])
+            if not root_comment_id:
+                pending = self.pending(recipients, notified)
+                if not pending:
+                    return 200, f'Comment {comment_id} already processed'
+            deliveries += self.comment_deliveries(kv_store, code_extractor, comment_data,
+                                                  pending, pr_metadata)
+
+        outbox = SlackOutbox.from_config(config, kv_store, create_slack_client(config))
+        return self.fan_out(outbox, f'comment {comment_id}', deliveries)
+
+    def comment_deliveries(self, kv_store, code_extractor, comment_data, pending, pr_metadata):
+        # Rendered once, whatever the number of recipients
+        logger.info('Notifying %s registered user(s) about new comment', len(pending))
+
+        installation_id = comment_data['installation_id']
+        repo_full_name = comment_data['repo_full_name']
+        file_path = comment_data.get('file_path', '')
+        commit_id = comment_data.get('commit_id', '') or (pr_metadata or {}).get('head_sha')
+        line = comment_data.get('line', 0)
+
+        # Reviewers often comment on the same region of a commit, so the
+        # rendered block is looked up before fetching anything
+        snippet_key = None
+        code_context = None
+        if file_path and commit_id and line:
+            snippet_key = SnippetCache.key(repo_full_name, commit_id, file_path, line,
+                                           code_extractor.context_lines)
+            code_context = snippet_cache.get(snippet_key, kv_store)
+
+        # Fetching the file is optional: the diff hunk is a usable fallback
+        # when the request budget is running low, and the only context for a
+        # file the PR deletes, which comes back without content
+        file_content = ''
+        if (code_context is None and file_path and commit_id
+                and has_budget(config.code_context_min_budget)):
+            github_client = create_github_client(config)
+            try:
+                file_content = github_client.get_file_content(
+                    installation_id, repo_full_name, file_path, commit_id
+                )
+            except Exception as e:
+                logger.warning('Could not fetch %s for code context, using diff hunk: %s',
+                               file_path, e)
+
+        if code_context is None:
+            context = None
+            if file_content and line:
+                context = code_extractor.extract_from_file(
+                    file_content, line)
+            elif comment_data.get('diff_hunk'):
+                context = code_extractor.extract_from_diff(
+                    comment_data['diff_hunk'], line
+                )
+
+            code_context = ''
+            if context:
+                code_context = code_extractor.format_for_slack(
+                    context, file_path)
+
+            # Only blocks rendered from the file at that commit are cached;
+            # the diff hunk fallback is not the same window
+            if file_content and snippet_key:
+                snippet_cache.put(snippet_key, code_context, kv_store)
+
+        blocks, text = MessageFormatter.format_review_comment(
+            comment_data, code_context
+        )
+
+        # The conversation is only recorded once Slack has the message; until
+        # then the comment waits in the outbox and is not seen as forwarded
+        comment_id = comment_data['comment_id']
+        github_data = {
+            'comment_id': comment_id,
+            'installation_id': installation_id,
+            'repo_full_name': repo_full_name,
+            'pr_number': comment_data['pr_number'],
+            'type': 'review_comment'
+        }
+        return [(f'comment:{comment_id}:{slack_user_id}',
+                 SlackOutbox.direct_message(slack_user_id, blocks, text),
+                 SlackOutbox.conversation(comment_id, github_data, recipient=slack_user_id,
+                                          participant=comment_data['comment_author'],
+                                          thread_root=comment_data.get('in_reply_to_id')))
+                for slack_user_id in pending]
+
+    def process_review(self, kv_store, recipients, review_data):
+        review_id = review_data['review_id']
+        pending = self.pending(recipients, kv_store.get_review_state(review_id))
+        if not pending:
+            return 200, f'Review {review_id} already processed'
+
+        logger.info('Notifying %s registered user(s) about new review', len(pending))
+
+        blocks, text = MessageFormatter.format_review(review_data)
+
+        outbox = SlackOutbox.from_config(config, kv_store, create_slack_client(config))
+        return self.fan_out(outbox, f'review {review_id}', [
+            (f'review:{review_id}:{slack_user_id}',
+             SlackOutbox.direct_message(slack_user_id, blocks, text),
+             SlackOutbox.processed('review', str(review_id), recipient=slack_user_id))
+            for slack_user_id in pending])
+
+    def reply_deliveries(self, comment_data, pending, threads):
+        # A follow-up goes into each recipient's Slack thread of the comment
+        # it answers: one chat.postMessage, no conversations.open and no
+        # code context. A thread recorded before recipients were tracked is
+        # the PR author's
+        comment_id = comment_data['comment_id']
+        blocks, text = MessageFormatter.format_review_comment_reply(comment_data)
+        github_data = {
+            'comment_id': comment_id,
+            'installation_id': comment_data['installation_id'],
+            'repo_full_name': comment_data['repo_full_name'],
+            'pr_number': comment_data['pr_number'],
+            'type': 'review_comment'
+        }
+
+        deliveries = []
+        for slack_user_id, login in pending.items():
+            thread = threads.get(slack_user_id)
+            if thread is None and login == comment_data['pr_author']:
+                thread = threads.get('')
+            if thread is None:
+                continue
+            deliveries.append((
+                f'comment:{comment_id}:{slack_user_id}',
+                SlackOutbox.thread_message(thread['channel'], thread['thread_ts'], blocks, text),
+                SlackOutbox.conversation(comment_id, github_data, recipient=slack_user_id,
+                                         participant=comment_data['comment_author'],
+                                         thread_root=comment_data['in_reply_to_id'], new_thread=False)))
+        return deliveries
+
+    @staticmethod
+    def pending(recipients, notified):
+        # notified is None for an event handled before recipients were
+        # tracked, which counts as delivered to everyone
+        if notified is None:
+            return {}
+        return {slack_user_id: login for slack_user_id, login in recipients.items()
+                if slack_user_id not in notified}
+
+    @staticmethod
+    def fan_out(outbox, event, deliveries):
+        results, queued, mappings_saved = outbox.deliver_all(deliveries)
+        sent = sum(1 for slack_data in results if slack_data is not None)
+        if queued:
+            return (202, f'Forwarded {event} to {sent} recipient(s), '
+                         f'Slack unavailable for {queued}, queued for delivery')
+        refused = len(results) - sent
+        if refused:
+            # Redelivering the event would be refused the same way
+            return 200, f'Forwarded {event} to {sent} recipient(s), refused by Slack for {refused}'
+        return 200, f'Forwarded {event} to {sent} recipient(s) (mappings saved: {mappings_saved})'
+
+    def handle_pull_request(self, kv_store, pr_data):
+        if not pr_data or not pr_data['pr_author']:
+            self.response(200, 'Pull request ignored', should_log=False)
+            return
+
+        action = pr_data['action']
+        if action not in self.PR_METADATA_ACTIONS:
+            self.response(200, f'Pull request {action} ignored', should_log=False)
+            return
+
+        author = pr_data['pr_author']
+        repo_full_name = pr_data['repo_full_name']
+        pr_number = pr_data['pr_number']
+
+        # edited rewrites an open PR's index entry, so the prs command lists
+        # a renamed PR under its new title
+        saved = True
+        if action in ('opened', 'reopened') or (action == 'edited' and pr_data['state'] == 'open'):
+            saved = kv_store.add_open_pr(author, {
+                'repo': repo_full_name,
+                'number': pr_number,
+                'title': pr_data['pr_title'],
+                'html_url': pr_data['pr_url']
+            })
+        elif action == 'closed':
+            saved = kv_store.remove_open_pr(author, repo_full_name, pr_number)
+
+        # Every handled action replaces the cached metadata with the facts in
+        # this payload, which invalidates whatever synchronize or edited made
+        # stale
+        saved = kv_store.save_pr_metadata(repo_full_name, pr_number, pr_data['metadata']) and saved
+        if not saved:
+            self.response(503, 'Error', 'Failed to update pull request cache')
+            return
+
+        self.response(
+            200, f'Pull request {repo_full_name}#{pr_number} {action} recorded')
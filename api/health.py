@@ -6,10 +6,18 @@ import os
 class handler(BaseHTTPRequestHandler):
     def do_GET(self):
         try:
+            storage_backend = os.environ.get('STORAGE_BACKEND', 'upstash').lower()
+            storage_configured = {
+                'upstash': bool(os.environ.get('KV_REST_API_URL')),
+                'redis': bool(os.environ.get('REDIS_URL')),
+                'sqlite': True,
+                'memory': True,
+            }.get(storage_backend, False)
+
             checks = {
                 'github_configured': bool(os.environ.get('GITHUB_APP_ID')),
                 'slack_configured': bool(os.environ.get('SLACK_BOT_TOKEN')),
-                'storage_configured': bool(os.environ.get('KV_REST_API_URL')),
+                'storage_configured': storage_configured,
             }
 
             env_vars = {
@@ -24,6 +32,11 @@ class handler(BaseHTTPRequestHandler):
                 'KV_REST_API_URL': bool(os.environ.get('KV_REST_API_URL')),
                 'KV_REST_API_TOKEN': bool(os.environ.get('KV_REST_API_TOKEN')),
             }
+            if storage_backend == 'redis':
+                env_vars['REDIS_URL'] = bool(os.environ.get('REDIS_URL'))
+            if storage_backend != 'upstash':
+                del env_vars['KV_REST_API_URL']
+                del env_vars['KV_REST_API_TOKEN']
 
             all_healthy = all(checks.values())
 
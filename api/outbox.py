@@ -0,0 +1,40 @@
+from src.utils import Config, setup_logger
+from src.storage import KVStore, KVError
+from src.slack import SlackOutbox, create_slack_client
+from src.utils.deadline import start_deadline
+from api.webhook_request import WebhookRequest
+import hmac
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+logger = setup_logger()
+config = Config()
+
+
+# Replays the Slack outbox; meant to be called on a schedule (a Vercel cron
+# job or any scheduler) with CRON_SECRET as the bearer token
+class handler(WebhookRequest):
+    def do_GET(self):
+        start_deadline(config.request_budget_seconds)
+        try:
+            secret = config.cron_secret
+            authorization = self.headers.get('Authorization', '')
+            if not secret or not hmac.compare_digest(authorization, f'Bearer {secret}'):
+                self.response(401, 'Error', 'Unauthorized')
+                return
+
+            outbox = SlackOutbox.from_config(config, KVStore.from_config(config),
+                                             create_slack_client(config))
+            # The lease outlives the request only briefly if it is cut off
+            stats = outbox.replay(config.outbox_batch_size,
+                                  lease_ttl=int(config.request_budget_seconds) + 5)
+            self.response(200, 'Outbox replayed', payload={'message': 'Outbox replayed', **stats})
+
+        except KVError as e:
+            self.response(503, 'Error', str(e))
+
+        except Exception as e:
+            self.response(500, 'Error', str(e))
@@ -1,7 +1,12 @@
 from src.utils import Config, setup_logger, UserManager
-from src.storage import KVStore
-from src.slack import SlackClient, SlackWebhookHandler
-from src.github import GitHubClient
+from src.storage import KVStore, KVError
+from src.slack import SlackWebhookHandler, MessageFormatter, create_slack_client
+from src.github import create_github_client
+from src.utils.resilience import CircuitOpenError
+from src.utils.admission import AdmissionRejected, get_admission_controller, REPLY, COMMENT
+from src.utils.profiler import profile_requests
+from src.utils.deadline import clear_deadline, start_deadline
+from src.utils.background import run_in_background, run_ordered
 from api.webhook_request import WebhookRequest
 import json
 import sys
@@ -12,21 +17,29 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 logger = setup_logger()
 config = Config()
+admission = get_admission_controller(config)
 
 
 class handler(WebhookRequest):
+    SOURCE = 'slack'
+
     EVENT_TYPE_COMMAND = 'command'
     EVENT_TYPE_THREAD_REPLY = 'thread_reply'
 
     COMMAND_REGISTER = 'register'
     COMMAND_UNREGISTER = 'unregister'
     COMMAND_STATUS = 'status'
+    COMMAND_PRS = 'prs'
     COMMAND_HELP = 'help'
 
+    claimed_event = None
+
+    @profile_requests('slack_webhook')
     def do_POST(self):
+        start_deadline(config.request_budget_seconds)
+        admitted = False
         try:
-            content_length = int(self.headers.get('Content-Length', 0))
-            payload_bytes = self.rfile.read(content_length)
+            payload_bytes = self.read_body()
             payload = json.loads(payload_bytes.decode('utf-8'))
 
             # Handle URL verification challenge first (before signature check)
@@ -52,151 +65,238 @@ class handler(WebhookRequest):
                 self.response(200, 'Event ignored', should_log=False)
                 return
 
-            if event_data['type'] == self.EVENT_TYPE_COMMAND:
-                slack_client = SlackClient(config.slack_bot_token)
-                kv_store = KVStore(config.kv_rest_api_url,
-                                   config.kv_rest_api_token)
-                user_manager = UserManager(kv_store)
-
-                user_id = event_data['user']
-                channel = event_data['channel']
-                text = event_data['text'].strip()
-                parts = text.split(maxsplit=1)
-                command = parts[0].lower()
-
-                if command == self.COMMAND_REGISTER:
-                    if len(parts) < 2:
-                        slack_client.send_dm(
-                            user_id, None, '❌ Usage: `register <github_username>`')
-                    else:
-                        github_username = parts[1].strip()
-                        if user_manager.register_user(user_id, github_username):
-                            slack_client.send_dm(
-                                user_id, None, f'✅ Registered! You will receive PR notifications for GitHub user: `{github_username}`')
-                        else:
-                            slack_client.send_dm(
-                                user_id, None, '❌ Registration failed. Please try again.')
-
-                elif command == self.COMMAND_UNREGISTER:
-                    if user_manager.unregister_user(user_id):
-                        slack_client.send_dm(
-                            user_id, None, '✅ Unregistered successfully. You will no longer receive PR notifications.')
-                    else:
-                        slack_client.send_dm(
-                            user_id, None, '❌ You are not registered.')
-
-                elif command == self.COMMAND_STATUS:
-                    user_data = user_manager.get_user_by_slack(user_id)
-                    if user_data:
-                        github_username = user_data.get(
-                            'github_username', 'Unknown')
-                        slack_client.send_dm(
-                            user_id, None, f'✅ Registered\n📝 GitHub: `{github_username}`\n💬 Slack: `{user_id}`')
-                    else:
-                        slack_client.send_dm(
-                            user_id, None, '❌ Not registered\n\nSend `register <github_username>` to get started!')
-
-                elif command == self.COMMAND_HELP:
-                    help_text = (
-                        '🦜 **PR Marites Commands**\n\n'
-                        '• `register <github_username>` - Start receiving PR notifications\n'
-                        '• `unregister` - Stop receiving notifications\n'
-                        '• `status` - Check your registration status\n'
-                        '• `help` - Show this help message\n\n'
-                        'After registering, you\'ll receive DMs when someone comments on your PRs!'
-                    )
-                    slack_client.send_dm(user_id, None, help_text)
+            if event_data['type'] not in (self.EVENT_TYPE_COMMAND, self.EVENT_TYPE_THREAD_REPLY):
+                self.response(200, 'Event processed', should_log=False)
+                return
 
-                else:
-                    slack_client.send_dm(
-                        user_id, None, f'❓ Unknown command: `{command}`\n\nSend `help` for available commands.')
+            # Admitted before the event is claimed, so a shed event is
+            # redelivered by Slack rather than dropped as a duplicate. Thread
+            # replies carry a conversation and go ahead of commands
+            priority = REPLY if event_data['type'] == self.EVENT_TYPE_THREAD_REPLY else COMMENT
+            admission.acquire(priority)
+            admitted = True
 
-                self.response(200, 'Command processed')
+            kv_store = KVStore.from_config(config)
+
+            event_id = payload.get('event_id', '')
+            retry_num = self.headers.get('X-Slack-Retry-Num')
+            if event_id and not self.claim_event(kv_store, event_id, retry_num):
+                self.response(200, f'Event {event_id} already received')
+                return
+
+            if not config.slack_async_processing:
+                # Processed before the acknowledgement, so nothing is left
+                # running once the response is sent; serverless runtimes
+                # freeze the process then. Slack redelivers events it has
+                # not seen acknowledged within 3 seconds: a retry that comes
+                # while this one is still processing finds the event claimed
+                # and is acknowledged as a duplicate, and one that follows a
+                # failure finds the claim released and processes it
+                self.process_event(kv_store, event_data)
+                self.response(200, 'Event processed')
                 return
 
+            # Long-running servers acknowledge first and process on a
+            # background worker, which holds the admission slot until
+            # process_admitted releases it
+            self.response(200, 'Event accepted')
+            admitted = False
             if event_data['type'] == self.EVENT_TYPE_THREAD_REPLY:
-                github_client = GitHubClient(
-                    config.github_app_id,
-                    config.github_private_key
-                )
-                slack_client = SlackClient(config.slack_bot_token)
-                kv_store = KVStore(config.kv_rest_api_url,
-                                   config.kv_rest_api_token)
-                user_manager = UserManager(kv_store)
-
-                thread_ts = event_data['thread_ts']
-                user_id = event_data['user']
-                text = event_data['text']
-
-                # Check if user is registered
-                user_data = user_manager.get_user_by_slack(user_id)
+                # Replies in one thread are posted to GitHub in the order
+                # they were written
+                run_ordered((event_data['channel'], event_data['thread_ts']), self.process_admitted,
+                            kv_store, event_data, budget=config.request_budget_seconds)
+            else:
+                run_in_background(self.process_admitted, kv_store, event_data,
+                                  budget=config.request_budget_seconds)
+            return
+
+        except AdmissionRejected as e:
+            self.shed(e)
+            return
 
-                if not user_data:
-                    self.response(200, 'User not registered', should_log=False)
-                    return
-
-                logger.info(
-                    f'Processing reply from registered user: Slack={user_id}, GitHub={user_data["github_username"]}')
-
-                github_data = kv_store.get_thread_mapping(thread_ts)
-
-                if not github_data:
-                    self.response(200, 'No GitHub mapping found',
-                                  should_log=False)
-                    return
-
-                if github_data['type'] != 'review_comment':
-                    self.response(
-                        200, 'Not a review comment thread', should_log=False)
-                    return
-
-                installation_id = github_data['installation_id']
-                repo_full_name = github_data['repo_full_name']
-                comment_id = github_data['comment_id']
-                pr_number = github_data['pr_number']
-
-                # Format reply with user attribution
-                github_username = user_data['github_username']
-                formatted_text = f"**@{github_username}:**\n\n{text}"
-
-                try:
-                    result = github_client.post_comment_reply(
-                        installation_id,
-                        repo_full_name,
-                        pr_number,
-                        comment_id,
-                        formatted_text
-                    )
-
-                    slack_client.add_reaction(
-                        event_data['channel'],
-                        event_data['ts'],
-                        'white_check_mark'
-                    )
-
-                    logger.info(f'Posted reply to GitHub comment {comment_id}')
-                    self.response(200, should_log=False, payload={
-                        'message': 'Reply posted to GitHub',
-                        'github_comment_id': result['id']
-                    })
-                    return
-
-                except Exception as e:
-                    logger.error(
-                        f'Error posting to GitHub: {e}', exc_info=True)
-
-                    slack_client.add_reaction(
-                        event_data['channel'],
-                        event_data['ts'],
-                        'x'
-                    )
-
-                    self.response(500, 'Error', 'Failed to post to GitHub')
-                    return
-
-            self.response(200, 'Event processed', should_log=False)
+        except (KVError, CircuitOpenError) as e:
+            # A dependency is down or failing fast: report it as unavailable
+            # rather than as a bug in the request
+            self.response(503, 'Error', str(e))
             return
 
         except Exception as e:
             self.response(500, 'Error', str(e))
             return
+
+        finally:
+            if admitted:
+                admission.release()
+            # A failed event stays eligible for Slack's retry
+            if self.claimed_event and (self.response_code is None or self.response_code >= 500):
+                self.release_event(kv_store, self.claimed_event)
+
+    def claim_event(self, kv_store: KVStore, event_id: str, retry_num: str) -> bool:
+        try:
+            claimed = kv_store.claim_processed('slack_event', event_id)
+        except KVError as e:
+            # Without the claim we cannot tell duplicates apart. Process first
+            # deliveries and drop retries, whose original is most likely
+            # still being handled
+            logger.warning('Could not claim Slack event %s (retry %s): %s', event_id, retry_num, e)
+            return not retry_num
+        if claimed:
+            self.claimed_event = event_id
+        return claimed
+
+    def release_event(self, kv_store: KVStore, event_id: str):
+        # The response is already sent and the budget may be spent; the
+        # release runs without the request's deadline, bounded by the
+        # store's own timeouts
+        clear_deadline()
+        kv_store.release_processed('slack_event', event_id)
+
+    def process_admitted(self, kv_store: KVStore, event_data: dict):
+        try:
+            self.process_event(kv_store, event_data)
+        finally:
+            admission.release()
+
+    def process_event(self, kv_store: KVStore, event_data: dict):
+        if event_data['type'] == self.EVENT_TYPE_COMMAND:
+            self.process_command(kv_store, event_data)
+        elif event_data['type'] == self.EVENT_TYPE_THREAD_REPLY:
+            self.process_thread_reply(kv_store, event_data)
+
+    def process_command(self, kv_store: KVStore, event_data: dict):
+        slack_client = create_slack_client(config)
+        user_manager = UserManager(kv_store)
+
+        user_id = event_data['user']
+        channel = event_data['channel']
+        text = event_data['text'].strip()
+        parts = text.split(maxsplit=1)
+        command = parts[0].lower()
+
+        if command == self.COMMAND_REGISTER:
+            if len(parts) < 2:
+                slack_client.send_dm(
+                    user_id, None, '❌ Usage: `register <github_username>`')
+            else:
+                github_username = parts[1].strip()
+                if user_manager.register_user(user_id, github_username):
+                    slack_client.send_dm(
+                        user_id, None, f'✅ Registered! You will receive PR notifications for GitHub user: `{github_username}`')
+                else:
+                    slack_client.send_dm(
+                        user_id, None, '❌ Registration failed. Please try again.')
+
+        elif command == self.COMMAND_UNREGISTER:
+            if user_manager.unregister_user(user_id):
+                slack_client.send_dm(
+                    user_id, None, '✅ Unregistered successfully. You will no longer receive PR notifications.')
+            else:
+                slack_client.send_dm(
+                    user_id, None, '❌ You are not registered.')
+
+        elif command == self.COMMAND_STATUS:
+            user_data = user_manager.get_user_by_slack(user_id)
+            if user_data:
+                github_username = user_data.get(
+                    'github_username', 'Unknown')
+                slack_client.send_dm(
+                    user_id, None, f'✅ Registered\n📝 GitHub: `{github_username}`\n💬 Slack: `{user_id}`')
+            else:
+                slack_client.send_dm(
+                    user_id, None, '❌ Not registered\n\nSend `register <github_username>` to get started!')
+
+        elif command == self.COMMAND_PRS:
+            if len(parts) > 1:
+                github_username = parts[1].strip().lstrip('@')
+            else:
+                user_data = user_manager.get_user_by_slack(user_id)
+                github_username = user_data.get('github_username') if user_data else None
+
+            if not github_username:
+                slack_client.send_dm(
+                    user_id, None, '❌ Not registered\n\nSend `register <github_username>` or `prs <github_username>`')
+            else:
+                blocks, text = MessageFormatter.format_open_prs(
+                    github_username, kv_store.get_open_prs(github_username))
+                slack_client.send_dm(user_id, blocks, text)
+
+        elif command == self.COMMAND_HELP:
+            help_text = (
+                '🦜 **PR Marites Commands**\n\n'
+                '• `register <github_username>` - Start receiving PR notifications\n'
+                '• `unregister` - Stop receiving notifications\n'
+                '• `status` - Check your registration status\n'
+                '• `prs [github_username]` - List open PRs (yours by default)\n'
+                '• `help` - Show this help message\n\n'
+                'After registering, you\'ll receive DMs when someone comments on your PRs!'
+            )
+            slack_client.send_dm(user_id, None, help_text)
+
+        else:
+            slack_client.send_dm(
+                user_id, None, f'❓ Unknown command: `{command}`\n\nSend `help` for available commands.')
+
+        logger.info('Command %s processed for %s', command, user_id)
+
+    def process_thread_reply(self, kv_store: KVStore, event_data: dict):
+        github_client = create_github_client(config)
+        slack_client = create_slack_client(config)
+        user_manager = UserManager(kv_store)
+
+        thread_ts = event_data['thread_ts']
+        user_id = event_data['user']
+        text = event_data['text']
+
+        # Check if user is registered
+        user_data = user_manager.get_user_by_slack(user_id)
+
+        if not user_data:
+            return
+
+        logger.info('Processing reply from registered user: Slack=%s, GitHub=%s',
+                    user_id, user_data['github_username'])
+
+        github_data = kv_store.get_thread_mapping(thread_ts)
+
+        if not github_data:
+            logger.info('No GitHub mapping found for thread %s', thread_ts)
+            return
+
+        if github_data['type'] != 'review_comment':
+            return
+
+        installation_id = github_data['installation_id']
+        repo_full_name = github_data['repo_full_name']
+        comment_id = github_data['comment_id']
+        pr_number = github_data['pr_number']
+
+        # Format reply with user attribution
+        github_username = user_data['github_username']
+        formatted_text = f"**@{github_username}:**\n\n{text}"
+
+        try:
+            result = github_client.post_comment_reply(
+                installation_id,
+                repo_full_name,
+                pr_number,
+                comment_id,
+                formatted_text
+            )
+
+            slack_client.add_reaction(
+                event_data['channel'],
+                event_data['ts'],
+                'white_check_mark'
+            )
+
+            logger.info('Posted reply to GitHub comment %s as %s', comment_id, result['id'])
+
+        except Exception as e:
+            logger.error('Error posting to GitHub: %s', e, exc_info=True)
+
+            slack_client.add_reaction(
+                event_data['channel'],
+                event_data['ts'],
+                'x'
+            )
@@ -1,4 +1,6 @@
-from src.utils import setup_logger
+from src.utils import Config, setup_logger
+from src.utils.admission import AdmissionRejected
+from src.utils.capture import get_capture_writer
 from http.server import BaseHTTPRequestHandler
 import json
 import sys
@@ -8,22 +10,50 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 
 logger = setup_logger()
+capture_writer = get_capture_writer(Config())
 
 
 class WebhookRequest(BaseHTTPRequestHandler):
-    def response(self, code: int, message: str = None, error: str = None, should_log: bool = True, payload: dict = None):
+    # Recorded with captured requests so a replay knows where to send them
+    SOURCE = ''
+    # Status of the response sent, if any
+    response_code = None
+
+    def read_body(self) -> bytes:
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        if capture_writer is not None:
+            capture_writer.capture(self.SOURCE, self.command, self.path, dict(self.headers.items()), body)
+        return body
+
+    def response(self, code: int, message: str = None, error: str = None, should_log: bool = True,
+                 payload: dict = None, headers: dict = None):
         self.log(message, error, should_log)
+        self.response_code = code
+        body = json.dumps(payload or {'message': message}).encode()
         self.send_response(code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(payload or {'message': message}).encode())
+        self.wfile.write(body)
+        # Flush so the caller has the full response even if the handler
+        # keeps working afterwards
+        self.wfile.flush()
+
+    def shed(self, rejected: AdmissionRejected):
+        # The admission controller logs sheds in aggregate; one line per
+        # refused request would flood the logs during the burst
+        self.response(rejected.status, 'Overloaded', str(rejected), should_log=False,
+                      headers={'Retry-After': str(rejected.retry_after)})
 
     def log(self, message: str, error: str = None, should_log: bool = True):
         if not should_log:
             return
 
         if error is not None:
-            logger.warning(f'{message}: {error}')
+            logger.warning('%s: %s', message, error)
             return
 
         logger.info(message)
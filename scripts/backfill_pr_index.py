@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+# Rebuilds the open-PR-by-author index from the GitHub search API, once per
+# installation. pull_request webhooks keep it current afterwards; run this
+# when first enabling the index or after webhooks were missed.
+#
+#   python scripts/backfill_pr_index.py --dry-run
+#   python scripts/backfill_pr_index.py
+
+import argparse
+import os
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.github import GitHubClient  # noqa: E402
+from src.storage import KVStore  # noqa: E402
+from src.utils import Config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill the open PR index from the GitHub search API')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be indexed without writing')
+    args = parser.parse_args()
+
+    config = Config()
+    github_client = GitHubClient(config.github_app_id, config.github_private_key,
+                                 base_url=config.github_api_url)
+    kv_store = KVStore.from_config(config)
+
+    print(f"📇 Backfilling open PR index{' (dry run)' if args.dry_run else ''}")
+    print("=" * 60)
+
+    pulls_by_author: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for installation in github_client.get_installations():
+        qualifier = f" user:{installation['account']}" if installation['account'] else ''
+        pulls = github_client.search_pull_requests(installation['id'], f'is:pr is:open{qualifier}')
+        print(f"   {installation['account'] or installation['id']}: {len(pulls)} open PRs")
+        for pull in pulls:
+            if pull['author']:
+                pulls_by_author[pull['author'].lower()].append(pull)
+
+    # Authors indexed before but without open PRs now
+    stale = [key.split(':', 1)[1] for key in kv_store.scan_keys('open_prs:*')
+             if key.split(':', 1)[1] not in pulls_by_author]
+
+    if not args.dry_run:
+        kv_store.replace_open_prs(pulls_by_author)
+        kv_store.replace_open_prs({author: [] for author in stale})
+
+    total = sum(len(pulls) for pulls in pulls_by_author.values())
+    print(f"\n   Indexed: {total} PRs by {len(pulls_by_author)} authors")
+    print(f"   Cleared: {len(stale)} authors with no open PRs")
+
+
+if __name__ == '__main__':
+    main()
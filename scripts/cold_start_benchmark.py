@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+# Cold-start benchmark. Every case runs in a fresh interpreter, like a new
+# serverless instance: it reports the handler's import time from
+# `python -X importtime`, the first request's latency, and which heavy SDKs
+# were loaded by then. Paths that never talk to GitHub or Slack (ping, URL
+# verification, unregistered authors, health) fail the run if they load an
+# SDK they do not need.
+#
+#   python scripts/cold_start_benchmark.py
+#   python scripts/cold_start_benchmark.py --max-import-ms 80 --max-first-request-ms 150
+
+import argparse
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY_MODULES = ['github', 'slack_sdk', 'jwt', 'cryptography', 'requests', 'sqlite3']
+
+# Handler module, HTTP method and the heavy modules the path may load, or
+# None for paths that legitimately use the SDKs. The Upstash backend needs
+# requests for the registration lookup
+CASES = {
+    'github-ping': ('api.github_webhook', 'POST', []),
+    'github-unregistered': ('api.github_webhook', 'POST', ['requests']),
+    'github-comment': ('api.github_webhook', 'POST', None),
+    'slack-url-verification': ('api.slack_webhook', 'POST', []),
+    'slack-command': ('api.slack_webhook', 'POST', None),
+    'health': ('api.health', 'GET', []),
+}
+
+
+def build_request(case: str, run: int) -> Dict[str, Any]:
+    # Every run sends a request of its own: the fake KV outlives the child
+    # processes, and a repeated delivery or event id would only measure the
+    # duplicate check
+    from load_test import comment_event, github_request, slack_request
+
+    if case == 'github-ping':
+        headers, body = github_request('ping', {'zen': 'Keep it logically awesome.', 'hook_id': run})
+    elif case == 'github-unregistered':
+        _, headers, body = comment_event(run, 1)
+        payload = json.loads(body)
+        payload['pull_request']['user']['login'] = 'not-registered'
+        headers, body = github_request('pull_request_review_comment', payload)
+    elif case == 'github-comment':
+        _, headers, body = comment_event(run, 1)
+    elif case == 'slack-url-verification':
+        headers, body = {'Content-Type': 'application/json'}, json.dumps(
+            {'type': 'url_verification', 'challenge': 'cold-start'}).encode()
+    elif case == 'slack-command':
+        headers, body = slack_request({
+            'type': 'event_callback',
+            'event_id': f'EvColdStart{run}',
+            'event': {'type': 'message', 'channel': 'DU0', 'channel_type': 'im',
+                      'user': 'U0', 'text': 'help', 'ts': f'1700000002.{run:06d}'},
+        })
+    else:
+        headers, body = {}, b''
+    return {'headers': headers, 'body': body.decode()}
+
+
+def child(case: str) -> None:
+    # Runs in the fresh interpreter; only the stdlib is imported before the
+    # handler module so sys.modules reflects what the handler pulled in
+    import http.client
+    import importlib
+    import threading
+    from http.server import ThreadingHTTPServer
+
+    module_name, method, _ = CASES[case]
+    spec = json.loads(sys.stdin.read())
+
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    imported = time.perf_counter()
+
+    handler = type('handler', (module.handler,), {'log_message': lambda self, format, *args: None})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=30)
+    sent = time.perf_counter()
+    connection.request(method, '/', body=spec['body'].encode() or None, headers=spec['headers'])
+    response = connection.getresponse()
+    response.read()
+    done = time.perf_counter()
+    server.shutdown()
+
+    print(json.dumps({
+        'status': response.status,
+        'import_ms': (imported - start) * 1000,
+        'first_request_ms': (done - sent) * 1000,
+        'loaded': [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def import_time_ms(module_name: str, env: Dict[str, str]) -> float:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    # "import time: self [us] | cumulative | imported package"
+    pattern = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)$')
+    for line in result.stderr.splitlines():
+        match = pattern.match(line)
+        if match and match.group(3) == module_name and not match.group(2):
+            return int(match.group(1)) / 1000
+    raise RuntimeError(f'No -X importtime entry for {module_name}')
+
+
+def run_case(case: str, env: Dict[str, str], runs: int) -> Dict[str, Any]:
+    module_name, _, allowed = CASES[case]
+    samples: List[Dict[str, Any]] = []
+    for run in range(runs):
+        spec = json.dumps(build_request(case, run))
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', case],
+                                cwd=ROOT, env=env, input=spec, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'{case} failed:\n{result.stderr}')
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    import_times = sorted(import_time_ms(module_name, env) for _ in range(runs))
+
+    def median(key: str) -> float:
+        values = sorted(sample[key] for sample in samples)
+        return values[len(values) // 2]
+
+    return {
+        'case': case,
+        'module': module_name,
+        'allowed': allowed,
+        'status': samples[-1]['status'],
+        'import_ms': import_times[len(import_times) // 2],
+        'first_request_ms': median('first_request_ms'),
+        'cold_start_ms': median('import_ms') + median('first_request_ms'),
+        'loaded': samples[-1]['loaded'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure handler import time and first-request latency')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--runs', type=int, default=3, help='Fresh interpreters per case; the median is reported')
+    parser.add_argument('--max-import-ms', type=float, help='Fail if any handler import exceeds this')
+    parser.add_argument('--max-first-request-ms', type=float,
+                        help='Fail if import plus the first request on a path that needs no SDK exceeds this')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    from fake_services import FakeGitHub, FakeSlack, FakeUpstash
+    from load_test import configure_environment, seed
+
+    kv, github, slack = FakeUpstash().start(), FakeGitHub().start(), FakeSlack().start()
+    configure_environment(kv, github, slack, 'upstash', '', '')
+    logging.getLogger('marites').setLevel(logging.WARNING)
+    logging.getLogger('src').setLevel(logging.WARNING)
+    seed(1)
+    env = dict(os.environ, SLACK_ASYNC_PROCESSING='false', LOG_ASYNC='false',
+               PYTHONDONTWRITEBYTECODE='1')
+
+    try:
+        results = [run_case(case, env, args.runs) for case in args.cases]
+    finally:
+        for fake in (kv, github, slack):
+            fake.stop()
+
+    failures = []
+    for result in results:
+        if args.max_import_ms is not None and result['import_ms'] > args.max_import_ms:
+            failures.append(f"{result['case']}: import {result['import_ms']:.1f}ms > {args.max_import_ms}ms")
+        if result['allowed'] is None:
+            continue
+        unexpected = [name for name in result['loaded'] if name not in result['allowed']]
+        if unexpected:
+            failures.append(f"{result['case']}: loaded {', '.join(unexpected)}")
+        if args.max_first_request_ms is not None and result['cold_start_ms'] > args.max_first_request_ms:
+            failures.append(f"{result['case']}: import and first request {result['cold_start_ms']:.1f}ms "
+                            f"> {args.max_first_request_ms}ms")
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"🧊 Cold-start benchmark (median of {args.runs} fresh interpreters)")
+        print("=" * 60)
+        for result in results:
+            loaded = ', '.join(result['loaded']) or '-'
+            print(f"   {result['case']:<24} {result['status']}  import {result['import_ms']:6.1f}ms  "
+                  f"first request {result['first_request_ms']:6.1f}ms  "
+                  f"cold start {result['cold_start_ms']:6.1f}ms  loaded: {loaded}")
+
+    if failures:
+        print("\n❌ Budget exceeded:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
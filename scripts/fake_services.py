@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+# Local stand-ins for Upstash, GitHub and Slack used by the load test. Each
+# fake runs a ThreadingHTTPServer on 127.0.0.1, answers just enough of the
+# real protocol for the code paths the webhooks exercise, and counts every
+# request it receives so the harness can report outbound calls per event.
+
+import base64
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.storage.backends import KVError, MemoryBackend  # noqa: E402
+
+
+class LocalServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under bursts, which shows up
+    # as ~1s SYN-retransmit outliers that have nothing to do with the code
+    # under test
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakeService:
+    name = 'fake'
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+        self._server: Optional[LocalServer] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def record(self, operation: str):
+        with self._calls_lock:
+            self.calls[operation] += 1
+
+    def total_calls(self) -> int:
+        with self._calls_lock:
+            return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._calls_lock:
+            self.calls.clear()
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]],
+               body: bytes) -> Tuple[int, Any]:
+        raise NotImplementedError
+
+    def start(self) -> 'FakeService':
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; with Nagle on, a
+            # keep-alive client waits for a delayed ACK between them
+            disable_nagle_algorithm = True
+
+            def _dispatch(self, method: str):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                parsed = urlparse(self.path)
+                if service.latency:
+                    time.sleep(service.latency)
+                status, payload = service.handle(method, parsed.path, parse_qs(parsed.query), body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = LocalServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class FakeUpstash(FakeService):
+    name = 'kv'
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        # The in-memory backend already implements Redis command semantics
+        # with Upstash-shaped results
+        self.backend = MemoryBackend()
+
+    def handle(self, method, path, query, body):
+        commands = json.loads(body or b'[]')
+        if path.rstrip('/') == '/multi-exec':
+            self.record('multi-exec')
+            # The memory backend runs a pipeline in one transaction
+            try:
+                return 200, [{'result': result} for result in self.backend.pipeline(commands)]
+            except KVError as e:
+                return 400, {'error': str(e)}
+
+        if path.rstrip('/') == '/pipeline':
+            self.record('pipeline')
+            results = []
+            for command in commands:
+                try:
+                    results.append({'result': self.backend.execute(command)})
+                except KVError as e:
+                    results.append({'error': str(e)})
+            return 200, results
+
+        self.record(str(commands[0]).upper() if commands else 'EMPTY')
+        try:
+            return 200, {'result': self.backend.execute(commands)}
+        except KVError as e:
+            return 400, {'error': str(e)}
+
+
+class FakeGitHub(FakeService):
+    name = 'github'
+
+    FILE_LINES = 400
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self._ids = iter(range(10_000_000, 100_000_000))
+        self._ids_lock = threading.Lock()
+        # Open PRs returned by the search API: dicts with repo, number,
+        # author and created_at; tests fill it in
+        self.open_pulls: List[Dict[str, Any]] = []
+        self.installations = [{'id': 4242, 'account': {'login': 'marites'}}]
+
+    def _next_id(self) -> int:
+        with self._ids_lock:
+            return next(self._ids)
+
+    def _repo(self, full_name: str) -> Dict[str, Any]:
+        owner, name = full_name.split('/', 1)
+        return {
+            'id': abs(hash(full_name)) % 1_000_000,
+            'name': name,
+            'full_name': full_name,
+            'owner': {'login': owner},
+            'url': f'{self.url}/repos/{full_name}',
+            'html_url': f'https://github.com/{full_name}',
+        }
+
+    def _pull(self, full_name: str, number: int) -> Dict[str, Any]:
+        return {
+            'id': number,
+            'number': number,
+            'title': f'Load test PR {number}',
+            'state': 'open',
+            'user': {'login': 'author'},
+            'url': f'{self.url}/repos/{full_name}/pulls/{number}',
+            'html_url': f'https://github.com/{full_name}/pull/{number}',
+        }
+
+    def _search(self, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        # Honours author: and created:>= qualifiers and the 1,000 result cap
+        terms = query.get('q', [''])[0].split()
+        pulls = sorted(self.open_pulls, key=lambda pull: pull['created_at'])
+        for term in terms:
+            if term.startswith('author:'):
+                pulls = [pull for pull in pulls if pull['author'].lower() == term[7:].lower()]
+            elif term.startswith('created:>='):
+                pulls = [pull for pull in pulls if pull['created_at'] >= term[10:]]
+        per_page = int(query.get('per_page', ['30'])[0])
+        page = int(query.get('page', ['1'])[0])
+        items = pulls[:1000][(page - 1) * per_page:page * per_page]
+        return {
+            'total_count': len(pulls),
+            'incomplete_results': False,
+            'items': [{
+                'id': pull['number'],
+                'number': pull['number'],
+                'title': f"PR {pull['number']}",
+                'user': {'login': pull['author']},
+                'state': 'open',
+                'created_at': pull['created_at'],
+                'repository_url': f"{self.url}/repos/{pull['repo']}",
+                'html_url': f"https://github.com/{pull['repo']}/pull/{pull['number']}",
+                'url': f"{self.url}/repos/{pull['repo']}/issues/{pull['number']}",
+                'pull_request': {},
+            } for pull in items],
+        }
+
+    def handle(self, method, path, query, body):
+        match = re.fullmatch(r'/app/installations/(\d+)/access_tokens', path)
+        if match and method == 'POST':
+            self.record('access_tokens')
+            return 201, {'token': f'ghs_fake_{match.group(1)}', 'expires_at': '2099-01-01T00:00:00Z'}
+
+        if path == '/app/installations' and method == 'GET':
+            self.record('installations')
+            return 200, self.installations
+
+        if path == '/search/issues' and method == 'GET':
+            self.record('search_issues')
+            return 200, self._search(query)
+
+        match = re.fullmatch(r'/repos/([^/]+/[^/]+)/contents/(.+)', path)
+        if match and method == 'GET':
+            self.record('get_contents')
+            full_name, file_path = match.groups()
+            content = '\n'.join(f'line {i} of {file_path}' for i in range(1, self.FILE_LINES + 1))
+            return 200, {
+                'type': 'file',
+                'encoding': 'base64',
+                'name': file_path.rsplit('/', 1)[-1],
+                'path': file_path,
+                'sha': query.get('ref', ['HEAD'])[0],
+                'size': len(content),
+                'content': base64.b64encode(content.encode()).decode(),
+                'url': f'{self.url}/repos/{full_name}/contents/{file_path}',
+            }
+
+        match = re.fullmatch(r'/repos/([^/]+/[^/]+)/pulls/(\d+)/comments/(\d+)/replies', path)
+        if match and method == 'POST':
+            self.record('create_reply')
+            full_name, number, comment_id = match.groups()
+            reply_id = self._next_id()
+            return 201, {
+                'id': reply_id,
+                'body': json.loads(body or b'{}').get('body', ''),
+                'in_reply_to_id': int(comment_id),
+                'url': f'{self.url}/repos/{full_name}/pulls/comments/{reply_id}',
+                'html_url': f'https://github.com/{full_name}/pull/{number}#discussion_r{reply_id}',
+                'created_at': '2024-01-01T00:00:00Z',
+            }
+
+        match = re.fullmatch(r'/repos/([^/]+/[^/]+)/pulls/(\d+)', path)
+        if match and method == 'GET':
+            self.record('get_pull')
+            return 200, self._pull(match.group(1), int(match.group(2)))
+
+        match = re.fullmatch(r'/repos/([^/]+/[^/]+)', path)
+        if match and method == 'GET':
+            self.record('get_repo')
+            return 200, self._repo(match.group(1))
+
+        self.record(f'unhandled {method} {path}')
+        return 404, {'message': 'Not Found'}
+
+
+class FakeSlack(FakeService):
+    name = 'slack'
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self._ts = iter(range(1, 100_000_000))
+        self._ts_lock = threading.Lock()
+        # users.list members; tests fill it in
+        self.directory: List[Dict[str, Any]] = []
+
+    def _next_ts(self) -> str:
+        with self._ts_lock:
+            return f'{int(time.time())}.{next(self._ts):06d}'
+
+    @staticmethod
+    def _params(body: bytes) -> Dict[str, Any]:
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except ValueError:
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+    def handle(self, method, path, query, body):
+        api_method = path.rsplit('/', 1)[-1]
+        self.record(api_method)
+        params = self._params(body)
+
+        if api_method == 'conversations.open':
+            users = params.get('users', '')
+            user = users[0] if isinstance(users, list) else str(users).split(',')[0]
+            return 200, {'ok': True, 'channel': {'id': f'D{user}'}}
+
+        if api_method == 'chat.postMessage':
+            ts = self._next_ts()
+            response = {'ok': True, 'channel': params.get('channel'), 'ts': ts}
+            if params.get('thread_ts'):
+                response['thread_ts'] = params['thread_ts']
+            return 200, response
+
+        if api_method in ('reactions.add', 'chat.update'):
+            return 200, {'ok': True}
+
+        if api_method == 'users.lookupByEmail':
+            return 200, {'ok': False, 'error': 'users_not_found'}
+
+        if api_method == 'users.list':
+            start = int(params.get('cursor') or 0)
+            limit = int(params.get('limit') or 200)
+            page = self.directory[start:start + limit]
+            next_cursor = str(start + limit) if start + limit < len(self.directory) else ''
+            return 200, {'ok': True, 'members': page, 'response_metadata': {'next_cursor': next_cursor}}
+
+        if api_method == 'users.profile.get':
+            user = params.get('user')
+            for member in self.directory:
+                if member['id'] == user:
+                    return 200, {'ok': True, 'profile': member.get('profile', {})}
+            return 200, {'ok': False, 'error': 'user_not_found'}
+
+        return 200, {'ok': False, 'error': 'unknown_method'}
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+# Message formatting benchmark. Renders review comments of growing size (up
+# to GitHub's 65536 character limit) with suggestion blocks, links and
+# emphasis, plus pathological bodies full of unclosed markup, and reports the
+# time spent converting and budgeting each one. Every message is checked
+# against Slack's limits on section text and block count, the ones that
+# answer an oversized message with invalid_blocks; `before` says whether the
+# body would have fit the single unconverted section it used to be sent in.
+#
+#   python scripts/format_benchmark.py
+#   python scripts/format_benchmark.py --sizes 4000 65536 --iterations 200
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from load_test import percentile  # noqa: E402
+from src.github.code_context import CodeContextExtractor  # noqa: E402
+from src.slack.formatter import MessageFormatter  # noqa: E402
+from src.slack.mrkdwn import MAX_BLOCKS, SECTION_LIMIT, to_mrkdwn  # noqa: E402
+
+PARAGRAPH = ("This **should not** allocate on every call; see [the profile](https://example.com/p?run=1&view=flame) "
+             "and `cache.get(key) or build()`. ~~Old approach~~ _maybe_ keep the <fallback> & measure.")
+
+PATHOLOGICAL = {
+    'unclosed-bold': '**x ' * 16000,
+    'unclosed-fence': '```\n' + 'code line\n' * 6000,
+    'unclosed-comment': '<!-- ' * 13000,
+    'unclosed-link': '[label](' * 8000,
+    'open-brackets': '[' * 65000,
+    'unclosed-strike': '~~x ' * 16000,
+    'unclosed-code': '`x ' * 21000,
+    'one-long-line': 'word&word<b> ' * 5000,
+}
+
+
+def review_comment(size: int, rng: random.Random) -> str:
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        if rng.random() < 0.2:
+            lines = [f"    value_{i} = compute(a < b and c > d)  # step {i}" for i in range(rng.randint(5, 60))]
+            part = "```suggestion\n" + "\n".join(lines) + "\n```"
+        else:
+            part = f"- {PARAGRAPH}" if rng.random() < 0.3 else PARAGRAPH
+        parts.append(part)
+        length += len(part) + 1
+    return "\n".join(parts)[:size]
+
+
+def comment_data(body: str) -> Dict[str, Any]:
+    return {
+        'repo_name': 'load-test',
+        'repo_full_name': 'marites/load-test',
+        'pr_number': 1,
+        'pr_title': 'Speed up <everything> & more',
+        'pr_url': 'https://github.com/marites/load-test/pull/1',
+        'comment_author': 'reviewer',
+        'comment_body': body,
+        'comment_url': 'https://github.com/marites/load-test/pull/1#discussion_r1',
+        'file_path': 'src/app.py',
+        'line': 42,
+    }
+
+
+def code_context() -> str:
+    extractor = CodeContextExtractor()
+    source = '\n'.join(f"def handler_{i}(request):  # a < b && c > d" + ' ' * (i % 7) * 40
+                       for i in range(200))
+    return extractor.format_for_slack(extractor.extract_from_file(source, 100), 'src/app.py')
+
+
+def fits(blocks: List[Dict[str, Any]]) -> bool:
+    texts = [block['text']['text'] for block in blocks if block['type'] == 'section' and 'text' in block]
+    return len(blocks) <= MAX_BLOCKS and all(len(text) <= SECTION_LIMIT for text in texts)
+
+
+def run(name: str, body: str, context: str, iterations: int) -> Dict[str, Any]:
+    convert = []
+    render = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        to_mrkdwn(body)
+        convert.append((time.perf_counter() - start) * 1_000_000)
+
+        start = time.perf_counter()
+        blocks, _ = MessageFormatter.format_review_comment(comment_data(body), context)
+        render.append((time.perf_counter() - start) * 1_000_000)
+
+    sections = [block['text']['text'] for block in blocks if block['type'] == 'section' and 'text' in block]
+    return {
+        'body': name,
+        'chars': len(body),
+        'convert_p50_us': percentile(convert, 50),
+        'render_p50_us': percentile(render, 50),
+        'render_p95_us': percentile(render, 95),
+        'blocks': len(blocks),
+        'longest_section': max(len(text) for text in sections),
+        'fits': fits(blocks),
+        'fitted_before': len(f"*Comment:*\n{body}") <= SECTION_LIMIT,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Slack message formatting of review comments')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[500, 4000, 16000, 65536],
+                        help='Comment body sizes in characters')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    context = code_context()
+    bodies = [(f'review-{size}', review_comment(size, rng)) for size in args.sizes]
+    bodies.extend(PATHOLOGICAL.items())
+
+    results = [run(name, body, context, args.iterations) for name, body in bodies]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"📝 Format benchmark ({args.iterations} iterations per body)")
+    print("=" * 104)
+    print(f"{'body':<18} {'chars':>7} {'convert p50':>13} {'render p50':>12} {'render p95':>12} "
+          f"{'blocks':>7} {'longest':>8}  fits  before")
+    for result in results:
+        print(f"{result['body']:<18} {result['chars']:>7} {result['convert_p50_us']:>11.0f}us "
+              f"{result['render_p50_us']:>10.0f}us {result['render_p95_us']:>10.0f}us "
+              f"{result['blocks']:>7} {result['longest_section']:>8}  {'yes' if result['fits'] else 'NO':<4}  "
+              f"{'yes' if result['fitted_before'] else 'no'}")
+
+    if not all(result['fits'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
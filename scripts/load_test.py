@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+
+# Replay-style load test for the webhook handlers. Runs the GitHub and Slack
+# handlers on local threaded servers wired to the fakes in fake_services.py,
+# fires correctly signed webhook payloads at them and reports latency,
+# throughput and outbound calls per event.
+#
+#   python scripts/load_test.py --events 500 --concurrency 32 --latency 0.02
+#   python scripts/load_test.py --scenario comment --max-p95-ms 50 --max-calls-per-event 6
+#   ADMISSION_LIMIT=8 python scripts/load_test.py --scenario storm --concurrency 64 --latency 0.05
+#   python scripts/load_test.py --replay /tmp/marites-capture
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_services import FakeGitHub, FakeSlack, FakeUpstash, LocalServer  # noqa: E402
+
+GITHUB_SECRET = 'load-test-github-secret'
+SLACK_SECRET = 'load-test-slack-secret'
+INSTALLATION_ID = 4242
+REPO = 'marites/load-test'
+SCENARIOS = ['comment', 'fanout', 'followup', 'review', 'reply', 'command', 'storm']
+# Event numbers, and so comment, review and Slack event ids, per scenario
+SCENARIO_IDS = 100_000
+REPLAYED_HEADERS = {'content-type', 'x-github-event', 'x-github-delivery', 'x-slack-retry-num',
+                    'x-slack-retry-reason'}
+
+
+def generate_private_key() -> str:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption()
+    ).decode()
+
+
+def configure_environment(kv: FakeUpstash, github: FakeGitHub, slack: FakeSlack,
+                          backend: str, redis_url: str, sqlite_path: str):
+    os.environ.update({
+        'STORAGE_BACKEND': backend,
+        'REDIS_URL': redis_url,
+        'SQLITE_PATH': sqlite_path,
+        'GITHUB_APP_ID': '1',
+        'GITHUB_PRIVATE_KEY': generate_private_key(),
+        'GITHUB_WEBHOOK_SECRET': GITHUB_SECRET,
+        'GITHUB_API_URL': github.url,
+        'SLACK_BOT_TOKEN': 'xoxb-load-test',
+        'SLACK_SIGNING_SECRET': SLACK_SECRET,
+        'SLACK_API_URL': f'{slack.url}/api/',
+        'KV_REST_API_URL': kv.url,
+        'KV_REST_API_TOKEN': 'load-test',
+        'APP_SECRET_KEY': 'load-test',
+    })
+
+
+def start_app(handler_class, verbose: bool = False) -> LocalServer:
+    overrides = {'disable_nagle_algorithm': True}
+    if not verbose:
+        overrides['log_message'] = lambda self, format, *args: None
+    handler_class = type(handler_class.__name__, (handler_class,), overrides)
+    server = LocalServer(('127.0.0.1', 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def github_request(event: str, payload: Dict[str, Any]) -> Tuple[Dict[str, str], bytes]:
+    body = json.dumps(payload).encode()
+    headers = {
+        'Content-Type': 'application/json',
+        'X-GitHub-Event': event,
+        'X-GitHub-Delivery': f'load-test-{hashlib.sha1(body).hexdigest()}',
+    }
+    return sign_github(headers, body), body
+
+
+def sign_github(headers: Dict[str, str], body: bytes) -> Dict[str, str]:
+    signature = 'sha256=' + hmac.new(GITHUB_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return dict(headers, **{'X-Hub-Signature-256': signature})
+
+
+def slack_request(payload: Dict[str, Any]) -> Tuple[Dict[str, str], bytes]:
+    body = json.dumps(payload).encode()
+    return sign_slack({'Content-Type': 'application/json'}, body), body
+
+
+def sign_slack(headers: Dict[str, str], body: bytes) -> Dict[str, str]:
+    timestamp = str(int(time.time()))
+    basestring = f'v0:{timestamp}:{body.decode()}'
+    signature = 'v0=' + hmac.new(SLACK_SECRET.encode(), basestring.encode(), hashlib.sha256).hexdigest()
+    return dict(headers, **{'X-Slack-Request-Timestamp': timestamp, 'X-Slack-Signature': signature})
+
+
+def replay_requests(directory: str, events: int) -> List[Tuple[str, Dict[str, str], bytes]]:
+    # Requests recorded with CAPTURE_ENABLED. Their signatures were redacted,
+    # so they are signed again with the load-test secrets
+    from src.utils.capture import read_capture, request_body
+
+    replay = []
+    for record in read_capture(directory, include_active=True):
+        if record['source'] not in ('github', 'slack') or record['method'] != 'POST':
+            continue
+        body = request_body(record)
+        headers = {name: value for name, value in record['headers'].items()
+                   if name.lower() in REPLAYED_HEADERS}
+        sign = sign_github if record['source'] == 'github' else sign_slack
+        replay.append((record['source'], sign(headers, body), body))
+        if len(replay) >= events:
+            break
+    return replay
+
+
+def replay_authors(replay: List[Tuple[str, Dict[str, str], bytes]]) -> List[str]:
+    authors = set()
+    for target, _, body in replay:
+        if target != 'github':
+            continue
+        try:
+            author = json.loads(body).get('pull_request', {}).get('user', {}).get('login')
+        except ValueError:
+            continue
+        if author:
+            authors.add(author)
+    return sorted(authors)
+
+
+def pull_request_fields(i: int, authors: int) -> Dict[str, Any]:
+    number = 1 + i % 50
+    return {
+        'pull_request': {
+            'number': number,
+            'title': f'Load test PR {number}',
+            'html_url': f'https://github.com/{REPO}/pull/{number}',
+            'user': {'login': f'author{i % authors}'},
+        },
+        'repository': {'full_name': REPO, 'name': REPO.split('/')[1]},
+        'installation': {'id': INSTALLATION_ID},
+    }
+
+
+def comment_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    comment_id = 1_000_000 + i
+    payload = {
+        'action': 'created',
+        'comment': {
+            'id': comment_id,
+            'body': f'Load test comment {i}: consider extracting this into a helper.',
+            'user': {'login': 'reviewer'},
+            'html_url': f'https://github.com/{REPO}/pull/1#discussion_r{comment_id}',
+            'path': f'src/module_{i % 20}.py',
+            'diff_hunk': '@@ -10,6 +10,8 @@ def handler():\n context\n+added line\n+another line\n context',
+            'line': 12 + i % 200,
+            'commit_id': f'{i % 10:040d}',
+        },
+        **pull_request_fields(i, authors),
+    }
+    headers, body = github_request('pull_request_review_comment', payload)
+    return 'github', headers, body
+
+
+def fanout_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    # A comment on a PR with two requested reviewers and an assignee, all
+    # registered: four recipients, rendered once
+    _, _, body = comment_event(i, authors)
+    payload = json.loads(body)
+    payload['pull_request']['requested_reviewers'] = [{'login': f'author{(i + 1) % authors}'},
+                                                      {'login': f'author{(i + 2) % authors}'}]
+    payload['pull_request']['assignees'] = [{'login': f'author{(i + 3) % authors}'}]
+    headers, body = github_request('pull_request_review_comment', payload)
+    return 'github', headers, body
+
+
+def followup_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    # A GitHub reply to a comment forwarded earlier (the ones seeded per author)
+    _, _, body = comment_event(i, authors)
+    payload = json.loads(body)
+    payload['comment']['id'] = 3_000_000 + i
+    payload['comment']['in_reply_to_id'] = 900_000 + i % authors
+    headers, body = github_request('pull_request_review_comment', payload)
+    return 'github', headers, body
+
+
+def review_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    review_id = 2_000_000 + i
+    payload = {
+        'action': 'submitted',
+        'review': {
+            'id': review_id,
+            'state': 'commented',
+            'body': f'Load test review {i}',
+            'user': {'login': 'reviewer'},
+            'html_url': f'https://github.com/{REPO}/pull/1#pullrequestreview-{review_id}',
+        },
+        **pull_request_fields(i, authors),
+    }
+    headers, body = github_request('pull_request_review', payload)
+    return 'github', headers, body
+
+
+def pull_request_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    fields = pull_request_fields(i, authors)
+    fields['pull_request'].update({'head': {'sha': f'{i % 10:040d}'}, 'base': {'ref': 'main'}})
+    payload = {'action': 'synchronize', **fields}
+    headers, body = github_request('pull_request', payload)
+    return 'github', headers, body
+
+
+def storm_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    # A busy review: pushes, reviews and comments arriving together, with
+    # the occasional follow-up in a conversation already on Slack
+    kind = STORM_MIX[i % len(STORM_MIX)]
+    return GENERATORS[kind](i, authors)
+
+
+def reply_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    user = i % authors
+    payload = {
+        'type': 'event_callback',
+        'event_id': f'EvReply{i}',
+        'event': {
+            'type': 'message',
+            'channel': f'DU{user}',
+            'channel_type': 'im',
+            'thread_ts': thread_ts(i % authors),
+            'user': f'U{user}',
+            'text': f'Thanks, fixed in the next push ({i})',
+            'ts': f'1700000000.{i:06d}',
+        },
+    }
+    headers, body = slack_request(payload)
+    return 'slack', headers, body
+
+
+def command_event(i: int, authors: int) -> Tuple[str, Dict[str, str], bytes]:
+    payload = {
+        'type': 'event_callback',
+        'event_id': f'EvCommand{i}',
+        'event': {
+            'type': 'message',
+            'channel': f'DU{i % authors}',
+            'channel_type': 'im',
+            'user': f'U{i % authors}',
+            'text': 'status',
+            'ts': f'1700000001.{i:06d}',
+        },
+    }
+    headers, body = slack_request(payload)
+    return 'slack', headers, body
+
+
+GENERATORS = {
+    'comment': comment_event,
+    'fanout': fanout_event,
+    'followup': followup_event,
+    'review': review_event,
+    'reply': reply_event,
+    'command': command_event,
+    'pull_request': pull_request_event,
+    'storm': storm_event,
+}
+
+STORM_MIX = ['pull_request', 'review', 'comment', 'pull_request', 'review',
+             'followup', 'pull_request', 'comment', 'review', 'pull_request']
+
+
+def thread_ts(i: int) -> str:
+    return f'1600000000.{i:06d}'
+
+
+def seed(authors: int):
+    from src.storage import KVStore
+    from src.utils import Config, UserManager
+
+    kv_store = KVStore.from_config(Config())
+    user_manager = UserManager(kv_store)
+    for i in range(authors):
+        user_manager.register_user(f'U{i}', f'author{i}')
+        kv_store.save_conversation(900_000 + i, {
+            'channel': f'DU{i}',
+            'thread_ts': thread_ts(i),
+            'message_ts': thread_ts(i)
+        }, {
+            'installation_id': INSTALLATION_ID,
+            'repo_full_name': REPO,
+            'pr_number': 1,
+            'type': 'review_comment'
+        })
+
+
+def seed_replay(authors: List[str]):
+    # Captured PR authors are registered so replayed events get past the
+    # registration check like they did in production
+    from src.storage import KVStore
+    from src.utils import Config, UserManager
+
+    user_manager = UserManager(KVStore.from_config(Config()))
+    for author in authors:
+        user_manager.register_user(f'U-{author}', author)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def event_kind(target: str, headers: Dict[str, str], body: bytes) -> str:
+    if target == 'slack':
+        return 'slack'
+    event = headers['X-GitHub-Event']
+    if event == 'pull_request_review_comment' and b'"in_reply_to_id"' in body:
+        return 'followup'
+    return event
+
+
+def wait_for_quiescence(fakes, idle: float = 0.5, timeout: float = 30.0):
+    # Slack events are processed after the acknowledgement, so outbound calls
+    # keep arriving after the last response; wait until they stop
+    deadline = time.monotonic() + timeout
+    last = None
+    while time.monotonic() < deadline:
+        current = sum(fake.total_calls() for fake in fakes)
+        if current == last:
+            return
+        last = current
+        time.sleep(idle)
+
+
+def build_requests(name: str, events: int, authors: int,
+                   duplicate_rate: float) -> List[Tuple[str, Dict[str, str], bytes]]:
+    # Scenarios run one after another against the same KV. Each numbers its
+    # events from a range of its own and salts its delivery ids with its
+    # name, so one that reuses another's payloads (storm, or fanout's
+    # comments) is not answered as a redelivery
+    generator = GENERATORS[name]
+    first = SCENARIOS.index(name) * SCENARIO_IDS
+    unique = max(1, int(events * (1 - duplicate_rate)))
+    requests_to_send = []
+    for i in range(events):
+        target, headers, body = generator(first + i % unique, authors)
+        if 'X-GitHub-Delivery' in headers:
+            headers = dict(headers, **{'X-GitHub-Delivery': f'load-test-{name}-{hashlib.sha1(body).hexdigest()}'})
+        requests_to_send.append((target, headers, body))
+    return requests_to_send
+
+
+def run_scenario(name: str, targets: Dict[str, str], fakes, requests_to_send,
+                 concurrency: int) -> Dict[str, Any]:
+    events = len(requests_to_send)
+
+    for fake in fakes:
+        fake.reset_calls()
+
+    local = threading.local()
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    statuses_by_kind: Dict[str, Dict[int, int]] = {}
+    lock = threading.Lock()
+
+    def fire(item):
+        target, headers, body = item
+        kind = event_kind(target, headers, body)
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            status = session.post(targets[target], data=body, headers=headers, timeout=30).status_code
+        except requests.RequestException:
+            status = 0
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+            by_kind = statuses_by_kind.setdefault(kind, {})
+            by_kind[status] = by_kind.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fire, requests_to_send))
+    wall = time.perf_counter() - started
+    wait_for_quiescence(fakes)
+
+    calls = {fake.name: dict(fake.calls) for fake in fakes}
+    total_calls = sum(sum(per_op.values()) for per_op in calls.values())
+    return {
+        'scenario': name,
+        'events': events,
+        'concurrency': concurrency,
+        'statuses': statuses,
+        'statuses_by_kind': statuses_by_kind,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        'throughput_rps': events / wall if wall else 0.0,
+        'calls_per_event': total_calls / events if events else 0.0,
+        'calls': calls,
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n📈 {result['scenario']}: {result['events']} events @ concurrency {result['concurrency']}")
+    print(f"   Status codes:    {result['statuses']}")
+    if len(result['statuses_by_kind']) > 1:
+        for kind, statuses in sorted(result['statuses_by_kind'].items()):
+            print(f"      {kind:28s} {statuses}")
+    print(f"   Latency (ms):    p50 {result['p50_ms']:.1f}  p95 {result['p95_ms']:.1f}  "
+          f"p99 {result['p99_ms']:.1f}  mean {result['mean_ms']:.1f}")
+    print(f"   Throughput:      {result['throughput_rps']:.1f} events/s")
+    print(f"   Outbound calls:  {result['calls_per_event']:.2f} per event")
+    for service, per_op in result['calls'].items():
+        if per_op:
+            ops = ', '.join(f'{op}={count / result["events"]:.2f}' for op, count in sorted(per_op.items()))
+            print(f"      {service:7s} {ops}")
+    if 'admission' in result:
+        admission = result['admission']
+        print(f"   Admission:       limit {admission['limit']}, admitted {admission['admitted']}, "
+              f"shed {admission['shed']}")
+    if 'snippet_cache' in result:
+        cache = result['snippet_cache']
+        print(f"   Snippet cache:   {cache['hit_rate'] * 100:.1f}% hit rate ({cache['hits']} local, "
+              f"{cache['kv_hits']} KV, {cache['misses']} misses, {cache['evictions']} evictions)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the webhook handlers against local fakes')
+    parser.add_argument('--scenario', choices=SCENARIOS + ['all'], default='all')
+    parser.add_argument('--events', type=int, default=200, help='Events per scenario')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--authors', type=int, default=20, help='Distinct registered PR authors')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Artificial latency in seconds added by every fake service')
+    parser.add_argument('--backend', choices=['upstash', 'redis', 'sqlite', 'memory'], default='upstash',
+                        help='Storage backend; upstash uses the local REST fake')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0',
+                        help='Redis server for --backend redis')
+    parser.add_argument('--sqlite-path', default=os.path.join(tempfile.gettempdir(), 'marites-load-test.db'),
+                        help='Database file for --backend sqlite')
+    parser.add_argument('--duplicate-rate', type=float, default=0.0,
+                        help='Fraction of events that are redeliveries of earlier ones')
+    parser.add_argument('--replay', metavar='DIR',
+                        help='Replay requests recorded with CAPTURE_ENABLED from this directory '
+                             'instead of generating them; --events caps how many')
+    parser.add_argument('--max-p95-ms', type=float, help='Fail if any scenario p95 exceeds this')
+    parser.add_argument('--max-calls-per-event', type=float,
+                        help='Fail if any scenario makes more outbound calls per event')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Keep application and access logs')
+    args = parser.parse_args()
+
+    kv, github, slack = FakeUpstash(args.latency).start(), FakeGitHub(args.latency).start(), FakeSlack(args.latency).start()
+    fakes = [kv, github, slack]
+    configure_environment(kv, github, slack, args.backend, args.redis_url, args.sqlite_path)
+
+    # Import the handlers only once the environment points at the fakes
+    from api.github_webhook import handler as github_handler, snippet_cache, admission
+    from api.slack_webhook import handler as slack_handler
+
+    if not args.verbose:
+        logging.getLogger('marites').setLevel(logging.WARNING)
+        logging.getLogger('src').setLevel(logging.WARNING)
+
+    github_app = start_app(github_handler, args.verbose)
+    slack_app = start_app(slack_handler, args.verbose)
+    targets = {
+        'github': f'http://127.0.0.1:{github_app.server_port}/webhooks/github',
+        'slack': f'http://127.0.0.1:{slack_app.server_port}/webhooks/slack',
+    }
+
+    seed(args.authors)
+
+    if args.replay:
+        replay = replay_requests(args.replay, args.events)
+        if not replay:
+            sys.exit(f'No captured requests in {args.replay}')
+        seed_replay(replay_authors(replay))
+        workloads = [('replay', replay)]
+    else:
+        scenarios = SCENARIOS if args.scenario == 'all' else [args.scenario]
+        workloads = [(name, build_requests(name, args.events, args.authors, args.duplicate_rate))
+                     for name in scenarios]
+
+    results = []
+    for name, requests_to_send in workloads:
+        snippet_cache.clear()
+        admission.reset_stats()
+        result = run_scenario(name, targets, fakes, requests_to_send, args.concurrency)
+        if any(admission.stats()['shed'].values()):
+            result['admission'] = admission.stats()
+        stats = snippet_cache.stats()
+        if stats['hits'] + stats['kv_hits'] + stats['misses']:
+            result['snippet_cache'] = stats
+        results.append(result)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"🧪 Marites load test ({args.events} events/scenario, {args.backend} storage, "
+              f"latency {args.latency * 1000:.0f}ms per fake call)")
+        print("=" * 60)
+        for result in results:
+            print_report(result)
+
+    failures = []
+    for result in results:
+        if args.max_p95_ms is not None and result['p95_ms'] > args.max_p95_ms:
+            failures.append(f"{result['scenario']}: p95 {result['p95_ms']:.1f}ms > {args.max_p95_ms}ms")
+        if args.max_calls_per_event is not None and result['calls_per_event'] > args.max_calls_per_event:
+            failures.append(f"{result['scenario']}: {result['calls_per_event']:.2f} calls/event > {args.max_calls_per_event}")
+
+    for server in (github_app, slack_app):
+        server.shutdown()
+    for fake in fakes:
+        fake.stop()
+
+    if failures:
+        print("\n❌ Budget exceeded:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# Logging overhead benchmark. Logs the messages of a forwarded comment
+# (handler progress plus the KVStore writes) from concurrent threads into a
+# sink that is slow to write, like stdout under a busy log drain, and reports
+# the time each record costs the calling thread for every pipeline setup.
+#
+#   python scripts/logging_benchmark.py
+#   python scripts/logging_benchmark.py --records 20000 --sink-latency 0.0002
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from load_test import percentile  # noqa: E402
+from src.utils.logger import HIGH_VOLUME_LOGGERS, configure_logging, flush_logging  # noqa: E402
+
+SETUPS = {
+    'sync-text': {'asynchronous': False, 'log_format': 'text', 'sample_rate': 1.0},
+    'queue-text': {'asynchronous': True, 'log_format': 'text', 'sample_rate': 1.0},
+    'queue-json': {'asynchronous': True, 'log_format': 'json', 'sample_rate': 1.0},
+    'queue-text-sampled': {'asynchronous': True, 'log_format': 'text', 'sample_rate': 0.05},
+}
+
+
+class SlowSink(io.TextIOBase):
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lines = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.latency)
+        self.lines += text.count('\n')
+        return len(text)
+
+
+def delivery(i: int) -> float:
+    handler_log = logging.getLogger('marites')
+    kv_log = logging.getLogger('src.storage.kv_store')
+    start = time.perf_counter()
+    handler_log.info('Received GitHub webhook: %s', 'pull_request_review_comment')
+    handler_log.info('Processing event for registered user: GitHub=%s, Slack=%s', f'author{i % 50}', f'U{i % 50}')
+    kv_log.info('KV SET successful for key %s', f'conversation:{i}')
+    kv_log.info('KV SET successful for key %s', f'thread:1700000000.{i:06d}')
+    handler_log.info('Slack response: thread_ts=%s, channel=%s', f'1700000000.{i:06d}', 'D1')
+    return (time.perf_counter() - start) * 1_000_000 / 5
+
+
+def run(name: str, setup: Dict[str, Any], deliveries: int, concurrency: int,
+        sink_latency: float) -> Dict[str, Any]:
+    sink = SlowSink(sink_latency)
+    configure_logging(level=logging.INFO, log_format=setup['log_format'],
+                      asynchronous=setup['asynchronous'], stream=sink,
+                      sample_rates={logger: setup['sample_rate'] for logger in HIGH_VOLUME_LOGGERS})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(delivery, range(deliveries)))
+    elapsed = time.perf_counter() - start
+    flush_logging()
+    drained = time.perf_counter() - start
+
+    return {
+        'setup': name,
+        'records': deliveries * 5,
+        'written': sink.lines,
+        'caller_p50_us': percentile(samples, 50),
+        'caller_p95_us': percentile(samples, 95),
+        'caller_seconds': elapsed,
+        'drained_seconds': drained,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the logging pipeline')
+    parser.add_argument('--setups', nargs='+', choices=list(SETUPS), default=list(SETUPS))
+    parser.add_argument('--deliveries', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--sink-latency', type=float, default=0.00005,
+                        help='Seconds each write to the log sink takes')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    results = [run(name, SETUPS[name], args.deliveries, args.concurrency, args.sink_latency)
+               for name in args.setups]
+    configure_logging()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"📝 Logging benchmark ({args.deliveries} deliveries, concurrency {args.concurrency}, "
+          f"{args.sink_latency * 1_000_000:.0f}µs per write)")
+    print("=" * 60)
+    for result in results:
+        print(f"\n📊 {result['setup']}: {result['written']}/{result['records']} records written")
+        print(f"   per record in caller  p50 {result['caller_p50_us']:7.1f}µs  p95 {result['caller_p95_us']:7.1f}µs")
+        print(f"   callers done {result['caller_seconds']:.2f}s, log drained {result['drained_seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+# Moves comment/thread mappings from the legacy two-key layout
+# (github_comment:{id} + slack_thread:{ts}) into conversation records.
+# Uses the storage configured in the environment, like the app does.
+#
+#   python scripts/migrate_conversations.py --dry-run
+#   python scripts/migrate_conversations.py --batch-size 200
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.storage import KVStore  # noqa: E402
+from src.storage.migrations import migrate_conversations  # noqa: E402
+from src.utils import Config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate comment/thread mappings to conversation records')
+    parser.add_argument('--batch-size', type=int, default=100, help='Keys per SCAN batch')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be migrated without writing')
+    args = parser.parse_args()
+
+    kv_store = KVStore.from_config(Config())
+    print(f"🔁 Migrating conversations on {kv_store.backend.name} storage"
+          f"{' (dry run)' if args.dry_run else ''}")
+    print("=" * 60)
+
+    stats = migrate_conversations(kv_store, batch_size=args.batch_size, dry_run=args.dry_run)
+
+    print(f"   Migrated: {stats['migrated']} in {stats['passes']} pass(es)")
+    print(f"   Skipped:  {stats['skipped']} (left to expire)")
+
+
+if __name__ == '__main__':
+    main()
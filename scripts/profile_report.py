@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Aggregates the profiles written by src/utils/profiler.py. Reports the wall
+# time of the profiled requests split into CPU and waiting (from the thread's
+# CPU clock), what the samples were doing (network I/O, waiting on another
+# thread or lock, or anything else, mostly running Python) with the wall time
+# that share stands for, and the top functions by self and total samples.
+#
+#   PROFILE_ENABLED=true python scripts/load_test.py --scenario comment
+#   python scripts/profile_report.py
+#   python scripts/profile_report.py --handler slack_webhook --top 30 --folded stacks.txt
+#
+# The --folded output is the collapsed-stack format flamegraph.pl and
+# speedscope read.
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from load_test import percentile  # noqa: E402
+
+
+def load_profiles(directory: str, handler: str = None) -> List[Dict[str, Any]]:
+    profiles = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if handler is None or profile['handler'] == handler:
+            profiles.append(profile)
+    return profiles
+
+
+def aggregate(profiles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    stacks: Counter = Counter()
+    activity: Counter = Counter()
+    self_samples: Counter = Counter()
+    total_samples: Counter = Counter()
+    for profile in profiles:
+        activity.update(profile['activity'])
+        for stack, count in profile['stacks'].items():
+            stacks[stack] += count
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+
+    walls = [profile['wall_ms'] for profile in profiles]
+    wall = sum(walls)
+    cpu = sum(profile['cpu_ms'] for profile in profiles)
+    return {
+        'profiles': len(profiles),
+        'handlers': dict(Counter(profile['handler'] for profile in profiles)),
+        'wall_ms': wall,
+        'cpu_ms': cpu,
+        'waiting_ms': max(0.0, wall - cpu),
+        'wall_p50_ms': percentile(walls, 50) if walls else 0.0,
+        'wall_p95_ms': percentile(walls, 95) if walls else 0.0,
+        'samples': sum(activity.values()),
+        'activity': dict(activity),
+        'self': self_samples,
+        'total': total_samples,
+        'stacks': stacks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise request profiles')
+    parser.add_argument('--dir', default=os.getenv('PROFILE_DIR', '/tmp/marites-profiles'))
+    parser.add_argument('--handler', choices=['github_webhook', 'slack_webhook'])
+    parser.add_argument('--top', type=int, default=20, help='Functions to list')
+    parser.add_argument('--folded', help='Also write the merged stacks in collapsed format to this file')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dir):
+        sys.exit(f'No profiles in {args.dir}')
+    summary = aggregate(load_profiles(args.dir, args.handler))
+    if not summary['profiles']:
+        sys.exit(f'No profiles in {args.dir}')
+
+    if args.folded:
+        with open(args.folded, 'w') as f:
+            for stack, count in summary['stacks'].most_common():
+                f.write(f'{stack} {count}\n')
+
+    samples = summary['samples'] or 1
+    top_self = summary['self'].most_common(args.top)
+    top_total = summary['total'].most_common(args.top)
+
+    if args.json:
+        report = {key: value for key, value in summary.items() if key not in ('self', 'total', 'stacks')}
+        report.update(top_self=top_self, top_total=top_total)
+        print(json.dumps(report, indent=2))
+        return
+
+    wall = summary['wall_ms'] or 1
+    handlers = ', '.join(f'{name} {count}' for name, count in summary['handlers'].items())
+    print(f"🔬 {summary['profiles']} profiles ({handlers}), {summary['samples']} samples")
+    print("=" * 60)
+    print(f"   wall {summary['wall_ms']:.1f}ms  p50 {summary['wall_p50_ms']:.1f}ms  "
+          f"p95 {summary['wall_p95_ms']:.1f}ms")
+    print(f"   cpu      {summary['cpu_ms']:10.1f}ms  {summary['cpu_ms'] / wall:6.1%}")
+    print(f"   waiting  {summary['waiting_ms']:10.1f}ms  {summary['waiting_ms'] / wall:6.1%}")
+
+    print("\n📊 Samples by activity")
+    for activity in ('network', 'wait', 'cpu'):
+        count = summary['activity'].get(activity, 0)
+        print(f"   {activity:<8} {count:8}  {count / samples:6.1%}  ~{summary['wall_ms'] * count / samples:.1f}ms")
+
+    print(f"\n🔥 Top {args.top} functions by self samples")
+    for frame, count in top_self:
+        print(f"   {count / samples:6.1%}  {frame}")
+
+    print(f"\n📚 Top {args.top} functions by total samples")
+    for frame, count in top_total:
+        print(f"   {count / samples:6.1%}  {frame}")
+
+
+if __name__ == '__main__':
+    main()
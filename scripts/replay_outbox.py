@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Replays the Slack outbox: GitHub notifications that could not be sent to
+# Slack, queued with their rendered message. Run it once Slack is back to
+# clear the backlog in one go; /outbox/replay does the same on a schedule,
+# but only for entries whose backoff has passed and within one request.
+#
+#   python scripts/replay_outbox.py --list
+#   python scripts/replay_outbox.py --all
+#   python scripts/replay_outbox.py --limit 100 --batch-size 20
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.slack import SlackOutbox, create_slack_client  # noqa: E402
+from src.storage import KVStore  # noqa: E402
+from src.utils import Config  # noqa: E402
+
+
+def main():
+    config = Config()
+    parser = argparse.ArgumentParser(description='Replay queued Slack deliveries')
+    parser.add_argument('--list', action='store_true', help='List the queued deliveries without sending')
+    parser.add_argument('--all', action='store_true', help='Also replay entries still backing off')
+    parser.add_argument('--limit', type=int, help='Replay at most this many entries')
+    parser.add_argument('--batch-size', type=int, default=config.outbox_batch_size)
+    args = parser.parse_args()
+
+    kv_store = KVStore.from_config(config)
+
+    if args.list:
+        entries = kv_store.get_outbox()
+        print(f"📮 {len(entries)} queued Slack deliveries")
+        print("=" * 60)
+        now = time.time()
+        for entry_id, entry in sorted(entries.items(), key=lambda item: item[1].get('created_at', 0)):
+            wait = max(0.0, entry.get('next_attempt_at', 0) - now)
+            print(f"   {entry_id:<24} {entry['delivery']['method']:<7} attempts {entry.get('attempts', 0):<3} "
+                  f"next in {wait:6.0f}s  {entry.get('last_error') or ''}")
+        return
+
+    outbox = SlackOutbox.from_config(config, kv_store, create_slack_client(config))
+    print(f"📮 Replaying Slack outbox{' (ignoring backoff)' if args.all else ''}")
+    print("=" * 60)
+    stats = outbox.replay(args.batch_size, limit=args.limit, due_only=not args.all, lease_ttl=3600)
+    print(f"   Sent:     {stats['sent']}")
+    print(f"   Retrying: {stats['retrying']}")
+    print(f"   Dropped:  {stats['dropped']}")
+    print(f"   Left:     {stats['left']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# Storage backend benchmark. Replays the KVStore calls made for one
+# forwarded review comment (dedupe and PR cache check, author lookup, mapping
+# write, thread lookup from a reply) from concurrent threads against each
+# backend and reports per-operation latency and deliveries per second.
+#
+#   python scripts/storage_benchmark.py --backends upstash sqlite --deliveries 2000
+#   python scripts/storage_benchmark.py --rest-url https://... --rest-token ...
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fake_services import FakeUpstash  # noqa: E402
+from load_test import percentile  # noqa: E402
+from src.storage import KVStore  # noqa: E402
+from src.storage.backends import (MemoryBackend, RedisBackend, SqliteBackend,  # noqa: E402
+                                  StorageBackend, UpstashBackend)
+
+BACKENDS = ['upstash', 'redis', 'sqlite', 'memory']
+
+
+def delivery(kv_store: KVStore, i: int, authors: int) -> Dict[str, float]:
+    timings = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        timings[name] = (time.perf_counter() - start) * 1000
+        return result
+
+    comment_id = 10_000_000 + i
+    thread_ts = f'1700000000.{i:06d}'
+    timed('comment_state', kv_store.get_comment_state, comment_id, 'marites/bench', i % 500)
+    timed('author_lookup', kv_store.get_github_to_slack_mapping, f'author{i % authors}')
+    timed('save_delivery', kv_store.save_conversation, comment_id,
+          {'channel': 'D1', 'thread_ts': thread_ts, 'message_ts': thread_ts},
+          {'comment_id': comment_id, 'installation_id': 1, 'repo_full_name': 'marites/bench',
+           'pr_number': i % 500, 'type': 'review_comment'})
+    timed('thread_lookup', kv_store.get_thread_mapping, thread_ts)
+    return timings
+
+
+def run(name: str, backend: StorageBackend, deliveries: int, concurrency: int,
+        authors: int) -> Dict[str, Any]:
+    kv_store = KVStore(backend)
+    for i in range(authors):
+        kv_store.save_github_to_slack_mapping(f'author{i}', f'U{i}')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(lambda i: delivery(kv_store, i, authors), range(deliveries)))
+    elapsed = time.perf_counter() - start
+
+    operations = defaultdict(list)
+    for timings in samples:
+        for operation, ms in timings.items():
+            operations[operation].append(ms)
+
+    return {
+        'backend': name,
+        'deliveries': deliveries,
+        'deliveries_per_second': deliveries / elapsed,
+        'operations': {
+            operation: {'p50_ms': percentile(values, 50), 'p95_ms': percentile(values, 95)}
+            for operation, values in operations.items()
+        },
+    }
+
+
+def create(name: str, args, fakes: List[FakeUpstash]) -> StorageBackend:
+    if name == 'upstash':
+        if args.rest_url:
+            return UpstashBackend(args.rest_url, args.rest_token)
+        fake = FakeUpstash(args.latency).start()
+        fakes.append(fake)
+        return UpstashBackend(fake.url, 'benchmark')
+    if name == 'redis':
+        return RedisBackend(args.redis_url, pool_size=args.concurrency)
+    if name == 'sqlite':
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.sqlite_path + suffix):
+                os.remove(args.sqlite_path + suffix)
+        return SqliteBackend(args.sqlite_path)
+    return MemoryBackend()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark KVStore storage backends')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['upstash', 'sqlite', 'memory'])
+    parser.add_argument('--deliveries', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--authors', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.002,
+                        help='Artificial latency in seconds added by the local Upstash fake')
+    parser.add_argument('--rest-url', help='Benchmark a real Upstash database instead of the fake')
+    parser.add_argument('--rest-token', default='')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0')
+    parser.add_argument('--sqlite-path', default=os.path.join(tempfile.gettempdir(), 'marites-benchmark.db'))
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    logging.getLogger('src').setLevel(logging.WARNING)
+
+    fakes: List[FakeUpstash] = []
+    results = []
+    for name in args.backends:
+        backend = create(name, args, fakes)
+        try:
+            results.append(run(name, backend, args.deliveries, args.concurrency, args.authors))
+        finally:
+            backend.close()
+
+    for fake in fakes:
+        fake.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"🗄️  Storage benchmark ({args.deliveries} deliveries, concurrency {args.concurrency})")
+    print("=" * 60)
+    for result in results:
+        print(f"\n📊 {result['backend']}: {result['deliveries_per_second']:.0f} deliveries/s")
+        for operation, stats in result['operations'].items():
+            print(f"   {operation:<15} p50 {stats['p50_ms']:7.2f}ms  p95 {stats['p95_ms']:7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
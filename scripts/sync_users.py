@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Bulk-registers Slack users from the workspace directory (users.list),
+# matched to GitHub logins through a CSV and/or a custom profile field.
+# Uses the Slack token and storage configured in the environment.
+#
+#   python scripts/sync_users.py --csv engineers.csv --dry-run
+#   python scripts/sync_users.py --profile-field Xf0123ABCD --prune
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.slack.client import SlackClient  # noqa: E402
+from src.storage import KVStore  # noqa: E402
+from src.utils import Config  # noqa: E402
+from src.utils.user_directory import load_csv_mappings, sync_users  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync Slack users to GitHub logins in bulk')
+    parser.add_argument('--csv', help='CSV with github_username and slack_user_id and/or email columns')
+    parser.add_argument('--profile-field', help='ID of the custom Slack profile field holding the GitHub login')
+    parser.add_argument('--profile-workers', type=int, default=8,
+                        help='Concurrent users.profile.get calls when reading profile fields')
+    parser.add_argument('--prune', action='store_true', help='Unregister deactivated Slack accounts')
+    parser.add_argument('--dry-run', action='store_true', help='Report the diff without writing')
+    parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+    args = parser.parse_args()
+
+    if not args.csv and not args.profile_field:
+        parser.error('one of --csv or --profile-field is required')
+
+    config = Config()
+    slack_client = SlackClient(config.slack_bot_token, base_url=config.slack_api_url)
+    kv_store = KVStore.from_config(config)
+    csv_mappings = load_csv_mappings(args.csv) if args.csv else None
+
+    report = sync_users(slack_client, kv_store, csv_mappings=csv_mappings,
+                        profile_field=args.profile_field, prune=args.prune,
+                        dry_run=args.dry_run, profile_workers=args.profile_workers)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"👥 Slack directory sync{' (dry run)' if args.dry_run else ''}")
+    print("=" * 60)
+    for item in report['added']:
+        print(f"   + {item['slack_user_id']} -> {item['github_username']}")
+    for item in report['changed']:
+        print(f"   ~ {item['slack_user_id']}: {item['from']} -> {item['to']}")
+    for user_id in report['removed']:
+        print(f"   - {user_id} (deactivated)")
+    for item in report['invalid']:
+        print(f"   ! {item['slack_user_id']}: not a GitHub login: {item['value']!r}")
+    for key in report['unknown']:
+        print(f"   ? {key}: in the CSV but not in Slack")
+
+    print(f"\n   Added: {len(report['added'])}  Changed: {len(report['changed'])}  "
+          f"Unchanged: {report['unchanged']}  Removed: {len(report['removed'])}")
+    print(f"   Unmatched Slack users: {report['unmatched']}  Invalid: {len(report['invalid'])}  "
+          f"Unknown CSV rows: {len(report['unknown'])}")
+    if not args.dry_run:
+        print(f"   Saved: {report['saved']}")
+
+
+if __name__ == '__main__':
+    main()
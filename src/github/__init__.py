@@ -1,6 +1,30 @@
-from .client import GitHubClient
+import importlib
+from typing import TYPE_CHECKING
+
 from .webhook import GitHubWebhookHandler
 from .code_context import CodeContextExtractor
+from .snippet_cache import SnippetCache, get_snippet_cache
+
+if TYPE_CHECKING:
+    from .client import GitHubClient
+
+__all__ = ['GitHubClient', 'GitHubWebhookHandler', 'CodeContextExtractor', 'SnippetCache',
+           'create_github_client', 'get_snippet_cache']
+
+# PyGithub, requests and PyJWT take longer to import than most requests take
+# to serve, so the client module is only loaded once something uses it
+_LAZY = {'GitHubClient': '.client'}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
 
-__all__ = ['GitHubClient', 'GitHubWebhookHandler', 'CodeContextExtractor']
 
+def create_github_client(config) -> 'GitHubClient':
+    from .client import GitHubClient
+    return GitHubClient(config.github_app_id, config.github_private_key,
+                        base_url=config.github_api_url)
@@ -1,15 +1,104 @@
 import jwt
+import math
 import time
+import threading
 import requests
-from typing import Optional, Dict, Any
-from github import Github, GithubIntegration, Auth
+from urllib.parse import urlparse
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+from github import Github, GithubIntegration, Auth, GithubException, UnknownObjectException
+from github.PullRequest import PullRequest
+from github.Requester import HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass, Requester
+from src.utils.deadline import call_timeout
+from src.utils.resilience import RetryPolicy, call_with_resilience, get_breaker
+from src.utils.singleflight import SingleFlight
+
+# Shared by every GitHubClient in the process: handlers build a client per
+# request, and concurrent requests for the same installation should reuse
+# one token and one in-flight fetch
+_flights = SingleFlight()
+_installation_tokens: Dict[Any, Dict[str, Any]] = {}
+_installation_tokens_lock = threading.Lock()
+
+# Authenticated SDK objects, kept so their HTTP sessions (and the TLS
+# connections in them) outlive a single call. Least recently used
+# installations are dropped beyond the bound
+CLIENT_POOL_SIZE = 32
+CONNECTIONS_PER_CLIENT = 8
+_clients: 'OrderedDict[Tuple[Any, ...], Tuple[Github, _InstallationToken]]' = OrderedDict()
+_integrations: Dict[Tuple[Any, ...], GithubIntegration] = {}
+_clients_lock = threading.Lock()
+
+
+class _InstallationToken(Auth.Token):
+    # PyGithub reads the token for every request, so a pooled client picks
+    # up a rotated installation token without being rebuilt
+    def rotate(self, token: str) -> None:
+        self._token = token
+
+
+class _DeadlineTimeout:
+    # A pooled client outlives the request that created it, so the timeout
+    # is taken from the current request's deadline when each call is made
+    @property
+    def timeout(self) -> float:
+        return call_timeout(self._default_timeout)
+
+    @timeout.setter
+    def timeout(self, value: float) -> None:
+        self._default_timeout = value
+
+
+class _HTTPConnection(_DeadlineTimeout, HTTPRequestsConnectionClass):
+    pass
+
+
+class _HTTPSConnection(_DeadlineTimeout, HTTPSRequestsConnectionClass):
+    pass
+
+
+def _use_deadline_timeouts(requester: Requester) -> None:
+    # Requester.injectConnectionClasses would apply to every requester in
+    # the process and turn off connection reuse; set it on this one only
+    scheme = urlparse(requester.base_url).scheme
+    requester._Requester__connectionClass = _HTTPSConnection if scheme == 'https' else _HTTPConnection
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, GithubException):
+        return error.status >= 500 or error.status == 429
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(error, requests.RequestException)
 
 
 class GitHubClient:
-    def __init__(self, app_id: str, private_key: str):
+    PAGE_SIZE = 100
+
+    def __init__(self, app_id: str, private_key: str, timeout: float = 15,
+                 base_url: str = 'https://api.github.com'):
         self.app_id = app_id
         self.private_key = private_key
-        self._installation_tokens = {}
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retry = RetryPolicy(attempts=3, base_delay=0.2, max_delay=1.0)
+        self._breaker = get_breaker('github')
+
+    def _call(self, func, *args, idempotent: bool = True, **kwargs) -> Any:
+        return call_with_resilience(
+            self._breaker,
+            func,
+            *args,
+            retry=self.retry if idempotent else None,
+            is_transient=_is_transient,
+            **kwargs
+        )
+
+    def _sdk_timeout(self) -> int:
+        # PyGithub only accepts whole seconds. This is the default for pooled
+        # clients; each request is still capped by the deadline
+        return max(1, math.ceil(self.timeout))
 
     def _generate_jwt(self) -> str:
         payload = {
@@ -19,10 +108,26 @@ class GitHubClient:
         }
         return jwt.encode(payload, self.private_key, algorithm='RS256')
 
-    def _get_installation_token(self, installation_id: int) -> str:
-        cached = self._installation_tokens.get(installation_id)
+    def _cached_installation_token(self, installation_id: int) -> Optional[str]:
+        with _installation_tokens_lock:
+            cached = _installation_tokens.get((self.app_id, installation_id))
         if cached and cached['expires_at'] > time.time() + 60:
             return cached['token']
+        return None
+
+    def _get_installation_token(self, installation_id: int) -> str:
+        token = self._cached_installation_token(installation_id)
+        if token:
+            return token
+        return _flights.do(('installation_token', self.app_id, installation_id),
+                           self._mint_installation_token, installation_id)
+
+    def _mint_installation_token(self, installation_id: int) -> str:
+        # Another caller may have finished minting between our cache miss and
+        # becoming the leader
+        token = self._cached_installation_token(installation_id)
+        if token:
+            return token
 
         jwt_token = self._generate_jwt()
         headers = {
@@ -30,34 +135,87 @@ class GitHubClient:
             'Accept': 'application/vnd.github.v3+json'
         }
 
-        url = f'https://api.github.com/app/installations/{installation_id}/access_tokens'
-        response = requests.post(url, headers=headers)
-        response.raise_for_status()
-
-        data = response.json()
-        self._installation_tokens[installation_id] = {
-            'token': data['token'],
-            'expires_at': time.time() + 3600
-        }
+        url = f'{self.base_url}/app/installations/{installation_id}/access_tokens'
+        data = self._call(self._request_token, url, headers)
+        with _installation_tokens_lock:
+            _installation_tokens[(self.app_id, installation_id)] = {
+                'token': data['token'],
+                'expires_at': time.time() + 3600
+            }
 
         return data['token']
 
+    def _request_token(self, url: str, headers: Dict[str, str]) -> Dict[str, Any]:
+        response = requests.post(url, headers=headers,
+                                 timeout=call_timeout(self.timeout))
+        response.raise_for_status()
+        return response.json()
+
     def get_client(self, installation_id: int) -> Github:
         token = self._get_installation_token(installation_id)
-        auth = Auth.Token(token)
-        return Github(auth=auth)
+        key = (self.app_id, self.base_url, installation_id)
+        with _clients_lock:
+            pooled = _clients.get(key)
+            if pooled:
+                _clients.move_to_end(key)
+        if not pooled:
+            pooled = self._pool_client(key, token)
+
+        client, auth = pooled
+        if auth.token != token:
+            auth.rotate(token)
+        return client
+
+    def _pool_client(self, key: Tuple[Any, ...], token: str) -> Tuple[Github, _InstallationToken]:
+        auth = _InstallationToken(token)
+        # PyGithub's built-in retry sleeps without regard to the request
+        # budget; retries are handled by self._call instead. Its request
+        # spacing would serialise every caller sharing the pooled client
+        client = Github(auth=auth, base_url=self.base_url,
+                        timeout=self._sdk_timeout(), retry=None,
+                        per_page=self.PAGE_SIZE, pool_size=CONNECTIONS_PER_CLIENT,
+                        seconds_between_requests=None, seconds_between_writes=None)
+        _use_deadline_timeouts(client._Github__requester)
+        with _clients_lock:
+            # Keep the first client if another thread built one meanwhile
+            pooled = _clients.setdefault(key, (client, auth))
+            _clients.move_to_end(key)
+            while len(_clients) > CLIENT_POOL_SIZE:
+                _clients.popitem(last=False)
+        return pooled
 
     def get_integration(self) -> GithubIntegration:
+        # AppAuth signs a fresh JWT for every request, so one integration per
+        # app can be shared indefinitely
+        key = (self.app_id, self.base_url)
+        with _clients_lock:
+            integration = _integrations.get(key)
+        if integration:
+            return integration
+
         auth = Auth.AppAuth(self.app_id, self.private_key)
-        return GithubIntegration(auth=auth)
+        integration = GithubIntegration(auth=auth, base_url=self.base_url,
+                                        timeout=self._sdk_timeout(), retry=None,
+                                        pool_size=CONNECTIONS_PER_CLIENT,
+                                        seconds_between_requests=None, seconds_between_writes=None)
+        _use_deadline_timeouts(integration._GithubIntegration__requester)
+        with _clients_lock:
+            return _integrations.setdefault(key, integration)
+
+    def _lazy_pull(self, installation_id: int, repo_full_name: str, pr_number: int) -> PullRequest:
+        # Only the PR's URL is needed to act on it, so no get_repo/get_pull
+        # round trips; PyGithub fetches the rest only if an attribute is read
+        client = self.get_client(installation_id)
+        repo = client.get_repo(repo_full_name, lazy=True)
+        return PullRequest(repo._requester, {}, {'url': f'{repo.url}/pulls/{pr_number}',
+                                                 'number': pr_number}, completed=False)
 
     def post_comment_reply(self, installation_id: int, repo_full_name: str,
                           pr_number: int, comment_id: int, body: str) -> Dict[str, Any]:
-        client = self.get_client(installation_id)
-        repo = client.get_repo(repo_full_name)
-        pull = repo.get_pull(pr_number)
+        pull = self._lazy_pull(installation_id, repo_full_name, pr_number)
 
-        comment = pull.create_review_comment_reply(comment_id, body)
+        comment = self._call(pull.create_review_comment_reply, comment_id, body,
+                             idempotent=False)
 
         return {
             'id': comment.id,
@@ -67,37 +225,79 @@ class GitHubClient:
 
     def get_file_content(self, installation_id: int, repo_full_name: str,
                         path: str, ref: str) -> str:
+        return _flights.do(('file', installation_id, repo_full_name, path, ref),
+                           self._fetch_file_content, installation_id, repo_full_name, path, ref)
+
+    def _fetch_file_content(self, installation_id: int, repo_full_name: str,
+                            path: str, ref: str) -> str:
         client = self.get_client(installation_id)
-        repo = client.get_repo(repo_full_name)
+        repo = client.get_repo(repo_full_name, lazy=True)
 
+        # Only a missing file means "no content"; outages and auth failures
+        # are raised so callers can tell the difference
+        try:
+            content = self._call(repo.get_contents, path, ref=ref)
+        except UnknownObjectException:
+            return ""
+        if isinstance(content, list):
+            return ""
         try:
-            content = repo.get_contents(path, ref=ref)
-            if isinstance(content, list):
-                return ""
             return content.decoded_content.decode('utf-8')
-        except Exception:
+        except UnicodeDecodeError:
             return ""
 
-    def find_prs_by_author(self, installation_id: int, username: str,
-                          state: str = 'open') -> list:
-        client = self.get_client(installation_id)
+    def get_installations(self) -> List[Dict[str, Any]]:
         integration = self.get_integration()
+        return [{'id': installation.id, 'account': installation.raw_data.get('account', {}).get('login')}
+                for installation in self._call(lambda: list(integration.get_installations()))]
 
-        prs = []
-        for installation in integration.get_installations():
-            for repo in installation.get_repos():
-                try:
-                    pulls = repo.get_pulls(state=state)
-                    for pr in pulls:
-                        if pr.user and pr.user.login == username:
-                            prs.append({
-                                'repo': repo.full_name,
-                                'number': pr.number,
-                                'title': pr.title,
-                                'html_url': pr.html_url
-                            })
-                except Exception:
-                    continue
+    @staticmethod
+    def _pull_from_issue(issue) -> Dict[str, Any]:
+        # Search results are issues. Only attributes present in the result
+        # are read: issue.repository or raw_data would fetch the full object,
+        # one request per result
+        owner, name = urlparse(issue.html_url).path.split('/')[1:3]
+        created_at = issue.created_at
+        return {
+            'repo': f'{owner}/{name}',
+            'number': issue.number,
+            'title': issue.title,
+            'html_url': issue.html_url,
+            'author': issue.user.login if issue.user else None,
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ') if created_at else None,
+        }
 
-        return prs
+    def search_pull_requests(self, installation_id: int, query: str) -> List[Dict[str, Any]]:
+        # The search API stops at 1,000 results per query, so results are
+        # read oldest first and the query restarted from the last creation
+        # time seen until a window comes back short
+        client = self.get_client(installation_id)
+        pulls: Dict[Any, Dict[str, Any]] = {}
+        since = None
+        while True:
+            window = f'{query} created:>={since}' if since else query
+            results = client.search_issues(window, sort='created', order='asc')
+            previous, found = since, 0
+            for page in range(10):
+                issues = self._call(results.get_page, page)
+                for issue in issues:
+                    pull = self._pull_from_issue(issue)
+                    pulls[(pull['repo'], pull['number'])] = pull
+                    since = pull['created_at'] or since
+                found += len(issues)
+                if len(issues) < self.PAGE_SIZE:
+                    return list(pulls.values())
+            if found < 1000 or since == previous:
+                return list(pulls.values())
 
+    def find_prs_by_author(self, installation_id: int, username: str,
+                          state: str = 'open') -> list:
+        # One search per installation instead of listing every open PR of
+        # every repository
+        prs = []
+        for installation in self.get_installations():
+            qualifier = f' user:{installation["account"]}' if installation['account'] else ''
+            for pull in self.search_pull_requests(
+                    installation['id'], f'is:pr state:{state} author:{username}{qualifier}'):
+                prs.append({key: pull[key] for key in ('repo', 'number', 'title', 'html_url')})
+        return prs
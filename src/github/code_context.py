@@ -1,5 +1,7 @@
 from typing import Dict, Any, List
 
+from src.slack.mrkdwn import escape
+
 
 class CodeContextExtractor:
     def __init__(self, context_lines: int = 5):
@@ -73,10 +75,11 @@ class CodeContextExtractor:
         lines = code.split('\n')
         formatted_lines = []
 
+        # Slack reads &, < and > as markup, code blocks included
         for i, line in enumerate(lines):
             current_line = start + i
             prefix = '→ ' if current_line == highlighted else '  '
-            formatted_lines.append(f"{prefix}{current_line:4d} | {line}")
+            formatted_lines.append(f"{prefix}{current_line:4d} | {escape(line)}")
 
         return f"_{file_path}_\n```\n" + '\n'.join(formatted_lines) + "\n```"
 
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+from src.storage.backends import KVError
+from src.utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    from src.storage import KVStore
+
+logger = setup_logger()
+
+
+# Rendered code-context blocks keyed by repo, commit SHA, path and line
+# window. A commit's content never changes, so entries are never stale and
+# only evicted for space: least recently used first, once the encoded size
+# of all entries exceeds max_bytes. An optional KV tier shares snippets
+# between instances; it is only read on a local miss.
+class SnippetCache:
+    # Hit rate is logged every this many lookups
+    REPORT_EVERY = 1000
+
+    def __init__(self, max_bytes: int, kv_tier: bool = False):
+        self.max_bytes = max_bytes
+        self.kv_tier = kv_tier
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'kv_hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def key(repo: str, sha: str, path: str, line: int, context_lines: int) -> str:
+        return f'{repo}@{sha}:{path}#{line}+-{context_lines}'
+
+    def get(self, key: str, kv_store: Optional['KVStore'] = None) -> Optional[str]:
+        with self._lock:
+            snippet = self._entries.get(key)
+            if snippet is not None:
+                self._entries.move_to_end(key)
+        if snippet is not None:
+            self._record('hits')
+            return snippet
+
+        if self.kv_tier and kv_store is not None:
+            try:
+                snippet = kv_store.get_snippet(self._digest(key))
+            except KVError as e:
+                logger.warning('Could not read snippet cache: %s', e)
+            if snippet is not None:
+                self._store(key, snippet)
+                self._record('kv_hits')
+                return snippet
+
+        self._record('misses')
+        return None
+
+    def put(self, key: str, snippet: str, kv_store: Optional['KVStore'] = None) -> None:
+        self._store(key, snippet)
+        if self.kv_tier and kv_store is not None:
+            kv_store.save_snippet(self._digest(key), snippet)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats, entries=len(self._entries), bytes=self._size)
+        lookups = stats['hits'] + stats['kv_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['kv_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def _record(self, outcome: str) -> None:
+        with self._lock:
+            self._stats[outcome] += 1
+            lookups = self._stats['hits'] + self._stats['kv_hits'] + self._stats['misses']
+        if lookups % self.REPORT_EVERY == 0:
+            stats = self.stats()
+            logger.info('Snippet cache: %.1f%% hit rate over %s lookups (%s from KV), %s entries, %s bytes',
+                        stats['hit_rate'] * 100, lookups, stats['kv_hits'], stats['entries'], stats['bytes'])
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    @staticmethod
+    def _cost(key: str, snippet: str) -> int:
+        return len(key.encode()) + len(snippet.encode())
+
+    def _store(self, key: str, snippet: str) -> None:
+        cost = self._cost(key, snippet)
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= self._cost(key, previous)
+            self._entries[key] = snippet
+            self._size += cost
+            while self._size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._size -= self._cost(evicted_key, evicted)
+                self._stats['evictions'] += 1
+
+
+_cache: Optional[SnippetCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_snippet_cache(config) -> SnippetCache:
+    # One cache per process, so warm instances keep it across requests
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SnippetCache(config.snippet_cache_bytes, kv_tier=config.snippet_cache_kv)
+        return _cache
@@ -1,6 +1,6 @@
 import hmac
 import hashlib
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence
 
 
 class GitHubWebhookHandler:
@@ -29,13 +29,11 @@ class GitHubWebhookHandler:
         repository = payload.get('repository', {})
         installation = payload.get('installation', {})
 
+        # Comments by the PR author still reach reviewers and other
+        # participants; whoever wrote it is left out of the recipients
         pr_author = pull_request.get('user', {}).get('login', '')
         comment_author = comment.get('user', {}).get('login', '')
 
-        # Don't notify about self-comments
-        if comment_author == pr_author:
-            return None
-
         return {
             'installation_id': installation.get('id'),
             'repo_full_name': repository.get('full_name'),
@@ -43,7 +41,10 @@ class GitHubWebhookHandler:
             'pr_number': pull_request.get('number'),
             'pr_title': pull_request.get('title'),
             'pr_url': pull_request.get('html_url'),
+            'pr_author': pr_author,
             'comment_id': comment.get('id'),
+            # Set on replies; always the id of the thread's top-level comment
+            'in_reply_to_id': comment.get('in_reply_to_id'),
             'comment_body': comment.get('body', ''),
             'comment_url': comment.get('html_url'),
             'comment_author': comment_author,
@@ -72,10 +73,6 @@ class GitHubWebhookHandler:
         pr_author = pull_request.get('user', {}).get('login', '')
         review_author = review.get('user', {}).get('login', '')
 
-        # Don't notify about self-reviews
-        if review_author == pr_author:
-            return None
-
         return {
             'installation_id': installation.get('id'),
             'repo_full_name': repository.get('full_name'),
@@ -83,6 +80,7 @@ class GitHubWebhookHandler:
             'pr_number': pull_request.get('number'),
             'pr_title': pull_request.get('title'),
             'pr_url': pull_request.get('html_url'),
+            'pr_author': pr_author,
             'review_id': review.get('id'),
             'review_body': review.get('body', ''),
             'review_url': review.get('html_url'),
@@ -90,3 +88,66 @@ class GitHubWebhookHandler:
             'review_state': review.get('state'),
         }
 
+    @staticmethod
+    def actor(payload: Dict[str, Any]) -> str:
+        # Who wrote the comment or review; never notified about their own
+        source = payload.get('comment') or payload.get('review') or payload.get('sender') or {}
+        if 'user' in source:
+            source = source['user'] or {}
+        return source.get('login', '')
+
+    @staticmethod
+    def notify_logins(payload: Dict[str, Any], roles: Sequence[str]) -> List[str]:
+        # The GitHub logins to notify by role, PR author first; earlier
+        # thread participants are not in the payload and are looked up
+        pull_request = payload.get('pull_request') or {}
+        logins = []
+        if 'author' in roles:
+            logins.append((pull_request.get('user') or {}).get('login', ''))
+        if 'reviewers' in roles:
+            logins.extend(user.get('login', '') for user in pull_request.get('requested_reviewers') or [])
+        if 'assignees' in roles:
+            logins.extend(user.get('login', '') for user in pull_request.get('assignees') or [])
+        return [login for login in dict.fromkeys(logins) if login]
+
+    def parse_pull_request(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        pull_request = payload.get('pull_request')
+        if not pull_request:
+            return None
+
+        repository = payload.get('repository', {})
+        installation = payload.get('installation', {})
+
+        return {
+            'action': payload.get('action'),
+            'installation_id': installation.get('id'),
+            'repo_full_name': repository.get('full_name'),
+            'pr_number': pull_request.get('number'),
+            'pr_title': pull_request.get('title'),
+            'pr_url': pull_request.get('html_url'),
+            'pr_author': pull_request.get('user', {}).get('login', ''),
+            'state': pull_request.get('state'),
+            'metadata': self.pr_metadata(pull_request),
+        }
+
+    @staticmethod
+    def pr_metadata(pull_request: Dict[str, Any]) -> Dict[str, Any]:
+        # The PR-level facts cached in KV (see KVStore.save_pr_metadata).
+        # The changed file list is deliberately not cached: listing it cost
+        # up to 30 GitHub calls per push, and a comment on a deleted file
+        # falls back to its diff hunk without it
+        base = pull_request.get('base', {})
+        head = pull_request.get('head', {})
+        return {
+            'title': pull_request.get('title'),
+            'author': pull_request.get('user', {}).get('login', ''),
+            'html_url': pull_request.get('html_url'),
+            'state': pull_request.get('state'),
+            'draft': pull_request.get('draft', False),
+            'merged': pull_request.get('merged', False),
+            'base_ref': base.get('ref'),
+            'base_sha': base.get('sha'),
+            'head_ref': head.get('ref'),
+            'head_sha': head.get('sha'),
+            'updated_at': pull_request.get('updated_at'),
+        }
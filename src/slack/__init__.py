@@ -1,6 +1,30 @@
-from .client import SlackClient
+import importlib
+from typing import TYPE_CHECKING
+
+from .errors import SlackError
 from .formatter import MessageFormatter
+from .outbox import SlackOutbox
 from .webhook import SlackWebhookHandler
 
-__all__ = ['SlackClient', 'MessageFormatter', 'SlackWebhookHandler']
+if TYPE_CHECKING:
+    from .client import SlackClient
+
+__all__ = ['SlackClient', 'MessageFormatter', 'SlackWebhookHandler', 'SlackOutbox', 'SlackError',
+           'create_slack_client']
+
+# slack_sdk is only loaded once a client is needed; URL verification and
+# ignored events never talk to Slack
+_LAZY = {'SlackClient': '.client'}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
+def create_slack_client(config) -> 'SlackClient':
+    from .client import SlackClient
+    return SlackClient(config.slack_bot_token, base_url=config.slack_api_url)
@@ -1,23 +1,90 @@
+import socket
+from urllib.error import URLError
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
+from src.utils.deadline import call_timeout
+from src.utils.resilience import RetryPolicy, call_with_resilience, get_breaker
+from .errors import SlackError
+
+# Error codes Slack can answer with a 200 that still mean it is struggling
+_TRANSIENT_CODES = {'ratelimited', 'internal_error', 'fatal_error', 'service_unavailable',
+                    'request_timeout'}
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, SlackApiError):
+        status = error.response.status_code
+        return status >= 500 or status == 429 or _error_code(error) in _TRANSIENT_CODES
+    return isinstance(error, (URLError, socket.timeout, ConnectionError))
+
+
+def _error_code(error: SlackApiError) -> str:
+    return error.response.get('error') or 'unknown_error'
+
+
+def _slack_error(error: SlackApiError) -> SlackError:
+    return SlackError(_error_code(error), transient=_is_transient(error))
 
 
 class SlackClient:
-    def __init__(self, bot_token: str):
-        self.client = WebClient(token=bot_token)
+    def __init__(self, bot_token: str, timeout: float = 30,
+                 base_url: str = WebClient.BASE_URL):
+        self.client = WebClient(token=bot_token, timeout=timeout, base_url=base_url)
+        self.timeout = timeout
+        self.retry = RetryPolicy(attempts=3, base_delay=0.2, max_delay=1.0)
+        self._breaker = get_breaker('slack')
         self._user_cache = {}
 
+    def _api(self):
+        # WebClient reads its timeout per request, so narrow it to what is
+        # left of the current request's budget before every call
+        self.client.timeout = call_timeout(self.timeout)
+        return self.client
+
+    def _invoke(self, method: str, **kwargs) -> Any:
+        return getattr(self._api(), method)(**kwargs)
+
+    def _call(self, method: str, idempotent: bool = False, **kwargs) -> Any:
+        # Posting is not idempotent, so only lookups are retried; every call
+        # goes through the shared breaker so an outage fails fast
+        return call_with_resilience(
+            self._breaker,
+            self._invoke,
+            method,
+            retry=self.retry if idempotent else None,
+            is_transient=_is_transient,
+            **kwargs
+        )
+
     def get_user_id_by_email(self, email: str) -> Optional[str]:
         try:
-            response = self.client.users_lookupByEmail(email=email)
+            response = self._call('users_lookupByEmail', idempotent=True, email=email)
             return response['user']['id']
         except SlackApiError:
             return None
 
+    def list_users(self, page_size: int = 200) -> Iterator[Dict[str, Any]]:
+        # Pages through the whole workspace. Errors are raised rather than
+        # swallowed: a directory cut short must not look like a complete one
+        cursor = None
+        while True:
+            response = self._call('users_list', idempotent=True, limit=page_size, cursor=cursor)
+            yield from response.get('members', [])
+            cursor = (response.get('response_metadata') or {}).get('next_cursor')
+            if not cursor:
+                return
+
+    def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self._call('users_profile_get', idempotent=True, user=user_id)
+            return response.get('profile')
+        except SlackApiError:
+            return None
+
     def get_user_dm_channel(self, user_id: str) -> Optional[str]:
         try:
-            response = self.client.conversations_open(users=[user_id])
+            response = self._call('conversations_open', idempotent=True, users=[user_id])
             return response['channel']['id']
         except SlackApiError:
             return None
@@ -25,51 +92,67 @@ class SlackClient:
     def send_dm(self, user_id: str, blocks: List[Dict[str, Any]],
                 text: str = '') -> Optional[Dict[str, Any]]:
         try:
-            channel_id = self.get_user_dm_channel(user_id)
-            if not channel_id:
-                return None
+            return self.post_dm(user_id, blocks, text)
+        except SlackError as e:
+            print(f"Error sending DM: {e}")
+            return None
 
-            response = self.client.chat_postMessage(
-                channel=channel_id,
+    def post_dm(self, user_id: str, blocks: List[Dict[str, Any]], text: str = '') -> Dict[str, Any]:
+        # Like send_dm, but a refusal is raised as SlackError with Slack's
+        # error code instead of answered with None
+        try:
+            response = self._call('conversations_open', idempotent=True, users=[user_id])
+            response = self._call(
+                'chat_postMessage',
+                channel=response['channel']['id'],
                 blocks=blocks,
                 text=text
             )
-
-            return {
-                'channel': response['channel'],
-                'ts': response['ts'],
-                'message_ts': response['ts']
-            }
         except SlackApiError as e:
-            print(f"Error sending DM: {e}")
-            return None
+            raise _slack_error(e) from e
+
+        return {
+            'channel': response['channel'],
+            'ts': response['ts'],
+            'message_ts': response['ts']
+        }
 
     def send_message(self, channel_id: str, blocks: List[Dict[str, Any]],
                     text: str = '', thread_ts: Optional[str] = None) -> Optional[Dict[str, Any]]:
         try:
-            kwargs = {
-                'channel': channel_id,
-                'blocks': blocks,
-                'text': text
-            }
-
-            if thread_ts:
-                kwargs['thread_ts'] = thread_ts
-
-            response = self.client.chat_postMessage(**kwargs)
-
-            return {
-                'channel': response['channel'],
-                'ts': response['ts'],
-                'thread_ts': response.get('thread_ts', response['ts'])
-            }
-        except SlackApiError as e:
+            return self.post_message(channel_id, blocks, text, thread_ts)
+        except SlackError as e:
             print(f"Error sending message: {e}")
             return None
 
+    def post_message(self, channel_id: str, blocks: List[Dict[str, Any]],
+                     text: str = '', thread_ts: Optional[str] = None) -> Dict[str, Any]:
+        # Like send_message, but a refusal is raised as SlackError
+        kwargs = {
+            'channel': channel_id,
+            'blocks': blocks,
+            'text': text
+        }
+
+        if thread_ts:
+            kwargs['thread_ts'] = thread_ts
+
+        try:
+            response = self._call('chat_postMessage', **kwargs)
+        except SlackApiError as e:
+            raise _slack_error(e) from e
+
+        return {
+            'channel': response['channel'],
+            'ts': response['ts'],
+            'thread_ts': response.get('thread_ts', response['ts'])
+        }
+
     def get_thread_messages(self, channel_id: str, thread_ts: str) -> List[Dict[str, Any]]:
         try:
-            response = self.client.conversations_replies(
+            response = self._call(
+                'conversations_replies',
+                idempotent=True,
                 channel=channel_id,
                 ts=thread_ts
             )
@@ -80,7 +163,9 @@ class SlackClient:
 
     def get_permalink(self, channel_id: str, message_ts: str) -> Optional[str]:
         try:
-            response = self.client.chat_getPermalink(
+            response = self._call(
+                'chat_getPermalink',
+                idempotent=True,
                 channel=channel_id,
                 message_ts=message_ts
             )
@@ -91,7 +176,9 @@ class SlackClient:
     def update_message(self, channel_id: str, ts: str,
                       blocks: List[Dict[str, Any]], text: str = '') -> bool:
         try:
-            self.client.chat_update(
+            self._call(
+                'chat_update',
+                idempotent=True,
                 channel=channel_id,
                 ts=ts,
                 blocks=blocks,
@@ -103,7 +190,8 @@ class SlackClient:
 
     def add_reaction(self, channel_id: str, timestamp: str, emoji: str) -> bool:
         try:
-            self.client.reactions_add(
+            self._call(
+                'reactions_add',
                 channel=channel_id,
                 timestamp=timestamp,
                 name=emoji
@@ -0,0 +1,8 @@
+class SlackError(Exception):
+    def __init__(self, code: str, transient: bool = False):
+        super().__init__(code)
+        # Slack's error code, e.g. ratelimited or channel_not_found.
+        # Transient ones (throttling, 5xx, Slack's internal errors) are worth
+        # retrying; the rest are refusals the same message would get again
+        self.code = code
+        self.transient = transient
@@ -1,8 +1,16 @@
 from typing import Dict, Any, List
 from urllib.parse import quote
 
+from .mrkdwn import FIELD_LIMIT, escape, text_sections, to_mrkdwn, truncate
+
 
 class MessageFormatter:
+    # Sections a comment, review or code context may fill; with the fixed
+    # blocks around them a message stays far below Slack's 50 blocks, and
+    # longer bodies are cut off with a pointer to GitHub
+    BODY_SECTIONS = 8
+    CODE_CONTEXT_SECTIONS = 2
+
     @staticmethod
     def create_cursor_link(repo_full_name: str, file_path: str, line: int) -> str:
         repo_url = f"https://github.com/{repo_full_name}"
@@ -49,31 +57,21 @@ class MessageFormatter:
                     },
                     {
                         "type": "mrkdwn",
-                        "text": f"*PR:*\n<{comment_data['pr_url']}|#{pr_number}: {pr_title}>"
+                        "text": f"*PR:*\n<{comment_data['pr_url']}|#{pr_number}: {escape(pr_title)}>"
                     },
                     {
                         "type": "mrkdwn",
-                        "text": f"*File:*\n{file_path}:{line}"
+                        "text": truncate(f"*File:*\n{escape(file_path)}:{line}", FIELD_LIMIT)
                     }
                 ]
             },
             {
                 "type": "divider"
             },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Comment:*\n{comment_body}"
-                }
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*Code Context:*\n{code_context}"
-                }
-            },
+            *text_sections(to_mrkdwn(comment_body), "*Comment:*",
+                           MessageFormatter.BODY_SECTIONS),
+            *text_sections(code_context, "*Code Context:*",
+                           MessageFormatter.CODE_CONTEXT_SECTIONS),
             {
                 "type": "actions",
                 "elements": [
@@ -114,6 +112,31 @@ class MessageFormatter:
 
         return blocks, text
 
+    @staticmethod
+    def format_review_comment_reply(comment_data: Dict[str, Any]) -> tuple[List[Dict[str, Any]], str]:
+        # Posted into the thread of the comment it answers, which already
+        # shows the PR, file and code context
+        comment_author = comment_data['comment_author']
+        comment_url = comment_data['comment_url']
+
+        blocks = [
+            *text_sections(to_mrkdwn(comment_data['comment_body']), f"*{comment_author}* replied:",
+                           MessageFormatter.BODY_SECTIONS),
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"<{comment_url}|View on GitHub>"
+                    }
+                ]
+            }
+        ]
+
+        text = f"{comment_author} replied on PR #{comment_data['pr_number']}"
+
+        return blocks, text
+
     @staticmethod
     def format_review(review_data: Dict[str, Any]) -> tuple[List[Dict[str, Any]], str]:
         repo_name = review_data['repo_name']
@@ -153,7 +176,7 @@ class MessageFormatter:
                     },
                     {
                         "type": "mrkdwn",
-                        "text": f"*PR:*\n<{review_data['pr_url']}|#{pr_number}: {pr_title}>"
+                        "text": f"*PR:*\n<{review_data['pr_url']}|#{pr_number}: {escape(pr_title)}>"
                     },
                     {
                         "type": "mrkdwn",
@@ -164,18 +187,11 @@ class MessageFormatter:
         ]
 
         if review_body:
-            blocks.extend([
-                {
-                    "type": "divider"
-                },
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": f"*Review Comment:*\n{review_body}"
-                    }
-                }
-            ])
+            blocks.append({
+                "type": "divider"
+            })
+            blocks.extend(text_sections(to_mrkdwn(review_body), "*Review Comment:*",
+                                        MessageFormatter.BODY_SECTIONS))
 
         blocks.append({
             "type": "actions",
@@ -210,3 +226,18 @@ class MessageFormatter:
         ]
         return blocks, f"Error: {error_message}"
 
+    @staticmethod
+    def format_open_prs(github_username: str, pulls: List[Dict[str, Any]],
+                        limit: int = 20) -> tuple[List[Dict[str, Any]], str]:
+        if not pulls:
+            text = f"No open PRs by `{github_username}`"
+            return [{"type": "section", "text": {"type": "mrkdwn", "text": f"📭 {text}"}}], text
+
+        lines = [f"• <{pull['html_url']}|{pull['repo']}#{pull['number']}> {escape(pull.get('title') or '')}"
+                 for pull in pulls[:limit]]
+        if len(pulls) > limit:
+            lines.append(f"…and {len(pulls) - limit} more")
+
+        text = f"{len(pulls)} open PR{'s' if len(pulls) != 1 else ''} by {github_username}"
+        blocks = text_sections("\n".join(lines), f"📬 *{text}*", MessageFormatter.BODY_SECTIONS)
+        return blocks, text
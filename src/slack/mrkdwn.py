@@ -0,0 +1,162 @@
+import re
+from typing import Any, Dict, List, Match
+
+# Slack's limits on what one message may carry
+SECTION_LIMIT = 3000
+FIELD_LIMIT = 2000
+MAX_BLOCKS = 50
+
+TRUNCATED = '\n_… truncated, the full text is on GitHub_'
+
+_FENCE = '```'
+_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# Every GitHub Markdown construct Slack renders differently, as one
+# alternation so a body is converted in a single scan; whatever matches none
+# of them is copied as is. Each alternative closes its own named group last,
+# which is what match.lastgroup reports. A span cannot run past the next
+# opener of its own kind, so a body full of unclosed `**`, `[` or `<!--` is
+# still read in linear time instead of rescanned from every one of them
+_MARKDOWN = re.compile(
+    r'(?P<fence>^[ \t]{0,3}```[ \t]*(?P<lang>[\w+.-]*)[^\n]*\n(?P<code>[\s\S]*?)^[ \t]{0,3}```[ \t]*$)'
+    r'|(?P<comment><!--(?:[^<-]|<(?!!--)|-(?!->))*-->)'
+    r'|(?P<inline>`[^`\n]+`)'
+    r'|(?P<link>!?\[(?P<label>[^\[\]\n]{0,1000})\]\((?P<url>(?:[^()\s]|\([^()\s]*\))+)(?:[ \t]+"[^"\n]*")?\))'
+    r'|<(?P<autolink>(?:https?|mailto):[^<>\s]{1,2000})>'
+    r'|^[ \t]{0,3}#{1,6}[ \t]+(?P<heading>[^\n]+?)[ \t#]*$'
+    r'|^(?P<task>[ \t]*[-*+][ \t]+\[[ xX]\])[ \t]'
+    r'|^(?P<bullet>[ \t]*)[-*+][ \t]'
+    r'|^(?P<quote>[ \t]{0,3}>)'
+    r'|\*\*(?=\S)(?P<bold>(?:[^*\n]|\*(?!\*))+?)(?<=\S)\*\*'
+    r'|(?<!\w)__(?=\S)(?P<bold2>(?:[^_\n]|_(?!_))+?)(?<=\S)__(?!\w)'
+    r'|~~(?=\S)(?P<strike>(?:[^~\n]|~(?!~))+?)(?<=\S)~~'
+    r'|(?<![\w*])\*(?=[^\s*])(?P<em>[^*\n]+?)(?<=[^\s*])\*(?![\w*])'
+    r'|(?P<special>[&<>])',
+    re.MULTILINE
+)
+
+
+def escape(text: str) -> str:
+    # The only characters Slack wants escaped in text; they would otherwise
+    # open links and mentions such as <!channel>
+    return text.translate(_ESCAPES)
+
+
+def _replace(match: Match[str]) -> str:
+    kind = match.lastgroup
+    if kind == 'special':
+        return escape(match.group())
+    if kind == 'fence':
+        code = escape(match.group('code'))
+        if match.group('lang') != 'suggestion':
+            return f'{_FENCE}\n{code}{_FENCE}'
+        if not code.strip():
+            return '*Suggested change:* remove these lines'
+        return f'*Suggested change:*\n{_FENCE}\n{code}{_FENCE}'
+    if kind == 'inline':
+        return escape(match.group())
+    if kind == 'link':
+        label = escape(match.group('label')) or 'link'
+        return f"<{escape(match.group('url'))}|{label}>"
+    if kind == 'autolink':
+        return f"<{escape(match.group('autolink'))}>"
+    if kind in ('bold', 'bold2'):
+        return f"*{to_mrkdwn(match.group(kind))}*"
+    if kind == 'strike':
+        return f"~{to_mrkdwn(match.group('strike'))}~"
+    if kind == 'em':
+        return f"_{to_mrkdwn(match.group('em'))}_"
+    if kind == 'heading':
+        return f"*{to_mrkdwn(match.group('heading')).strip('*')}*"
+    if kind == 'task':
+        task = match.group('task')
+        indent = task[:len(task) - len(task.lstrip())]
+        return indent + ('☐ ' if task[-2] == ' ' else '☑ ')
+    if kind == 'bullet':
+        return match.group('bullet') + '• '
+    if kind == 'quote':
+        return '>'
+    # HTML comments, e.g. from PR templates, are not meant to be seen
+    return ''
+
+
+def to_mrkdwn(text: str) -> str:
+    # GitHub Markdown to Slack mrkdwn: bold, strikethrough, italics, links,
+    # headings, lists and code blocks (a suggestion is labelled as one), with
+    # &, < and > escaped outside the markup
+    if not text:
+        return ''
+    return _MARKDOWN.sub(_replace, text)
+
+
+def _cut_point(line: str, room: int) -> int:
+    # Where to cut a line longer than room: at a space in its second half,
+    # and never inside a link or an escaped character
+    cut = line.rfind(' ', room // 2, room) + 1 or room
+    start = line.rfind('<', 0, cut)
+    if start > 0 and start > line.rfind('>', 0, cut):
+        cut = start
+    amp = line.rfind('&', max(0, cut - 4), cut)
+    if amp > 0:
+        cut = amp
+    return cut
+
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:_cut_point(text, limit - 1)] + '…'
+
+
+def split_text(text: str, limit: int = SECTION_LIMIT) -> List[str]:
+    # Splits mrkdwn at line breaks into chunks of at most limit characters.
+    # A code block cut in two is closed at the end of one chunk and reopened
+    # at the start of the next; a line longer than a chunk is cut between
+    # words
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    in_fence = False
+    closing = len(_FENCE) + 1
+
+    for line in text.split('\n'):
+        is_fence = line.lstrip().startswith(_FENCE)
+        reserve = closing if in_fence != is_fence else 0
+        while True:
+            separator = 1 if current else 0
+            if size + separator + len(line) + reserve <= limit:
+                current.append(line)
+                size += separator + len(line)
+                break
+
+            room = limit - size - separator - (closing if in_fence else 0)
+            fresh = size == (len(_FENCE) if in_fence else 0)
+            if fresh or room >= limit // 4:
+                cut = _cut_point(line, room)
+                current.append(line[:cut])
+                line = line[cut:]
+            if in_fence:
+                current.append(_FENCE)
+            chunks.append('\n'.join(current))
+            current = [_FENCE] if in_fence else []
+            size = len(_FENCE) if in_fence else 0
+        if is_fence:
+            in_fence = not in_fence
+
+    if in_fence:
+        current.append(_FENCE)
+    chunks.append('\n'.join(current))
+    return chunks
+
+
+def text_sections(text: str, heading: str = '', max_sections: int = 1) -> List[Dict[str, Any]]:
+    # The text as mrkdwn section blocks, the heading on top of the first.
+    # What does not fit in max_sections is cut off with a note
+    if heading:
+        text = f'{heading}\n{text}'
+    chunks = split_text(text)
+    if len(chunks) > max_sections:
+        chunks = chunks[:max_sections]
+        chunks[-1] = split_text(chunks[-1], SECTION_LIMIT - len(TRUNCATED))[0] + TRUNCATED
+    return [{"type": "section", "text": {"type": "mrkdwn", "text": chunk or ' '}} for chunk in chunks]
+
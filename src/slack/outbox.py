@@ -0,0 +1,236 @@
+import contextvars
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.error import URLError
+
+from src.utils.config import Config
+from src.utils.deadline import DeadlineExceeded, has_budget
+from src.utils.logger import setup_logger
+from src.utils.resilience import CircuitOpenError, RetryPolicy
+from .errors import SlackError
+
+logger = setup_logger()
+
+# Failures worth queueing for besides Slack's transient errors: an open
+# circuit, an exhausted budget and network errors
+_UNDELIVERED = (CircuitOpenError, DeadlineExceeded, URLError, socket.timeout, ConnectionError)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# (outbox entry id, delivery, mapping)
+Delivery = Tuple[str, Dict[str, Any], Dict[str, Any]]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.get_int('FANOUT_WORKERS', 8),
+                thread_name_prefix='marites-fanout'
+            )
+        return _executor
+
+
+# Slack deliveries that could not be sent are queued in the KV store with
+# their rendered blocks and the mapping to record once they go through, and
+# replayed in batches with backoff. Only failures that may pass are queued:
+# throttling, Slack's 5xx and internal errors, and network errors. A message
+# Slack refuses for good (invalid_blocks, channel_not_found, ...) would be
+# refused again, so it is logged and dropped. The mapping (a conversation or
+# a processed marker) is only written after Slack accepted the message, so a
+# queued comment is not mistaken for a forwarded one. Delivery is at least
+# once: a post whose reply was lost is sent again.
+class SlackOutbox:
+    LEASE = 'slack_outbox'
+    # Budget kept back by a replay running inside a request
+    SEND_BUDGET = 2.0
+
+    def __init__(self, kv_store, slack_client, max_attempts: int = 12,
+                 retry: Optional[RetryPolicy] = None):
+        self.kv_store = kv_store
+        self.slack_client = slack_client
+        self.max_attempts = max_attempts
+        self.retry = retry or RetryPolicy(attempts=max_attempts, base_delay=30.0, max_delay=3600.0)
+
+    @classmethod
+    def from_config(cls, config, kv_store, slack_client) -> 'SlackOutbox':
+        return cls(kv_store, slack_client, config.outbox_max_attempts,
+                   RetryPolicy(attempts=config.outbox_max_attempts,
+                               base_delay=config.outbox_retry_base_seconds,
+                               max_delay=config.outbox_retry_max_seconds))
+
+    @staticmethod
+    def direct_message(user_id: str, blocks: List[Dict[str, Any]], text: str) -> Dict[str, Any]:
+        return {'method': 'dm', 'user': user_id, 'blocks': blocks, 'text': text}
+
+    @staticmethod
+    def thread_message(channel: str, thread_ts: str, blocks: List[Dict[str, Any]],
+                       text: str) -> Dict[str, Any]:
+        return {'method': 'thread', 'channel': channel, 'thread_ts': thread_ts,
+                'blocks': blocks, 'text': text}
+
+    @staticmethod
+    def conversation(comment_id: int, github_data: Dict[str, Any], recipient: Optional[str] = None,
+                     participant: Optional[str] = None, thread_root: Optional[int] = None,
+                     new_thread: bool = True) -> Dict[str, Any]:
+        return {'type': 'conversation', 'comment_id': comment_id, 'github_data': github_data,
+                'recipient': recipient, 'participant': participant, 'thread_root': thread_root,
+                'new_thread': new_thread}
+
+    @staticmethod
+    def processed(event_type: str, event_id: str, recipient: Optional[str] = None) -> Dict[str, Any]:
+        return {'type': 'processed', 'event_type': event_type, 'event_id': event_id,
+                'recipient': recipient}
+
+    def send(self, delivery: Dict[str, Any]) -> Dict[str, Any]:
+        # Returns the channel, thread and message the delivery ended up in.
+        # Raises SlackError when Slack refused it
+        if delivery['method'] == 'dm':
+            response = self.slack_client.post_dm(delivery['user'], delivery['blocks'], delivery['text'])
+            return {'channel': response['channel'],
+                    'thread_ts': response.get('message_ts') or response.get('ts'),
+                    'message_ts': response.get('ts')}
+
+        response = self.slack_client.post_message(delivery['channel'], delivery['blocks'],
+                                                  delivery['text'], thread_ts=delivery['thread_ts'])
+        return {'channel': response['channel'], 'thread_ts': delivery['thread_ts'],
+                'message_ts': response['ts']}
+
+    def deliver_all(self, deliveries: List[Delivery]) -> Tuple[List[Optional[Dict[str, Any]]], int, bool]:
+        # Sends every delivery at once, then records the mappings of those
+        # that went through and queues the ones that may still go through,
+        # one round trip each. Returns the Slack data per delivery (None
+        # where it was not sent), how many were queued and whether the
+        # mappings were saved. KVError is raised if the failed ones could
+        # not be queued either
+        if len(deliveries) == 1:
+            results = [self._try_send(deliveries[0][1])]
+        else:
+            # The request's deadline lives in a context variable, so each
+            # send runs in a copy of the caller's context
+            executor = _get_executor()
+            futures = [executor.submit(contextvars.copy_context().run, self._try_send, delivery)
+                       for _, delivery, _ in deliveries]
+            results = [future.result() for future in futures]
+
+        sent = [(mapping, slack_data) for (_, _, mapping), (slack_data, _) in zip(deliveries, results)
+                if slack_data is not None]
+        saved = self.kv_store.save_mappings(sent) if sent else True
+
+        now = time.time()
+        deferred = {entry_id: self._entry(delivery, mapping, error, now)
+                    for (entry_id, delivery, mapping), (slack_data, error) in zip(deliveries, results)
+                    if error is not None}
+        if deferred:
+            self.kv_store.add_outbox_entries(deferred)
+            logger.warning('Queued %s Slack deliveries for replay (%s): %s', len(deferred),
+                           ', '.join(deferred), next(iter(deferred.values()))['last_error'])
+        return [slack_data for slack_data, _ in results], len(deferred), saved
+
+    def _try_send(self, delivery: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        # (Slack data, None) once sent, (None, error) when worth queueing and
+        # (None, None) when Slack refused it for good
+        try:
+            return self.send(delivery), None
+        except SlackError as e:
+            if e.transient:
+                return None, e.code
+            logger.error('Slack refused a %s delivery, not queueing it: %s', delivery['method'], e.code)
+            return None, None
+        except _UNDELIVERED as e:
+            return None, str(e)
+
+    def _entry(self, delivery: Dict[str, Any], mapping: Dict[str, Any], error: Optional[str],
+               now: float) -> Dict[str, Any]:
+        return {
+            'created_at': now,
+            'attempts': 0,
+            'next_attempt_at': now + self.retry.delay(0),
+            'last_error': error,
+            'delivery': delivery,
+            'mapping': mapping,
+        }
+
+    def replay(self, batch_size: int = 50, limit: Optional[int] = None,
+               due_only: bool = True, lease_ttl: int = 300) -> Dict[str, int]:
+        # Drains due entries, oldest first, in batches: the sends of a batch
+        # are followed by one pipeline that records their mappings and
+        # updates the outbox. Stops early while Slack's circuit is open or
+        # the request budget runs out; what is left waits for the next run.
+        # A lease keeps concurrent replays from sending the same entry twice
+        stats = {'sent': 0, 'retrying': 0, 'dropped': 0, 'left': 0}
+        token = uuid.uuid4().hex
+        if not self.kv_store.acquire_lease(self.LEASE, token, lease_ttl):
+            logger.info('Another replay holds the Slack outbox lease')
+            return stats
+
+        try:
+            entries = self.kv_store.get_outbox()
+            now = time.time()
+            due = sorted(((entry_id, entry) for entry_id, entry in entries.items()
+                          if not due_only or entry.get('next_attempt_at', 0) <= now),
+                         key=lambda item: item[1].get('created_at', 0))
+            if limit is not None:
+                due = due[:limit]
+            stats['left'] = len(entries) - len(due)
+
+            for start in range(0, len(due), batch_size):
+                batch = due[start:start + batch_size]
+                skipped = self._replay_batch(batch, stats)
+                if skipped:
+                    stats['left'] += skipped + len(due) - start - len(batch)
+                    break
+        finally:
+            self.kv_store.release_lease(self.LEASE, token)
+
+        logger.info('Replayed Slack outbox: %s', stats)
+        return stats
+
+    def _replay_batch(self, batch: List[Tuple[str, Dict[str, Any]]], stats: Dict[str, int]) -> int:
+        # Returns how many entries of the batch were not attempted
+        delivered: List[Tuple[str, Dict[str, Any], Dict[str, Any]]] = []
+        rescheduled: Dict[str, Dict[str, Any]] = {}
+        dropped: List[str] = []
+        skipped = 0
+
+        for entry_id, entry in batch:
+            if skipped or not has_budget(self.SEND_BUDGET):
+                skipped += 1
+                continue
+            try:
+                delivered.append((entry_id, entry['mapping'], self.send(entry['delivery'])))
+                continue
+            except CircuitOpenError:
+                # Slack is still failing; an attempt now would not count
+                skipped += 1
+                continue
+            except SlackError as e:
+                if not e.transient:
+                    logger.error('Dropping Slack delivery %s, refused by Slack: %s', entry_id, e.code)
+                    dropped.append(entry_id)
+                    continue
+                error = e.code
+            except _UNDELIVERED as e:
+                error = str(e)
+
+            entry['attempts'] = entry.get('attempts', 0) + 1
+            entry['last_error'] = error
+            if entry['attempts'] >= self.max_attempts:
+                logger.error('Dropping Slack delivery %s after %s attempts: %s',
+                             entry_id, entry['attempts'], error)
+                dropped.append(entry_id)
+            else:
+                entry['next_attempt_at'] = time.time() + self.retry.delay(entry['attempts'])
+                rescheduled[entry_id] = entry
+
+        self.kv_store.settle_outbox(delivered, rescheduled, dropped)
+        stats['sent'] += len(delivered)
+        stats['retrying'] += len(rescheduled)
+        stats['dropped'] += len(dropped)
+        return skipped
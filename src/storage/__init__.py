@@ -1,4 +1,4 @@
 from .kv_store import KVStore
+from .backends import KVError, StorageBackend, get_backend
 
-__all__ = ['KVStore']
-
+__all__ = ['KVStore', 'KVError', 'StorageBackend', 'get_backend']
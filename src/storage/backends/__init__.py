@@ -0,0 +1,63 @@
+import importlib
+import threading
+from typing import Dict, TYPE_CHECKING
+
+from .base import KVError, StorageBackend
+
+if TYPE_CHECKING:
+    from .memory import MemoryBackend
+    from .redis import RedisBackend
+    from .sqlite import SqliteBackend
+    from .upstash import UpstashBackend
+
+__all__ = ['KVError', 'StorageBackend', 'UpstashBackend', 'RedisBackend', 'MemoryBackend',
+           'SqliteBackend', 'create_backend', 'get_backend']
+
+# A process only ever uses one backend; the others (and requests, sqlite3 or
+# ssl behind them) are not imported
+_LAZY = {
+    'UpstashBackend': '.upstash',
+    'RedisBackend': '.redis',
+    'MemoryBackend': '.memory',
+    'SqliteBackend': '.sqlite',
+}
+
+_backends: Dict[str, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def create_backend(config) -> StorageBackend:
+    kind = config.storage_backend
+    if kind == 'upstash':
+        from .upstash import UpstashBackend
+        return UpstashBackend(config.kv_rest_api_url, config.kv_rest_api_token)
+    if kind == 'redis':
+        from .redis import RedisBackend
+        return RedisBackend(config.redis_url, pool_size=config.redis_pool_size)
+    if kind == 'memory':
+        from .memory import MemoryBackend
+        return MemoryBackend()
+    if kind == 'sqlite':
+        from .sqlite import SqliteBackend
+        return SqliteBackend(config.sqlite_path, sweep_interval=config.sqlite_sweep_interval)
+    raise ValueError(f'Unknown STORAGE_BACKEND: {kind}')
+
+
+def get_backend(config) -> StorageBackend:
+    # One backend per process: connection pools and in-memory data must
+    # outlive the request that created them
+    kind = config.storage_backend
+    with _backends_lock:
+        backend = _backends.get(kind)
+        if backend is None:
+            backend = create_backend(config)
+            _backends[kind] = backend
+        return backend
@@ -0,0 +1,31 @@
+from typing import Any, List, Sequence
+
+
+class KVError(Exception):
+    def __init__(self, message: str, transient: bool = True):
+        super().__init__(message)
+        # Transient errors (network, 5xx, throttling) are worth retrying;
+        # the rest are answers from a healthy store to a bad command
+        self.transient = transient
+
+
+# Every backend speaks Redis commands (['SET', key, value, 'EX', '60'])
+# and returns results the way the Upstash REST API does: bulk strings as
+# str, integers as int, nil as None and arrays as lists
+class StorageBackend:
+    name = 'backend'
+
+    def execute(self, command: Sequence[Any]) -> Any:
+        raise NotImplementedError
+
+    def pipeline(self, commands: List[Sequence[Any]]) -> List[Any]:
+        # Backends that can batch round trips override this
+        return [self.execute(command) for command in commands]
+
+    def transaction(self, commands: List[Sequence[Any]]) -> List[Any]:
+        # Like pipeline, but applied all together or not at all. Backends whose
+        # pipelines already run in one transaction keep this default
+        return self.pipeline(commands)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,220 @@
+import fnmatch
+import time
+from typing import Any, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+from ..scripts import find as find_script
+from .base import KVError, StorageBackend
+
+Entry = Tuple[Any, Optional[float]]
+
+
+# Redis command semantics implemented in Python for backends that have no
+# Redis server behind them. Values are str (strings), dict (hashes) or set
+# (sets); subclasses only provide entry storage and a transaction scope, and
+# every command or pipeline runs inside one transaction.
+class EmulatedBackend(StorageBackend):
+    READ_COMMANDS = frozenset({'GET', 'MGET', 'EXISTS', 'TTL', 'SCAN', 'HGET', 'HMGET',
+                               'HGETALL', 'SMEMBERS'})
+
+    def _transaction(self, write: bool) -> ContextManager[None]:
+        raise NotImplementedError
+
+    def _load(self, key: str) -> Optional[Entry]:
+        raise NotImplementedError
+
+    def _save(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        raise NotImplementedError
+
+    def _remove(self, key: str) -> None:
+        raise NotImplementedError
+
+    def _keys(self) -> List[str]:
+        raise NotImplementedError
+
+    def _writes(self, commands: List[Sequence[Any]]) -> bool:
+        return any(str(command[0]).upper() not in self.READ_COMMANDS for command in commands)
+
+    def execute(self, command: Sequence[Any]) -> Any:
+        with self._transaction(self._writes([command])):
+            return self._apply(command)
+
+    def pipeline(self, commands: List[Sequence[Any]]) -> List[Any]:
+        with self._transaction(self._writes(commands)):
+            return [self._apply(command) for command in commands]
+
+    def _apply(self, command: Sequence[Any]) -> Any:
+        name = str(command[0]).upper()
+        handler = getattr(self, f'_cmd_{name.lower()}', None)
+        if handler is None:
+            raise KVError(f"ERR unknown command '{name}'", transient=False)
+        try:
+            return handler(*[str(arg) for arg in command[1:]])
+        except (TypeError, ValueError, IndexError) as e:
+            raise KVError(f'ERR wrong arguments for {name}: {e}', transient=False) from e
+
+    def _entry(self, key: str) -> Optional[Entry]:
+        entry = self._load(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= time.time():
+            self._remove(key)
+            return None
+        return entry
+
+    def _typed(self, key: str, kind: type) -> Optional[Entry]:
+        entry = self._entry(key)
+        if entry is not None and not isinstance(entry[0], kind):
+            raise KVError('WRONGTYPE Operation against a key holding the wrong kind of value',
+                          transient=False)
+        return entry
+
+    # Strings
+
+    def _cmd_get(self, key: str) -> Optional[str]:
+        entry = self._typed(key, str)
+        return entry[0] if entry else None
+
+    def _cmd_mget(self, *keys: str) -> List[Optional[str]]:
+        results = []
+        for key in keys:
+            entry = self._entry(key)
+            results.append(entry[0] if entry and isinstance(entry[0], str) else None)
+        return results
+
+    def _cmd_set(self, key: str, value: str, *options: str) -> Optional[str]:
+        flags = [option.upper() for option in options]
+        existing = self._entry(key)
+        if 'NX' in flags and existing is not None:
+            return None
+        if 'XX' in flags and existing is None:
+            return None
+
+        expires_at = None
+        if 'EX' in flags:
+            expires_at = time.time() + int(options[flags.index('EX') + 1])
+        elif 'PX' in flags:
+            expires_at = time.time() + int(options[flags.index('PX') + 1]) / 1000
+        elif 'KEEPTTL' in flags and existing is not None:
+            expires_at = existing[1]
+
+        self._save(key, value, expires_at)
+        if 'GET' in flags:
+            return existing[0] if existing and isinstance(existing[0], str) else None
+        return 'OK'
+
+    # Keys
+
+    def _cmd_del(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self._entry(key) is not None:
+                self._remove(key)
+                removed += 1
+        return removed
+
+    def _cmd_exists(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._entry(key) is not None)
+
+    def _cmd_expire(self, key: str, seconds: str) -> int:
+        entry = self._entry(key)
+        if entry is None:
+            return 0
+        self._save(key, entry[0], time.time() + int(seconds))
+        return 1
+
+    def _cmd_ttl(self, key: str) -> int:
+        entry = self._entry(key)
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return max(0, int(round(entry[1] - time.time())))
+
+    def _cmd_scan(self, cursor: str, *options: str) -> List[Any]:
+        flags = [option.upper() for option in options]
+        pattern = options[flags.index('MATCH') + 1] if 'MATCH' in flags else '*'
+        count = int(options[flags.index('COUNT') + 1]) if 'COUNT' in flags else 10
+
+        keys = sorted(self._keys())
+        start = int(cursor)
+        batch = keys[start:start + count]
+        next_cursor = start + count if start + count < len(keys) else 0
+        matched = [key for key in batch if fnmatch.fnmatchcase(key, pattern) and self._entry(key) is not None]
+        return [str(next_cursor), matched]
+
+    # Scripting
+
+    def _cmd_eval(self, source: str, numkeys: str, *rest: str) -> Any:
+        script = find_script(source)
+        if script is None:
+            raise KVError('NOSCRIPT Only registered scripts can run on this backend',
+                          transient=False)
+        count = int(numkeys)
+        return script.emulation(self._apply, list(rest[:count]), list(rest[count:]))
+
+    # Hashes
+
+    def _hash(self, key: str) -> Tuple[Dict[str, str], Optional[float]]:
+        entry = self._typed(key, dict)
+        return (dict(entry[0]), entry[1]) if entry else ({}, None)
+
+    def _cmd_hset(self, key: str, *pairs: str) -> int:
+        if not pairs or len(pairs) % 2:
+            raise ValueError('HSET needs field/value pairs')
+        fields, expires_at = self._hash(key)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        self._save(key, fields, expires_at)
+        return added
+
+    def _cmd_hget(self, key: str, field: str) -> Optional[str]:
+        return self._hash(key)[0].get(field)
+
+    def _cmd_hmget(self, key: str, *fields: str) -> List[Optional[str]]:
+        values = self._hash(key)[0]
+        return [values.get(field) for field in fields]
+
+    def _cmd_hgetall(self, key: str) -> List[str]:
+        flat = []
+        for field, value in self._hash(key)[0].items():
+            flat.extend([field, value])
+        return flat
+
+    def _cmd_hdel(self, key: str, *fields: str) -> int:
+        values, expires_at = self._hash(key)
+        removed = 0
+        for field in fields:
+            if values.pop(field, None) is not None:
+                removed += 1
+        if values:
+            self._save(key, values, expires_at)
+        elif removed:
+            self._remove(key)
+        return removed
+
+    # Sets
+
+    def _set_members(self, key: str) -> Tuple[set, Optional[float]]:
+        entry = self._typed(key, set)
+        return (set(entry[0]), entry[1]) if entry else (set(), None)
+
+    def _cmd_sadd(self, key: str, *members: str) -> int:
+        current, expires_at = self._set_members(key)
+        added = len(set(members) - current)
+        self._save(key, current | set(members), expires_at)
+        return added
+
+    def _cmd_srem(self, key: str, *members: str) -> int:
+        current, expires_at = self._set_members(key)
+        removed = len(current & set(members))
+        remaining = current - set(members)
+        if remaining:
+            self._save(key, remaining, expires_at)
+        elif removed:
+            self._remove(key)
+        return removed
+
+    def _cmd_smembers(self, key: str) -> List[str]:
+        return sorted(self._set_members(key)[0])
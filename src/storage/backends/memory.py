@@ -0,0 +1,34 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .emulated import EmulatedBackend, Entry
+
+
+class MemoryBackend(EmulatedBackend):
+    name = 'memory'
+
+    def __init__(self):
+        self._data: Dict[str, Entry] = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _transaction(self, write: bool) -> Iterator[None]:
+        with self._lock:
+            yield
+
+    def _load(self, key: str) -> Optional[Entry]:
+        return self._data.get(key)
+
+    def _save(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        self._data[key] = (value, expires_at)
+
+    def _remove(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def _keys(self) -> List[str]:
+        return list(self._data)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,219 @@
+import queue
+import socket
+import ssl
+import threading
+from typing import Any, List, Optional, Sequence
+from urllib.parse import unquote, urlparse
+
+from src.utils.deadline import call_timeout
+from .base import KVError, StorageBackend
+
+
+class _ReplyError(Exception):
+    pass
+
+
+class RedisConnection:
+    def __init__(self, host: str, port: int, password: Optional[str], username: Optional[str],
+                 db: int, use_ssl: bool, timeout: float):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if use_ssl:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+
+        try:
+            if password:
+                self.call(['AUTH', username, password] if username else ['AUTH', password])
+            if db:
+                self.call(['SELECT', db])
+        except BaseException:
+            self.close()
+            raise
+
+    @staticmethod
+    def encode(command: Sequence[Any]) -> bytes:
+        parts = [b'*%d\r\n' % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    def read_reply(self) -> Any:
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Connection closed by Redis')
+        kind, payload = line[:1], line[1:-2]
+
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise _ReplyError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)[:-2]
+            return data.decode('utf-8', errors='replace')
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_element() for _ in range(length)]
+        raise ConnectionError(f'Unexpected RESP reply: {line!r}')
+
+    def _read_element(self) -> Any:
+        # Errors nested in an array (e.g. inside an EXEC reply) are returned
+        # in place so the rest of the array is still consumed
+        try:
+            return self.read_reply()
+        except _ReplyError as e:
+            return e
+
+    def call(self, command: Sequence[Any]) -> Any:
+        self.sock.sendall(self.encode(command))
+        return self.read_reply()
+
+    def call_many(self, commands: List[Sequence[Any]]) -> List[Any]:
+        # Pipelining: one write, then read every reply. Errors are collected
+        # so the connection stays in sync with the server
+        self.sock.sendall(b''.join(self.encode(command) for command in commands))
+        replies = []
+        for _ in commands:
+            try:
+                replies.append(self.read_reply())
+            except _ReplyError as e:
+                replies.append(e)
+        return replies
+
+    def settimeout(self, timeout: float) -> None:
+        self.sock.settimeout(timeout)
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend(StorageBackend):
+    name = 'redis'
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 3):
+        parsed = urlparse(url)
+        if parsed.scheme not in ('redis', 'rediss'):
+            raise ValueError(f'Unsupported Redis URL scheme: {parsed.scheme}')
+
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.use_ssl = parsed.scheme == 'rediss'
+        self.timeout = timeout
+
+        self.pool_size = pool_size
+        self._idle: 'queue.LifoQueue[RedisConnection]' = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> RedisConnection:
+        return RedisConnection(self.host, self.port, self.password, self.username,
+                               self.db, self.use_ssl, call_timeout(self.timeout))
+
+    def _acquire(self) -> RedisConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.pool_size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=call_timeout(self.timeout))
+        except queue.Empty:
+            raise KVError(f'No Redis connection available (pool size {self.pool_size})')
+
+    def _release(self, connection: RedisConnection, healthy: bool) -> None:
+        if healthy:
+            self._idle.put(connection)
+            return
+        connection.close()
+        with self._lock:
+            self._created -= 1
+
+    def _run(self, operation: str, func) -> Any:
+        timeout = call_timeout(self.timeout)
+        try:
+            connection = self._acquire()
+        except OSError as e:
+            raise KVError(f'KV {operation} failed: cannot connect to Redis: {e}') from e
+        except _ReplyError as e:
+            # AUTH or SELECT refused, e.g. a wrong password or database
+            # index: the store is unusable, like an unreachable one
+            raise KVError(f'KV {operation} failed: Redis refused the connection: {e}') from e
+
+        healthy = False
+        try:
+            connection.settimeout(timeout)
+            result = func(connection)
+            healthy = True
+            return result
+        except _ReplyError as e:
+            healthy = True
+            raise KVError(f'KV {operation} failed: {e}', transient=False) from e
+        except (OSError, ConnectionError, ValueError) as e:
+            # A timed-out or broken connection may still have a reply in
+            # flight; it is never handed out again
+            raise KVError(f'KV {operation} failed: {e}') from e
+        finally:
+            self._release(connection, healthy)
+
+    def execute(self, command: Sequence[Any]) -> Any:
+        return self._run(str(command[0]), lambda connection: connection.call(command))
+
+    def pipeline(self, commands: List[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        replies = self._run('PIPELINE', lambda connection: connection.call_many(commands))
+        for command, reply in zip(commands, replies):
+            if isinstance(reply, _ReplyError):
+                raise KVError(f'KV {command[0]} failed in pipeline: {reply}', transient=False)
+        return replies
+
+    def transaction(self, commands: List[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        # MULTI, the queued commands and EXEC in one write; only EXEC's reply
+        # carries results. A command refused while queueing aborts them all
+        replies = self._run('MULTI', lambda connection: connection.call_many(
+            [['MULTI'], *commands, ['EXEC']]))
+        results = replies[-1]
+        if isinstance(results, _ReplyError):
+            raise KVError(f'KV MULTI failed: {results}', transient=False)
+        for command, reply in zip(commands, results):
+            if isinstance(reply, _ReplyError):
+                raise KVError(f'KV {command[0]} failed in transaction: {reply}', transient=False)
+        return results
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
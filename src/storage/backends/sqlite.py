@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+from .base import KVError
+from .emulated import EmulatedBackend, Entry
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS kv ('
+    'key TEXT PRIMARY KEY, kind TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at) WHERE expires_at IS NOT NULL',
+)
+
+
+def _encode(value: Any) -> tuple:
+    if isinstance(value, dict):
+        return 'hash', json.dumps(value)
+    if isinstance(value, set):
+        return 'set', json.dumps(sorted(value))
+    return 'string', value
+
+
+def _decode(kind: str, value: str) -> Any:
+    if kind == 'hash':
+        return json.loads(value)
+    if kind == 'set':
+        return set(json.loads(value))
+    return value
+
+
+class SqliteBackend(EmulatedBackend):
+    name = 'sqlite'
+
+    def __init__(self, path: str, sweep_interval: float = 60, sweep_batch: int = 500,
+                 busy_timeout: float = 5):
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        for statement in _SCHEMA:
+            connection.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads, so every
+        # server thread gets its own; WAL lets their reads run alongside a
+        # writer instead of queueing behind it
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            return connection
+
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._open()
+        self._local.connection = connection
+        # Threaded servers start a thread per request; once a thread is gone
+        # its connection is handed to the next one instead of leaking
+        weakref.finalize(threading.current_thread(), self._idle.append, connection)
+        return connection
+
+    def _open(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout,
+                                     isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def _transaction(self, write: bool) -> Iterator[None]:
+        connection = self._connection()
+        try:
+            # Writers take the lock up front; a deferred transaction that
+            # upgrades later can fail with SQLITE_BUSY despite busy_timeout
+            connection.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        except sqlite3.Error as e:
+            raise KVError(f'KV transaction failed: {e}') from e
+
+        try:
+            yield
+            if write and time.time() >= self._next_sweep:
+                self._sweep(connection)
+            connection.execute('COMMIT')
+        except sqlite3.OperationalError as e:
+            self._rollback(connection)
+            raise KVError(f'KV transaction failed: {e}') from e
+        except BaseException:
+            self._rollback(connection)
+            raise
+
+    @staticmethod
+    def _rollback(connection: sqlite3.Connection) -> None:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+
+    def _sweep(self, connection: sqlite3.Connection) -> int:
+        # Bounded so a large backlog of expired keys never stalls a request;
+        # whatever is left goes on the next sweep
+        self._next_sweep = time.time() + self.sweep_interval
+        cursor = connection.execute(
+            'DELETE FROM kv WHERE key IN '
+            '(SELECT key FROM kv WHERE expires_at <= ? ORDER BY expires_at LIMIT ?)',
+            (time.time(), self.sweep_batch)
+        )
+        return cursor.rowcount
+
+    def sweep(self) -> int:
+        with self._transaction(write=True):
+            return self._sweep(self._connection())
+
+    def _load(self, key: str) -> Optional[Entry]:
+        # Expired rows are filtered here rather than deleted, so reads never
+        # need the write lock; the sweep removes them later
+        row = self._connection().execute(
+            'SELECT kind, value, expires_at FROM kv '
+            'WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return _decode(row[0], row[1]), row[2]
+
+    def _save(self, key: str, value: Any, expires_at: Optional[float]) -> None:
+        kind, data = _encode(value)
+        self._connection().execute(
+            'INSERT INTO kv (key, kind, value, expires_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET kind = excluded.kind, value = excluded.value, '
+            'expires_at = excluded.expires_at',
+            (key, kind, data, expires_at)
+        )
+
+    def _remove(self, key: str) -> None:
+        self._connection().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def _keys(self) -> List[str]:
+        rows = self._connection().execute(
+            'SELECT key FROM kv WHERE expires_at IS NULL OR expires_at > ?', (time.time(),)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._idle = []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
@@ -0,0 +1,62 @@
+from typing import Any, List, Sequence
+
+import requests
+
+from src.utils.deadline import call_timeout
+from .base import KVError, StorageBackend
+
+
+class UpstashBackend(StorageBackend):
+    name = 'upstash'
+
+    def __init__(self, rest_api_url: str, rest_api_token: str, timeout: float = 3):
+        self.base_url = rest_api_url.rstrip('/')
+        self.timeout = timeout
+        # One session per process keeps TLS connections to Upstash alive
+        # across requests handled by the same warm instance
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {rest_api_token}',
+            'Content-Type': 'application/json'
+        })
+
+    def _post(self, url: str, body: Any, operation: str) -> Any:
+        try:
+            response = self.session.post(url, json=body, timeout=call_timeout(self.timeout))
+        except requests.RequestException as e:
+            raise KVError(f"KV {operation} failed: {e}") from e
+
+        if response.status_code != 200:
+            status = response.status_code
+            raise KVError(f"KV {operation} failed: status {status}, body: {response.text}",
+                          transient=status >= 500 or status == 429)
+        return response.json()
+
+    def execute(self, command: Sequence[Any]) -> Any:
+        # Upstash REST API expects Redis command format as array and returns
+        # the result directly
+        data = self._post(self.base_url, [str(part) for part in command], command[0])
+        return data.get('result')
+
+    def pipeline(self, commands: List[Sequence[Any]]) -> List[Any]:
+        # Not atomic: Upstash runs the commands one after the other, and
+        # others' commands may run between them
+        return self._batch('pipeline', commands)
+
+    def transaction(self, commands: List[Sequence[Any]]) -> List[Any]:
+        return self._batch('multi-exec', commands)
+
+    def _batch(self, endpoint: str, commands: List[Sequence[Any]]) -> List[Any]:
+        if not commands:
+            return []
+        body = [[str(part) for part in command] for command in commands]
+        data = self._post(f'{self.base_url}/{endpoint}', body, endpoint.upper())
+        results = []
+        for command, item in zip(commands, data):
+            if 'error' in item:
+                raise KVError(f"KV {command[0]} failed in pipeline: {item['error']}", transient=False)
+            results.append(item.get('result'))
+        return results
+
+    def close(self) -> None:
+        self.session.close()
@@ -1,139 +1,536 @@
 import json
-import requests
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List, Sequence, Set, Tuple
 from datetime import datetime, timedelta
+from src.utils.resilience import CircuitOpenError, RetryPolicy, call_with_resilience, get_breaker
+from .backends import KVError, StorageBackend, get_backend
+from .scripts import REGISTER_USER, RELEASE_LEASE, UNREGISTER_USER, Script
 
 logger = logging.getLogger(__name__)
 
+CONVERSATION_TTL = 30*24*60*60
+_CONVERSATION_VERSION = 1
+
+# Slack deliveries waiting to be replayed, one field per delivery
+OUTBOX_KEY = 'slack_outbox'
+
+
+def _is_transient(error: Exception) -> bool:
+    return isinstance(error, KVError) and error.transient
+
+
+def encode_conversation(slack_data: Dict[str, Any], github_data: Dict[str, Any]) -> str:
+    thread_ts = slack_data.get('thread_ts')
+    message_ts = slack_data.get('message_ts')
+    record = [
+        _CONVERSATION_VERSION,
+        slack_data.get('channel'),
+        thread_ts,
+        # Top-level DMs start their own thread, so the message is the thread
+        None if message_ts == thread_ts else message_ts,
+        github_data.get('repo_full_name'),
+        github_data.get('pr_number'),
+        github_data.get('installation_id'),
+        github_data.get('type'),
+    ]
+    return json.dumps(record, separators=(',', ':'))
+
+
+def decode_conversation(comment_id: int, value: str) -> Optional[Dict[str, Any]]:
+    try:
+        record = json.loads(value)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(record, list) or not record or record[0] != _CONVERSATION_VERSION:
+        return None
+    _, channel, thread_ts, message_ts, repo_full_name, pr_number, installation_id, kind = record
+    return {
+        'comment_id': comment_id,
+        'channel': channel,
+        'thread_ts': thread_ts,
+        'message_ts': message_ts or thread_ts,
+        'repo_full_name': repo_full_name,
+        'pr_number': pr_number,
+        'installation_id': installation_id,
+        'type': kind,
+    }
+
+
+def conversation_entries(comment_id: int, slack_data: Dict[str, Any], github_data: Dict[str, Any],
+                         ttl: int = CONVERSATION_TTL,
+                         index_thread: bool = True) -> List[Tuple[str, str, Optional[int]]]:
+    entries = [(f'conversation:{comment_id}', encode_conversation(slack_data, github_data), ttl)]
+    if index_thread:
+        entries.append((f'thread:{slack_data.get("thread_ts")}', str(comment_id), ttl))
+    return entries
+
+
+def processed_entry(event_type: str, event_id: str,
+                    ttl: int = 24*60*60) -> Tuple[str, str, Optional[int]]:
+    return (f'last_processed:{event_type}:{event_id}', datetime.now().isoformat(), ttl)
+
+
+def _set_command(key: str, value: str, ex: Optional[int] = None, nx: bool = False) -> List[str]:
+    command = ['SET', key, value]
+    if nx:
+        command.append('NX')
+    if ex:
+        command += ['EX', str(ex)]
+    return command
+
+
+def _recipient_commands(key: str, recipient: str, slack_data: Dict[str, Any], ttl: int) -> List[List[str]]:
+    # recipients:{type}:{id} holds the channel and thread each Slack user
+    # was notified in; whoever is missing from it is still to be notified
+    thread = json.dumps([slack_data.get('channel'), slack_data.get('thread_ts')], separators=(',', ':'))
+    return [['HSET', key, recipient, thread], ['EXPIRE', key, str(ttl)]]
+
+
+def _decode_recipients(flat: Optional[List[str]]) -> Dict[str, Dict[str, Any]]:
+    threads = {}
+    for recipient, value in zip((flat or [])[::2], (flat or [])[1::2]):
+        try:
+            channel, thread_ts = json.loads(value)
+        except (json.JSONDecodeError, TypeError, ValueError):
+            continue
+        threads[recipient] = {'channel': channel, 'thread_ts': thread_ts}
+    return threads
+
+
+def mapping_commands(mapping: Dict[str, Any], slack_data: Dict[str, Any]) -> List[List[str]]:
+    # What a Slack delivery records once it went through, from the mapping
+    # it was sent with: a conversation for a forwarded comment, a processed
+    # marker for a review, and in both cases the recipient
+    recipient = mapping.get('recipient')
+    if mapping['type'] == 'processed':
+        key, value, ttl = processed_entry(mapping['event_type'], mapping['event_id'])
+        commands = [_set_command(key, value, ttl)]
+        if recipient:
+            commands += _recipient_commands(f"recipients:{mapping['event_type']}:{mapping['event_id']}",
+                                            recipient, slack_data, ttl)
+        return commands
+
+    if mapping['type'] != 'conversation':
+        raise ValueError(f"Unknown mapping type {mapping['type']!r}")
+
+    comment_id = mapping['comment_id']
+    if not recipient:
+        # Queued before deliveries were tracked per recipient
+        return [_set_command(*entry) for entry in conversation_entries(
+            comment_id, slack_data, mapping['github_data'], index_thread=mapping.get('index_thread', True))]
+
+    # The first recipient's thread is the one recorded on the conversation;
+    # each recipient's own thread is kept in the recipients hash. A new
+    # thread started for a follow-up belongs to the top-level comment, the
+    # only one GitHub accepts replies to
+    root = mapping.get('thread_root') or comment_id
+    record = encode_conversation(slack_data, mapping['github_data'])
+    commands = [_set_command(f'conversation:{comment_id}', record, CONVERSATION_TTL, nx=True)]
+    commands += _recipient_commands(f'recipients:comment:{comment_id}', recipient, slack_data, CONVERSATION_TTL)
+    if mapping.get('new_thread', True):
+        if root != comment_id:
+            commands.append(_set_command(f'conversation:{root}', record, CONVERSATION_TTL, nx=True))
+            commands += _recipient_commands(f'recipients:comment:{root}', recipient, slack_data, CONVERSATION_TTL)
+        commands.append(_set_command(f"thread:{slack_data.get('thread_ts')}", str(root), CONVERSATION_TTL))
+    if mapping.get('participant'):
+        commands += [['SADD', f'participants:{root}', mapping['participant']],
+                     ['EXPIRE', f'participants:{root}', str(CONVERSATION_TTL)]]
+    return commands
+
 
 class KVStore:
-    def __init__(self, rest_api_url: str, rest_api_token: str):
-        self.base_url = rest_api_url.rstrip('/')
-        self.token = rest_api_token
-        self.headers = {
-            'Authorization': f'Bearer {self.token}',
-            'Content-Type': 'application/json'
-        }
-        logger.info(f"KVStore initialized with URL: {self.base_url}")
+    def __init__(self, backend: StorageBackend):
+        self.backend = backend
+        self.retry = RetryPolicy(attempts=3, base_delay=0.05, max_delay=0.5)
+        self._breaker = get_breaker(f'kv:{backend.name}')
+        logger.info('KVStore initialized with %s backend', backend.name)
 
-    def _get(self, key: str) -> Optional[str]:
+    @classmethod
+    def from_config(cls, config) -> 'KVStore':
+        return cls(get_backend(config))
+
+    def _command(self, command: Sequence[Any], idempotent: bool = True) -> Any:
         try:
-            # Upstash REST API: GET key
-            command = ['GET', key]
-
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=command,
-                timeout=10
+            return call_with_resilience(
+                self._breaker,
+                self.backend.execute,
+                command,
+                retry=self.retry if idempotent else None,
+                is_transient=_is_transient
             )
-            if response.status_code == 200:
-                data = response.json()
-                # Upstash returns the result directly
-                result = data.get('result')
-                return result
-            logger.warning(f"KV GET failed for key {key}: status {response.status_code}")
-            return None
-        except Exception as e:
-            logger.error(f"Error getting key {key}: {e}", exc_info=True)
-            return None
+        except CircuitOpenError as e:
+            raise KVError(str(e)) from e
 
-    def _set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+    def _pipeline(self, commands: List[Sequence[Any]], idempotent: bool = True) -> List[Any]:
+        try:
+            return call_with_resilience(
+                self._breaker,
+                self.backend.pipeline,
+                commands,
+                retry=self.retry if idempotent else None,
+                is_transient=_is_transient
+            )
+        except CircuitOpenError as e:
+            raise KVError(str(e)) from e
+
+    def _transaction(self, commands: List[Sequence[Any]], idempotent: bool = True) -> List[Any]:
         try:
-            # Upstash REST API expects Redis command format as array
-            if ex:
-                # SET key value EX seconds
-                command = ['SET', key, value, 'EX', str(ex)]
-            else:
-                # SET key value
-                command = ['SET', key, value]
-
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=command,
-                timeout=10
+            return call_with_resilience(
+                self._breaker,
+                self.backend.transaction,
+                commands,
+                retry=self.retry if idempotent else None,
+                is_transient=_is_transient
             )
-            if response.status_code == 200:
-                logger.info(f"KV SET successful for key {key}")
-                return True
-            logger.error(f"KV SET failed for key {key}: status {response.status_code}, body: {response.text}")
+        except CircuitOpenError as e:
+            raise KVError(str(e)) from e
+
+    def _get(self, key: str) -> Optional[str]:
+        # Raises KVError when the store cannot answer, so that callers never
+        # mistake an outage for a missing key
+        return self._command(['GET', key])
+
+    def _set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
+        if ex:
+            # SET key value EX seconds
+            command = ['SET', key, value, 'EX', str(ex)]
+        else:
+            # SET key value
+            command = ['SET', key, value]
+
+        try:
+            self._command(command)
+            logger.info('KV SET successful for key %s', key)
+            return True
+        except KVError as e:
+            logger.error('Error setting key %s: %s', key, e)
             return False
-        except Exception as e:
-            logger.error(f"Error setting key {key}: {e}", exc_info=True)
+
+    def _set_many(self, entries: List[Tuple[str, str, Optional[int]]]) -> bool:
+        # One round trip for all keys, applied as one transaction (MULTI on
+        # Redis, multi-exec on Upstash), so a delivery is never left
+        # half-recorded
+        commands = [_set_command(key, value, ex) for key, value, ex in entries]
+        keys = ', '.join(key for key, _, _ in entries)
+        try:
+            self._transaction(commands)
+            logger.info('KV SET successful for keys %s', keys)
+            return True
+        except KVError as e:
+            logger.error('Error setting keys %s: %s', keys, e)
             return False
 
+    @staticmethod
+    def _eval_command(script: Script, keys: List[str], args: List[str]) -> List[str]:
+        return ['EVAL', script.source, str(len(keys)), *keys, *args]
+
+    def _eval(self, script: Script, keys: List[str], args: List[str], idempotent: bool = True) -> Any:
+        return self._command(self._eval_command(script, keys, args), idempotent=idempotent)
+
     def _delete(self, key: str) -> bool:
         try:
-            # Upstash REST API: DEL key
-            command = ['DEL', key]
-
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=command,
-                timeout=10
-            )
-            return response.status_code == 200
-        except Exception as e:
-            logger.error(f"Error deleting key {key}: {e}", exc_info=True)
+            self._command(['DEL', key])
+            return True
+        except KVError as e:
+            logger.error('Error deleting key %s: %s', key, e)
             return False
 
-    def save_comment_mapping(self, comment_id: int, slack_data: Dict[str, Any]) -> bool:
-        key = f'github_comment:{comment_id}'
-        value = json.dumps(slack_data)
-        result = self._set(key, value, ex=30*24*60*60)
+    # One forwarded comment is one conversation record, stored as a compact
+    # positional JSON array under conversation:{comment_id}, plus a
+    # thread:{ts} index key holding the comment id. The repo, installation
+    # and TTL are no longer repeated across two JSON keys, and the record
+    # doubles as the comment's processed marker. github_comment:{id} and
+    # slack_thread:{ts} are the legacy layout, still read until
+    # scripts/migrate_conversations.py has moved them over
+    # Follow-up comments are posted into the thread of the comment they
+    # reply to and saved with index_thread=False: the thread keeps pointing
+    # at the top-level comment, the only one GitHub accepts replies to
+    def save_conversation(self, comment_id: int, slack_data: Dict[str, Any],
+                          github_data: Dict[str, Any], index_thread: bool = True) -> bool:
+        thread_ts = slack_data.get('thread_ts')
+        result = self._set_many(conversation_entries(comment_id, slack_data, github_data,
+                                                     index_thread=index_thread))
         if result:
-            logger.info(f"Saved comment mapping for {comment_id} -> thread {slack_data.get('thread_ts')}")
+            logger.info('Saved conversation for %s <-> thread %s', comment_id, thread_ts)
         else:
-            logger.error(f"Failed to save comment mapping for {comment_id}")
+            logger.error('Failed to save conversation for %s', comment_id)
         return result
 
-    def get_comment_mapping(self, comment_id: int) -> Optional[Dict[str, Any]]:
-        key = f'github_comment:{comment_id}'
-        value = self._get(key)
-        if value:
+    def is_comment_forwarded(self, comment_id: int) -> bool:
+        # EXISTS counts both layouts in one round trip
+        return bool(self._command(['EXISTS', f'conversation:{comment_id}',
+                                   f'last_processed:comment:{comment_id}']))
+
+    def get_comment_state(self, comment_id: int, repo: str,
+                          pr_number: int) -> Tuple[Optional[Set[str]], Optional[Dict[str, Any]]]:
+        # Who was notified about the comment, and the cached PR metadata, in
+        # one round trip
+        forwarded, metadata, recipients = self._pipeline([
+            ['EXISTS', f'conversation:{comment_id}', f'last_processed:comment:{comment_id}'],
+            ['GET', f'pr_metadata:{repo}:{pr_number}'],
+            ['HGETALL', f'recipients:comment:{comment_id}'],
+        ])
+        try:
+            metadata = json.loads(metadata) if metadata else None
+        except json.JSONDecodeError:
+            metadata = None
+        return self._notified(forwarded, recipients), metadata
+
+    def get_reply_state(self, comment_id: int, root_comment_id: int
+                        ) -> Tuple[Optional[Set[str]], Dict[str, Dict[str, Any]]]:
+        # Who was notified about a follow-up comment, and the Slack thread
+        # each recipient has for the comment it replies to, in one round
+        # trip. A thread recorded before recipients were tracked is the PR
+        # author's, returned under ''
+        forwarded, recipients, (record, legacy), root_recipients = self._pipeline([
+            ['EXISTS', f'conversation:{comment_id}', f'last_processed:comment:{comment_id}'],
+            ['HGETALL', f'recipients:comment:{comment_id}'],
+            ['MGET', f'conversation:{root_comment_id}', f'github_comment:{root_comment_id}'],
+            ['HGETALL', f'recipients:comment:{root_comment_id}'],
+        ])
+        threads = _decode_recipients(root_recipients)
+        if not threads:
+            conversation = self._conversation(root_comment_id, record, legacy)
+            if conversation and conversation.get('thread_ts'):
+                threads[''] = {field: conversation.get(field) for field in ('channel', 'thread_ts')}
+        return self._notified(forwarded, recipients), threads
+
+    def get_review_state(self, review_id: int) -> Optional[Set[str]]:
+        processed, recipients = self._pipeline([
+            ['EXISTS', f'last_processed:review:{review_id}'],
+            ['HGETALL', f'recipients:review:{review_id}'],
+        ])
+        return self._notified(processed, recipients)
+
+    @staticmethod
+    def _notified(processed: Any, recipients: Optional[List[str]]) -> Optional[Set[str]]:
+        # The Slack users already notified about an event, or None when it
+        # was processed before recipients were tracked, which counts as
+        # everyone
+        notified = set((recipients or [])[::2])
+        if processed and not notified:
+            return None
+        return notified
+
+    def get_conversation(self, comment_id: int) -> Optional[Dict[str, Any]]:
+        record, legacy = self._command(['MGET', f'conversation:{comment_id}',
+                                        f'github_comment:{comment_id}'])
+        return self._conversation(comment_id, record, legacy)
+
+    @staticmethod
+    def _conversation(comment_id: int, record: Optional[str],
+                      legacy: Optional[str]) -> Optional[Dict[str, Any]]:
+        if record:
+            return decode_conversation(comment_id, record)
+        if legacy:
             try:
-                return json.loads(value)
+                return json.loads(legacy)
             except json.JSONDecodeError:
                 return None
         return None
 
-    def save_thread_mapping(self, thread_ts: str, github_data: Dict[str, Any]) -> bool:
-        key = f'slack_thread:{thread_ts}'
-        value = json.dumps(github_data)
-        result = self._set(key, value, ex=30*24*60*60)
-        if result:
-            logger.info(f"Saved thread mapping for {thread_ts} -> comment {github_data.get('comment_id')}")
-        else:
-            logger.error(f"Failed to save thread mapping for {thread_ts}")
-        return result
+    def get_comment_mapping(self, comment_id: int) -> Optional[Dict[str, Any]]:
+        conversation = self.get_conversation(comment_id)
+        if conversation is None:
+            return None
+        return {field: conversation.get(field) for field in ('channel', 'thread_ts', 'message_ts')}
 
     def get_thread_mapping(self, thread_ts: str) -> Optional[Dict[str, Any]]:
-        key = f'slack_thread:{thread_ts}'
-        value = self._get(key)
-        if value:
+        comment_id, legacy = self._command(['MGET', f'thread:{thread_ts}', f'slack_thread:{thread_ts}'])
+        if comment_id:
+            conversation = self.get_conversation(int(comment_id))
+            if conversation is None:
+                return None
+            return {field: conversation.get(field) for field in
+                    ('comment_id', 'installation_id', 'repo_full_name', 'pr_number', 'type')}
+        if legacy:
             try:
-                return json.loads(value)
+                return json.loads(legacy)
             except json.JSONDecodeError:
                 return None
         return None
 
     def save_last_processed(self, event_type: str, event_id: str) -> bool:
+        key, value, ttl = processed_entry(event_type, event_id)
+        return self._set(key, value, ex=ttl)
+
+    def claim_processed(self, event_type: str, event_id: str, ttl: int = 24*60*60) -> bool:
+        # SET NX makes the check and the mark a single atomic step, so only
+        # one of several concurrent deliveries wins. Not retried: a retry
+        # after a lost reply would see our own claim and report a duplicate
         key = f'last_processed:{event_type}:{event_id}'
         value = datetime.now().isoformat()
-        return self._set(key, value, ex=24*60*60)
+        result = self._command(['SET', key, value, 'NX', 'EX', str(ttl)], idempotent=False)
+        return result == 'OK'
+
+    def release_processed(self, event_type: str, event_id: str) -> bool:
+        # Undoes a claim whose work failed, so a redelivery is processed
+        return self._delete(f'last_processed:{event_type}:{event_id}')
 
     def is_processed(self, event_type: str, event_id: str) -> bool:
         key = f'last_processed:{event_type}:{event_id}'
         return self._get(key) is not None
 
+    def save_mappings(self, delivered: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> bool:
+        # The mappings of several deliveries (mapping, Slack data) in one
+        # transaction
+        commands = [command for mapping, slack_data in delivered
+                    for command in mapping_commands(mapping, slack_data)]
+        try:
+            self._transaction(commands)
+            return True
+        except KVError as e:
+            logger.error('Error saving mappings of %s Slack deliveries: %s', len(delivered), e)
+            return False
+
+    # The Slack outbox: deliveries that failed, with their rendered message
+    # and the mapping to record once they go through, kept in one hash so a
+    # replay reads the whole backlog in one round trip
+    def add_outbox_entries(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        # Raises KVError: a delivery that can be neither sent nor queued has
+        # to fail the request
+        self._command(['HSET', OUTBOX_KEY, *[part for entry_id, entry in entries.items()
+                                             for part in (entry_id, json.dumps(entry))]])
+
+    def get_outbox(self) -> Dict[str, Dict[str, Any]]:
+        flat = self._command(['HGETALL', OUTBOX_KEY]) or []
+        entries = {}
+        for entry_id, value in zip(flat[::2], flat[1::2]):
+            try:
+                entries[entry_id] = json.loads(value)
+            except json.JSONDecodeError:
+                logger.error('Skipping undecodable outbox entry %s', entry_id)
+        return entries
+
+    def settle_outbox(self, delivered: List[Tuple[str, Dict[str, Any], Dict[str, Any]]],
+                      rescheduled: Dict[str, Dict[str, Any]], dropped: List[str]) -> None:
+        # One transaction per replayed batch: the mappings of what went
+        # through (delivery id, mapping, Slack data), the updated attempts
+        # of what did not, and the removal of both delivered and dropped
+        # entries, so an entry is never removed without its mapping. Every
+        # command is safe to repeat
+        commands: List[Sequence[Any]] = []
+        for _, mapping, slack_data in delivered:
+            commands.extend(mapping_commands(mapping, slack_data))
+        if rescheduled:
+            commands.append(['HSET', OUTBOX_KEY,
+                             *[part for entry_id, entry in rescheduled.items()
+                               for part in (entry_id, json.dumps(entry))]])
+        removed = [entry_id for entry_id, _, _ in delivered] + dropped
+        if removed:
+            commands.append(['HDEL', OUTBOX_KEY, *removed])
+        if commands:
+            self._transaction(commands)
+
+    def acquire_lease(self, name: str, token: str, ttl: int) -> bool:
+        # Not retried, for the same reason as claim_processed
+        result = self._command(['SET', f'lease:{name}', token, 'NX', 'EX', str(ttl)], idempotent=False)
+        return result == 'OK'
+
+    def release_lease(self, name: str, token: str) -> bool:
+        try:
+            return bool(self._eval(RELEASE_LEASE, [f'lease:{name}'], [token]))
+        except KVError as e:
+            logger.error('Error releasing lease %s: %s', name, e)
+            return False
+
+    # Open PRs per author: one hash per GitHub login (lowercased, logins are
+    # case-insensitive) with a {repo}#{number} field per PR, kept current by
+    # pull_request webhooks and rebuilt by scripts/backfill_pr_index.py
+    @staticmethod
+    def _open_prs_key(author: str) -> str:
+        return f'open_prs:{author.lower()}'
+
+    @staticmethod
+    def _open_pr_entry(pull: Dict[str, Any]) -> Tuple[str, str]:
+        return (f"{pull['repo']}#{pull['number']}",
+                json.dumps({'title': pull.get('title'), 'url': pull.get('html_url')}))
+
+    def add_open_pr(self, author: str, pull: Dict[str, Any]) -> bool:
+        field, value = self._open_pr_entry(pull)
+        try:
+            self._command(['HSET', self._open_prs_key(author), field, value])
+            return True
+        except KVError as e:
+            logger.error('Error indexing %s for %s: %s', field, author, e)
+            return False
+
+    def remove_open_pr(self, author: str, repo: str, pr_number: int) -> bool:
+        try:
+            self._command(['HDEL', self._open_prs_key(author), f'{repo}#{pr_number}'])
+            return True
+        except KVError as e:
+            logger.error('Error unindexing %s#%s for %s: %s', repo, pr_number, author, e)
+            return False
+
+    def get_open_prs(self, author: str) -> List[Dict[str, Any]]:
+        flat = self._command(['HGETALL', self._open_prs_key(author)]) or []
+        pulls = []
+        for field, value in zip(flat[::2], flat[1::2]):
+            repo, _, number = field.rpartition('#')
+            try:
+                data = json.loads(value)
+            except json.JSONDecodeError:
+                data = {}
+            pulls.append({'repo': repo, 'number': int(number),
+                          'title': data.get('title'), 'html_url': data.get('url')})
+        return sorted(pulls, key=lambda pull: (pull['repo'], pull['number']))
+
+    def replace_open_prs(self, pulls_by_author: Dict[str, List[Dict[str, Any]]],
+                         batch_size: int = 100) -> int:
+        # DEL + HSET per author inside one pipeline per batch; authors not
+        # given keep their index
+        authors = list(pulls_by_author)
+        for start in range(0, len(authors), batch_size):
+            commands = []
+            for author in authors[start:start + batch_size]:
+                key = self._open_prs_key(author)
+                commands.append(['DEL', key])
+                fields = [part for pull in pulls_by_author[author] for part in self._open_pr_entry(pull)]
+                if fields:
+                    commands.append(['HSET', key, *fields])
+            self._pipeline(commands)
+        return len(authors)
+
+    def scan_keys(self, pattern: str, count: int = 500) -> Iterator[str]:
+        cursor = '0'
+        while True:
+            cursor, keys = self._command(['SCAN', cursor, 'MATCH', pattern, 'COUNT', str(count)])
+            yield from keys
+            if str(cursor) == '0':
+                return
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        # Raises KVError, like _get
+        return self._command(['MGET', *keys]) if keys else []
+
+    def get_many_with_ttl(self, keys: List[str]) -> List[Tuple[Optional[str], int]]:
+        # (value, TTL in seconds) per key in one round trip; the TTL is -1
+        # for keys that never expire and -2 for missing ones
+        replies = self._pipeline([command for key in keys for command in (['GET', key], ['TTL', key])])
+        return list(zip(replies[::2], replies[1::2]))
+
+    def replace_entries(self, entries: List[Tuple[str, str, Optional[int]]], deleted: List[str]) -> None:
+        # Writes (key, value, ttl) entries and deletes keys in one
+        # transaction, so a key is never dropped without its replacement.
+        # Raises KVError
+        commands = [_set_command(key, value, ex) for key, value, ex in entries]
+        if deleted:
+            commands.append(['DEL', *deleted])
+        if commands:
+            self._transaction(commands)
+
     def save_pr_metadata(self, repo: str, pr_number: int, metadata: Dict[str, Any]) -> bool:
         key = f'pr_metadata:{repo}:{pr_number}'
         value = json.dumps(metadata)
         return self._set(key, value, ex=90*24*60*60)
 
+    def save_snippet(self, digest: str, snippet: str, ttl: int = 7*24*60*60) -> bool:
+        return self._set(f'snippet:{digest}', snippet, ex=ttl)
+
+    def get_snippet(self, digest: str) -> Optional[str]:
+        return self._get(f'snippet:{digest}')
+
     def get_pr_metadata(self, repo: str, pr_number: int) -> Optional[Dict[str, Any]]:
         key = f'pr_metadata:{repo}:{pr_number}'
         value = self._get(key)
@@ -144,6 +541,76 @@ class KVStore:
                 return None
         return None
 
+    def register_user(self, slack_user_id: str, github_username: str,
+                      user_data: Dict[str, Any]) -> bool:
+        # Both mappings, and the removal of the reverse mapping left behind
+        # by a previous username, in one atomic round trip
+        try:
+            self._eval(REGISTER_USER,
+                       [f'user:slack:{slack_user_id}', f'user:github:{github_username}'],
+                       [json.dumps(user_data), slack_user_id, 'user:github:'])
+            return True
+        except KVError as e:
+            logger.error('Error registering user %s: %s', slack_user_id, e)
+            return False
+
+    def unregister_user(self, slack_user_id: str) -> Optional[Dict[str, Any]]:
+        # Returns the removed user data, or None if the user was not
+        # registered. Not retried: a retry after a lost reply would find
+        # nothing left and report the user as unknown
+        value = self._eval(UNREGISTER_USER, [f'user:slack:{slack_user_id}'],
+                           [slack_user_id, 'user:github:'], idempotent=False)
+        if value:
+            try:
+                return json.loads(value)
+            except json.JSONDecodeError:
+                return {}
+        return None
+
+    def get_user_mappings(self, slack_user_ids: List[str],
+                          batch_size: int = 500) -> Dict[str, Optional[Dict[str, Any]]]:
+        users = {}
+        for start in range(0, len(slack_user_ids), batch_size):
+            batch = slack_user_ids[start:start + batch_size]
+            values = self._command(['MGET', *[f'user:slack:{user_id}' for user_id in batch]])
+            for user_id, value in zip(batch, values):
+                try:
+                    users[user_id] = json.loads(value) if value else None
+                except json.JSONDecodeError:
+                    users[user_id] = None
+        return users
+
+    def register_users(self, users: List[Tuple[str, str, Dict[str, Any]]],
+                       batch_size: int = 200) -> int:
+        # Same script as register_user, pipelined: one round trip per batch,
+        # and each user still updated atomically. Returns how many were saved
+        saved = 0
+        for start in range(0, len(users), batch_size):
+            batch = users[start:start + batch_size]
+            commands = [self._eval_command(REGISTER_USER,
+                                           [f'user:slack:{slack_user_id}', f'user:github:{github_username}'],
+                                           [json.dumps(user_data), slack_user_id, 'user:github:'])
+                        for slack_user_id, github_username, user_data in batch]
+            try:
+                self._pipeline(commands)
+                saved += len(batch)
+            except KVError as e:
+                logger.error('Error registering users %s-%s: %s', start, start + len(batch), e)
+        return saved
+
+    def unregister_users(self, slack_user_ids: List[str], batch_size: int = 200) -> int:
+        removed = 0
+        for start in range(0, len(slack_user_ids), batch_size):
+            batch = slack_user_ids[start:start + batch_size]
+            commands = [self._eval_command(UNREGISTER_USER, [f'user:slack:{user_id}'],
+                                           [user_id, 'user:github:'])
+                        for user_id in batch]
+            try:
+                removed += sum(1 for value in self._pipeline(commands, idempotent=False) if value)
+            except KVError as e:
+                logger.error('Error unregistering users %s-%s: %s', start, start + len(batch), e)
+        return removed
+
     def save_user_mapping(self, slack_user_id: str, user_data: Dict[str, Any]) -> bool:
         key = f'user:slack:{slack_user_id}'
         value = json.dumps(user_data)
@@ -171,6 +638,26 @@ class KVStore:
         key = f'user:github:{github_username}'
         return self._get(key)
 
+    def get_github_to_slack_mappings(self, github_usernames: List[str],
+                                     batch_size: int = 500) -> Dict[str, Optional[str]]:
+        slack_user_ids = {}
+        for start in range(0, len(github_usernames), batch_size):
+            batch = github_usernames[start:start + batch_size]
+            values = self._command(['MGET', *[f'user:github:{username}' for username in batch]])
+            slack_user_ids.update(zip(batch, values))
+        return slack_user_ids
+
+    def get_thread_participants(self, root_comment_id: int, github_usernames: List[str]
+                                ) -> Tuple[List[str], Dict[str, Optional[str]]]:
+        # The GitHub logins that took part in a review thread, and the Slack
+        # users of the given logins, in one round trip
+        commands = [['SMEMBERS', f'participants:{root_comment_id}']]
+        if github_usernames:
+            commands.append(['MGET', *[f'user:github:{username}' for username in github_usernames]])
+        results = self._pipeline(commands)
+        values = results[1] if github_usernames else []
+        return sorted(results[0] or []), dict(zip(github_usernames, values))
+
     def delete_github_to_slack_mapping(self, github_username: str) -> bool:
         key = f'user:github:{github_username}'
         return self._delete(key)
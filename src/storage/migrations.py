@@ -0,0 +1,84 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from .kv_store import CONVERSATION_TTL, KVStore, conversation_entries
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_conversations(kv_store: KVStore, batch_size: int = 100,
+                          dry_run: bool = False) -> Dict[str, int]:
+    # Moves github_comment:{id} + slack_thread:{ts} pairs into conversation
+    # records. Passes repeat until one migrates nothing: deleting keys can
+    # shift a SCAN cursor past others, and instances still running the old
+    # code may write legacy keys while the migration runs
+    stats = {'migrated': 0, 'skipped': 0, 'passes': 0}
+    while True:
+        stats['passes'] += 1
+        scanned = migrated = 0
+        batch: List[str] = []
+        for key in kv_store.scan_keys('github_comment:*', count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                scanned += len(batch)
+                migrated += _migrate_batch(kv_store, batch, dry_run)
+                batch = []
+        if batch:
+            scanned += len(batch)
+            migrated += _migrate_batch(kv_store, batch, dry_run)
+        stats['migrated'] += migrated
+        if not migrated or dry_run:
+            # Whatever the last pass could not move stays in the old layout
+            stats['skipped'] = scanned - migrated
+            return stats
+
+
+def _migrate_batch(kv_store: KVStore, keys: List[str], dry_run: bool) -> int:
+    # Two reads and one transactional write per batch, however large
+    pending: List[Dict[str, Any]] = []
+    for key, (value, ttl) in zip(keys, kv_store.get_many_with_ttl(keys)):
+        if value is None or ttl == -2:
+            continue
+        try:
+            slack_data = json.loads(value)
+        except json.JSONDecodeError:
+            logger.warning('Skipping %s: not valid JSON', key)
+            continue
+        if not slack_data.get('thread_ts'):
+            logger.warning('Skipping %s: no thread_ts', key)
+            continue
+        pending.append({
+            'key': key,
+            'comment_id': int(key.split(':', 1)[1]),
+            'slack_data': slack_data,
+            'ttl': ttl if ttl > 0 else CONVERSATION_TTL,
+        })
+    if not pending:
+        return 0
+
+    threads = kv_store.get_many([f"slack_thread:{item['slack_data']['thread_ts']}" for item in pending])
+
+    entries: List[Tuple[str, str, Optional[int]]] = []
+    deleted: List[str] = []
+    migrated = 0
+    for item, value in zip(pending, threads):
+        try:
+            github_data = json.loads(value) if value else None
+        except json.JSONDecodeError:
+            github_data = None
+        if not github_data:
+            # Without its thread half the record could not route replies;
+            # the legacy key is left to expire on its own
+            logger.warning('Skipping %s: no matching thread mapping', item['key'])
+            continue
+
+        thread_ts = item['slack_data']['thread_ts']
+        entries.extend(conversation_entries(item['comment_id'], item['slack_data'],
+                                            github_data, ttl=item['ttl']))
+        deleted.extend([item['key'], f'slack_thread:{thread_ts}'])
+        migrated += 1
+
+    if migrated and not dry_run:
+        kv_store.replace_entries(entries, deleted)
+    return migrated
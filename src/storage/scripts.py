@@ -0,0 +1,126 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+Call = Callable[[Sequence[Any]], Any]
+
+
+# A Lua script run with EVAL, so a read-then-write over several keys is
+# atomic and costs one round trip. Backends without a Lua interpreter run
+# the Python emulation instead, inside the same transaction as EVAL.
+class Script:
+    def __init__(self, source: str, emulation: Callable[[Call, List[str], List[str]], Any]):
+        self.source = source.strip()
+        self.sha = hashlib.sha1(self.source.encode()).hexdigest()
+        self.emulation = emulation
+
+
+_registry: Dict[str, Script] = {}
+
+
+def register(script: Script) -> Script:
+    _registry[script.source] = script
+    return script
+
+
+def find(source: str) -> Optional[Script]:
+    return _registry.get(source.strip())
+
+
+def _github_username(value: Optional[str]) -> Optional[str]:
+    try:
+        data = json.loads(value) if value else None
+    except json.JSONDecodeError:
+        return None
+    return data.get('github_username') if isinstance(data, dict) else None
+
+
+def _drop_reverse_mapping(call: Call, previous: Optional[str], prefix: str, slack_user_id: str,
+                          keep: Optional[str] = None) -> None:
+    username = _github_username(previous)
+    if not username:
+        return
+    stale = prefix + username
+    if stale != keep and call(['GET', stale]) == slack_user_id:
+        call(['DEL', stale])
+
+
+# The reverse mapping key is derived from the stored record, so it is not in
+# KEYS; fine on a single Redis or Upstash database, not on a cluster.
+# Reverse mappings are only removed while they still point at this user.
+_LUA_HELPERS = '''
+local function drop_reverse(previous, prefix, slack_user_id, keep)
+  if not previous then return end
+  local ok, data = pcall(cjson.decode, previous)
+  if not ok or type(data) ~= 'table' or type(data.github_username) ~= 'string' then return end
+  local stale = prefix .. data.github_username
+  if stale ~= keep and redis.call('GET', stale) == slack_user_id then
+    redis.call('DEL', stale)
+  end
+end
+'''
+
+
+def _register_user(call: Call, keys: List[str], args: List[str]) -> Optional[str]:
+    user_key, github_key = keys
+    user_json, slack_user_id, prefix = args
+    previous = call(['GET', user_key])
+    _drop_reverse_mapping(call, previous, prefix, slack_user_id, keep=github_key)
+    call(['SET', user_key, user_json])
+    call(['SET', github_key, slack_user_id])
+    return previous
+
+
+# KEYS: user:slack:{id}, user:github:{username}
+# ARGV: user record JSON, Slack user id, reverse mapping key prefix
+# Returns the previous user record, if any
+REGISTER_USER = register(Script(_LUA_HELPERS + '''
+local previous = redis.call('GET', KEYS[1])
+drop_reverse(previous, ARGV[3], ARGV[2], KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], ARGV[2])
+return previous
+''', _register_user))
+
+
+def _unregister_user(call: Call, keys: List[str], args: List[str]) -> Optional[str]:
+    user_key, = keys
+    slack_user_id, prefix = args
+    previous = call(['GET', user_key])
+    if previous is None:
+        return None
+    call(['DEL', user_key])
+    _drop_reverse_mapping(call, previous, prefix, slack_user_id)
+    return previous
+
+
+# KEYS: user:slack:{id}
+# ARGV: Slack user id, reverse mapping key prefix
+# Returns the removed user record, or nil when there was none
+UNREGISTER_USER = register(Script(_LUA_HELPERS + '''
+local previous = redis.call('GET', KEYS[1])
+if not previous then return false end
+redis.call('DEL', KEYS[1])
+drop_reverse(previous, ARGV[2], ARGV[1], nil)
+return previous
+''', _unregister_user))
+
+
+def _release_lease(call: Call, keys: List[str], args: List[str]) -> int:
+    lease_key, = keys
+    token, = args
+    if call(['GET', lease_key]) != token:
+        return 0
+    call(['DEL', lease_key])
+    return 1
+
+
+# KEYS: the lease key
+# ARGV: the token the lease was taken with
+# Deletes the lease only while it is still ours; returns 1 if it was
+RELEASE_LEASE = register(Script('''
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+''', _release_lease))
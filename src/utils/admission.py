@@ -0,0 +1,141 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.utils.deadline import current_deadline
+from src.utils.logger import setup_logger
+
+logger = setup_logger()
+
+# Priority classes, most valuable first
+REPLY = 0
+COMMENT = 1
+REVIEW = 2
+BACKGROUND = 3
+
+PRIORITY_NAMES = ('reply', 'comment', 'review', 'background')
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, priority: int, status: int, retry_after: int):
+        super().__init__(f'Shedding {PRIORITY_NAMES[priority]} work, instance is saturated')
+        self.priority = priority
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Bounds the webhook work in flight on one instance. Each priority class may
+# only fill its share of the slots, so a burst of low-value events leaves
+# headroom for replies and comments instead of everything timing out
+# together. Replies and comments that find no slot wait briefly, and are
+# admitted ahead of anything else when one frees up; reviews and background
+# events are refused at once. A refusal while the instance is full is a 503,
+# one that only hits the class's share is a 429.
+class AdmissionController:
+    SHARES = (1.0, 0.9, 0.7, 0.5)
+    WAITING_CLASSES = (REPLY, COMMENT)
+    # Sheds are logged on the first and then every this many
+    REPORT_EVERY = 100
+
+    def __init__(self, limit: int, max_wait: float = 0.5, retry_after: int = 5):
+        self.limit = limit
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._waiting = [0] * len(PRIORITY_NAMES)
+        self._admitted = [0] * len(PRIORITY_NAMES)
+        self._shed = [0] * len(PRIORITY_NAMES)
+        self._condition = threading.Condition()
+
+    def capacity(self, priority: int) -> int:
+        return max(1, int(self.limit * self.SHARES[priority]))
+
+    def acquire(self, priority: int) -> None:
+        if self.limit <= 0:
+            return
+
+        with self._condition:
+            if self._fits(priority):
+                self._admit(priority)
+                return
+
+            if priority in self.WAITING_CLASSES and self.max_wait > 0:
+                wait = self.max_wait
+                deadline = current_deadline()
+                if deadline is not None:
+                    wait = min(wait, deadline.remaining())
+                until = time.monotonic() + wait
+                self._waiting[priority] += 1
+                try:
+                    while True:
+                        remaining = until - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                        if self._fits(priority):
+                            self._admit(priority)
+                            return
+                finally:
+                    self._waiting[priority] -= 1
+
+            self._shed[priority] += 1
+            shed = sum(self._shed)
+            in_flight = self._in_flight
+            counts = self._counts(self._shed)
+            status = 503 if in_flight >= self.limit else 429
+
+        if shed == 1 or shed % self.REPORT_EVERY == 0:
+            logger.warning('Admission: shed %s request(s) so far (%s), %s in flight of %s',
+                           shed, counts, in_flight, self.limit)
+        raise AdmissionRejected(priority, status, self.retry_after)
+
+    def release(self) -> None:
+        if self.limit <= 0:
+            return
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'limit': self.limit,
+                'in_flight': self._in_flight,
+                'admitted': self._counts(self._admitted),
+                'shed': self._counts(self._shed),
+            }
+
+    def reset_stats(self) -> None:
+        with self._condition:
+            self._admitted = [0] * len(PRIORITY_NAMES)
+            self._shed = [0] * len(PRIORITY_NAMES)
+
+    def _fits(self, priority: int) -> bool:
+        # Callers hold the condition. A class waiting ahead of this one gets
+        # the next free slot first
+        if any(self._waiting[:priority]):
+            return False
+        return self._in_flight < self.capacity(priority)
+
+    def _admit(self, priority: int) -> None:
+        self._in_flight += 1
+        self._admitted[priority] += 1
+
+    @staticmethod
+    def _counts(values: List[int]) -> Dict[str, int]:
+        return dict(zip(PRIORITY_NAMES, values))
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller(config) -> AdmissionController:
+    # One controller per process: the limit is per instance, shared by every
+    # handler that runs in it
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(config.admission_limit, config.admission_max_wait,
+                                              config.admission_retry_after)
+        return _controller
@@ -0,0 +1,73 @@
+import atexit
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from src.utils.config import Config
+from src.utils.deadline import clear_deadline, start_deadline
+from src.utils.logger import setup_logger
+from src.utils.ordered_pool import OrderedWorkerPool
+
+logger = setup_logger()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_ordered: Optional[OrderedWorkerPool] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=Config.get_int('BACKGROUND_WORKERS', 4),
+                thread_name_prefix='marites-bg'
+            )
+        return _executor
+
+
+def _get_ordered_pool() -> OrderedWorkerPool:
+    global _ordered
+    with _executor_lock:
+        if _ordered is None:
+            _ordered = OrderedWorkerPool(Config.get_int('ORDERED_WORKERS', 16))
+        return _ordered
+
+
+def _run(func: Callable[..., Any], budget: Optional[float], args, kwargs) -> Any:
+    # Work that outlives the request gets its own deadline; the request's
+    # deadline belongs to another thread's context
+    if budget:
+        start_deadline(budget)
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        logger.error('Background task %s failed: %s', getattr(func, '__name__', func), e, exc_info=True)
+        return None
+    finally:
+        clear_deadline()
+
+
+def run_in_background(func: Callable[..., Any], *args, budget: Optional[float] = None,
+                      **kwargs) -> Future:
+    return _get_executor().submit(_run, func, budget, args, kwargs)
+
+
+def run_ordered(key: Hashable, func: Callable[..., Any], *args, budget: Optional[float] = None,
+                **kwargs) -> Future:
+    # Like run_in_background, but jobs with the same key run one at a time
+    # in the order they were submitted
+    return _get_ordered_pool().submit(key, _run, func, budget, args, kwargs)
+
+
+def ordered_backlog() -> Dict[Hashable, int]:
+    if _ordered is None:
+        return {}
+    return _ordered.backlog()
+
+
+@atexit.register
+def _drain_ordered() -> None:
+    # The lanes are daemon threads; give queued events a chance to finish
+    if _ordered is not None:
+        _ordered.shutdown(timeout=Config().request_budget_seconds)
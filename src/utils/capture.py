@@ -0,0 +1,220 @@
+import atexit
+import base64
+import glob
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger()
+
+SEGMENT_PATTERN = 'capture-*.ndjson.gz'
+_ACTIVE_SUFFIX = '.part'
+_REDACTED = '[redacted]'
+
+# Headers that carry credentials or signatures over the captured body; the
+# signatures would not verify against a redacted body anyway. Any other
+# header whose name mentions one of _SECRET_HEADER_WORDS is redacted too
+_SECRET_HEADERS = {'authorization', 'cookie', 'x-hub-signature', 'x-hub-signature-256',
+                   'x-slack-signature', 'proxy-authorization', 'x-marites-profile'}
+_SECRET_HEADER_WORDS = ('token', 'secret', 'signature', 'password', 'key')
+
+# (needles, pattern, replacement): a pattern only runs when one of its
+# needles occurs in the lowercased body, which skips most of them on most
+# payloads. Identifier runs are bounded so a match attempt stays short
+_BODY_PATTERNS = [
+    # JSON members whose name says they hold a secret
+    (('token', 'secret', 'password', 'api_key'),
+     re.compile(r'("[A-Za-z_]{0,40}(?:token|secret|password|api_key)[A-Za-z_]{0,40}"\s*:\s*)"(?:[^"\\]|\\.)*"',
+                re.IGNORECASE), r'\1"' + _REDACTED + '"'),
+    # Form fields of the same kind (Slack slash commands and interactions)
+    (('token', 'secret', 'password'),
+     re.compile(r'((?:^|&)[A-Za-z_]{0,40}(?:token|secret|password)[A-Za-z_]{0,40}=)[^&]*', re.IGNORECASE),
+     r'\1' + _REDACTED),
+    # Slack, GitHub and bearer tokens wherever they appear
+    (('xox',), re.compile(r'xox[abposr]-[A-Za-z0-9-]+'), _REDACTED),
+    (('ghp_', 'gho_', 'ghu_', 'ghs_', 'ghr_', 'github_pat_'),
+     re.compile(r'\b(?:gh[pousr]_[A-Za-z0-9]{20,}|github_pat_[A-Za-z0-9_]{20,})'), _REDACTED),
+    (('bearer',), re.compile(r'(Bearer\s+)[A-Za-z0-9._~+/=-]+', re.IGNORECASE), r'\1' + _REDACTED),
+    # Emails, plain or form-encoded. The lookbehind only lets a match start
+    # where a local part can begin; without it a long run of word characters
+    # (a minified line, a base64 blob) backtracks quadratically
+    (('@', '%40'),
+     re.compile(r'(?<![A-Za-z0-9._+-])[A-Za-z0-9._+-]+(?:@|%40)[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}'),
+     _REDACTED),
+]
+
+
+def _is_secret_header(name: str) -> bool:
+    name = name.lower()
+    return name in _SECRET_HEADERS or any(word in name for word in _SECRET_HEADER_WORDS)
+
+
+def redact_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {name: _REDACTED if _is_secret_header(name) else value
+            for name, value in headers.items()}
+
+
+def redact_body(body: str) -> str:
+    lowered = body.lower()
+    for needles, pattern, replacement in _BODY_PATTERNS:
+        if any(needle in lowered for needle in needles):
+            body = pattern.sub(replacement, body)
+    return body
+
+
+def _record(source: str, method: str, path: str, headers: Dict[str, str], body: bytes,
+            received_at: float) -> Dict[str, Any]:
+    record: Dict[str, Any] = {
+        'received_at': received_at,
+        'source': source,
+        'method': method,
+        'path': path,
+        'headers': redact_headers(headers),
+    }
+    try:
+        record['body'] = redact_body(body.decode('utf-8'))
+    except UnicodeDecodeError:
+        # Not text, so nothing to redact by pattern; keep it only as bytes
+        record['body'] = base64.b64encode(body).decode()
+        record['body_encoding'] = 'base64'
+    return record
+
+
+# Appends inbound webhook requests to gzip-compressed NDJSON segments. The
+# request thread only puts the raw headers and body on a queue; redaction,
+# serialisation and compression happen on a writer thread. A segment is
+# written as `.part` and renamed once it holds segment_bytes of records, and
+# the oldest segments are deleted beyond max_segments. The queue holds at
+# most queue_size requests; when the writer falls behind, further requests
+# are dropped and counted rather than kept in memory.
+class CaptureWriter:
+    def __init__(self, directory: str, segment_bytes: int = 8 * 1024 * 1024, max_segments: int = 50,
+                 queue_size: int = 1000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.dropped = 0
+        self._queue: 'queue.Queue[Optional[tuple]]' = queue.Queue(maxsize=queue_size)
+        self._file: Optional[gzip.GzipFile] = None
+        self._path = ''
+        self._written = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def capture(self, source: str, method: str, path: str, headers: Dict[str, str], body: bytes) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='marites-capture', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait((source, method, path, headers, body, time.time()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Once, then every thousandth drop, not on every request
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning('Capture queue full, %s request(s) not captured so far', dropped)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        # Writes what is queued and completes the active segment
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._finish_segment()
+                return
+            try:
+                self._write(_record(*item))
+            except (OSError, ValueError) as e:
+                logger.warning('Could not capture webhook request: %s', e)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._path = os.path.join(self.directory, f'capture-{time.time_ns()}-{os.getpid()}.ndjson.gz')
+            self._file = gzip.open(self._path + _ACTIVE_SUFFIX, 'wb', compresslevel=6)
+            self._written = 0
+
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        self._file.write(line)
+        self._written += len(line)
+        if self._written >= self.segment_bytes:
+            self._finish_segment()
+
+    def _finish_segment(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.replace(self._path + _ACTIVE_SUFFIX, self._path)
+
+        segments = sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)))
+        for path in segments[:max(0, len(segments) - self.max_segments)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def read_capture(source: Union[str, Iterable[str]], include_active: bool = False) -> Iterator[Dict[str, Any]]:
+    # Streams records from a capture directory (oldest segment first) or
+    # from the given segment files. A segment still being written is cut off
+    # mid-stream; its complete lines are returned when include_active is set
+    if isinstance(source, str):
+        paths = sorted(glob.glob(os.path.join(source, SEGMENT_PATTERN)))
+        if include_active:
+            paths = sorted(paths + glob.glob(os.path.join(source, SEGMENT_PATTERN + _ACTIVE_SUFFIX)))
+    else:
+        paths = list(source)
+
+    for path in paths:
+        with gzip.open(path, 'rb') as f:
+            try:
+                for line in f:
+                    if line.endswith(b'\n'):
+                        yield json.loads(line)
+            except EOFError:
+                continue
+
+
+def request_body(record: Dict[str, Any]) -> bytes:
+    if record.get('body_encoding') == 'base64':
+        return base64.b64decode(record['body'])
+    return record['body'].encode()
+
+
+_writer: Optional[CaptureWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_capture_writer(config) -> Optional[CaptureWriter]:
+    # None unless CAPTURE_ENABLED is set; one writer per process
+    global _writer
+    if not config.capture_enabled:
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = CaptureWriter(config.capture_dir, config.capture_segment_bytes,
+                                    config.capture_max_segments, config.capture_queue_size)
+        return _writer
+
+
+@atexit.register
+def _close_writer() -> None:
+    if _writer is not None:
+        _writer.close(timeout=5)
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
 
 class Config:
@@ -27,6 +27,14 @@ class Config:
         except ValueError:
             return default
 
+    @staticmethod
+    def get_float(key: str, default: float = 0.0) -> float:
+        value = os.environ.get(key, str(default))
+        try:
+            return float(value)
+        except ValueError:
+            return default
+
     @property
     def github_app_id(self) -> str:
         return self.get('GITHUB_APP_ID')
@@ -45,6 +53,10 @@ class Config:
         # Legacy - no longer required for multi-user mode
         return self.get_optional('GITHUB_USERNAME', '')
 
+    @property
+    def github_api_url(self) -> str:
+        return self.get_optional('GITHUB_API_URL', 'https://api.github.com')
+
     @property
     def slack_bot_token(self) -> str:
         return self.get('SLACK_BOT_TOKEN')
@@ -62,6 +74,10 @@ class Config:
     def slack_bot_name(self) -> str:
         return self.get_optional('SLACK_BOT_NAME', 'Marites')
 
+    @property
+    def slack_api_url(self) -> str:
+        return self.get_optional('SLACK_API_URL', 'https://www.slack.com/api/')
+
     @property
     def kv_rest_api_url(self) -> str:
         return self.get('KV_REST_API_URL')
@@ -70,11 +86,176 @@ class Config:
     def kv_rest_api_token(self) -> str:
         return self.get('KV_REST_API_TOKEN')
 
+    @property
+    def storage_backend(self) -> str:
+        # upstash (REST, the default), redis (native protocol), sqlite
+        # (single node, no external service) or memory
+        return self.get_optional('STORAGE_BACKEND', 'upstash').lower()
+
+    @property
+    def redis_url(self) -> str:
+        return self.get('REDIS_URL')
+
+    @property
+    def redis_pool_size(self) -> int:
+        return self.get_int('REDIS_POOL_SIZE', 8)
+
+    @property
+    def sqlite_path(self) -> str:
+        return self.get_optional('SQLITE_PATH', 'data/marites.db')
+
+    @property
+    def sqlite_sweep_interval(self) -> float:
+        return self.get_float('SQLITE_SWEEP_INTERVAL', 60.0)
+
     @property
     def app_secret_key(self) -> str:
         return self.get('APP_SECRET_KEY')
 
+    @property
+    def request_budget_seconds(self) -> float:
+        # Vercel's default function timeout is 10s; leave headroom to respond
+        return self.get_float('REQUEST_BUDGET_SECONDS', 9.0)
+
+    @property
+    def code_context_min_budget(self) -> float:
+        return self.get_float('CODE_CONTEXT_MIN_BUDGET', 3.0)
+
+    @property
+    def snippet_cache_bytes(self) -> int:
+        return self.get_int('SNIPPET_CACHE_BYTES', 4 * 1024 * 1024)
+
+    @property
+    def snippet_cache_kv(self) -> bool:
+        # Share rendered snippets across instances through the KV store
+        return self.get_bool('SNIPPET_CACHE_KV', False)
+
+    @property
+    def github_async_processing(self) -> bool:
+        # Acknowledge review comments and reviews with 202 and forward them
+        # on the per-PR ordered worker pool. Off by default: runtimes that
+        # freeze the process after the response would never run them
+        return self.get_bool('GITHUB_ASYNC_PROCESSING', False)
+
+    @property
+    def slack_async_processing(self) -> bool:
+        # Acknowledge commands and thread replies first and process them on
+        # background workers. Off by default: serverless runtimes freeze the
+        # process once the response is sent, so events are processed before
+        # it instead. Only for long-running servers
+        return self.get_bool('SLACK_ASYNC_PROCESSING', False)
+
+    @property
+    def notify_roles(self) -> Tuple[str, ...]:
+        # Who is notified of review comments and reviews, when registered:
+        # any of author, reviewers (requested), assignees and participants
+        # (earlier commenters in the same review thread)
+        value = self.get_optional('NOTIFY_ROLES', 'author,reviewers,assignees,participants')
+        return tuple(role.strip().lower() for role in value.split(',') if role.strip())
+
+    @property
+    def admission_limit(self) -> int:
+        # Webhook requests processed at once per instance; 0 disables
+        # admission control
+        return self.get_int('ADMISSION_LIMIT', 32)
+
+    @property
+    def admission_max_wait(self) -> float:
+        return self.get_float('ADMISSION_MAX_WAIT', 0.5)
+
+    @property
+    def admission_retry_after(self) -> int:
+        return self.get_int('ADMISSION_RETRY_AFTER', 5)
+
+    @property
+    def capture_enabled(self) -> bool:
+        # Record inbound webhooks, redacted, for replay; see src/utils/capture.py
+        return self.get_bool('CAPTURE_ENABLED', False)
+
+    @property
+    def capture_dir(self) -> str:
+        return self.get_optional('CAPTURE_DIR', '/tmp/marites-capture')
+
+    @property
+    def capture_segment_bytes(self) -> int:
+        return self.get_int('CAPTURE_SEGMENT_BYTES', 8 * 1024 * 1024)
+
+    @property
+    def capture_max_segments(self) -> int:
+        return self.get_int('CAPTURE_MAX_SEGMENTS', 50)
+
+    @property
+    def capture_queue_size(self) -> int:
+        # Requests waiting for the capture writer; beyond it they are dropped
+        return self.get_int('CAPTURE_QUEUE_SIZE', 1000)
+
+    @property
+    def outbox_max_attempts(self) -> int:
+        # Replays of a queued Slack delivery before it is dropped
+        return self.get_int('OUTBOX_MAX_ATTEMPTS', 12)
+
+    @property
+    def outbox_retry_base_seconds(self) -> float:
+        return self.get_float('OUTBOX_RETRY_BASE_SECONDS', 30.0)
+
+    @property
+    def outbox_retry_max_seconds(self) -> float:
+        return self.get_float('OUTBOX_RETRY_MAX_SECONDS', 3600.0)
+
+    @property
+    def outbox_batch_size(self) -> int:
+        return self.get_int('OUTBOX_BATCH_SIZE', 50)
+
+    @property
+    def cron_secret(self) -> str:
+        # Bearer token of scheduled calls to /outbox/replay; Vercel cron
+        # jobs send CRON_SECRET this way
+        return self.get_optional('CRON_SECRET', '')
+
+    @property
+    def profile_enabled(self) -> bool:
+        # Profile every webhook request; see src/utils/profiler.py
+        return self.get_bool('PROFILE_ENABLED', False)
+
+    @property
+    def profile_sample_rate(self) -> float:
+        return self.get_float('PROFILE_SAMPLE_RATE', 0.0)
+
+    @property
+    def profile_token(self) -> str:
+        # Requests with this value in X-Marites-Profile are profiled
+        return self.get_optional('PROFILE_TOKEN', '')
+
+    @property
+    def profile_dir(self) -> str:
+        return self.get_optional('PROFILE_DIR', '/tmp/marites-profiles')
+
+    @property
+    def profile_ring_size(self) -> int:
+        return self.get_int('PROFILE_RING_SIZE', 200)
+
+    @property
+    def profile_interval_ms(self) -> float:
+        return self.get_float('PROFILE_INTERVAL_MS', 5.0)
+
     @property
     def debug(self) -> bool:
         return self.get_bool('DEBUG', False)
 
+    @property
+    def log_format(self) -> str:
+        # text or json (one object per line, for log drains)
+        return self.get_optional('LOG_FORMAT', 'text').lower()
+
+    @property
+    def log_async(self) -> bool:
+        # Write log records on a background thread. Off by default: runtimes
+        # that freeze the process after the response would lose the records
+        # still queued
+        return self.get_bool('LOG_ASYNC', False)
+
+    @property
+    def log_sample_rate(self) -> float:
+        # Fraction of routine success messages written by high-volume loggers
+        return self.get_float('LOG_SAMPLE_RATE', 0.05)
+
@@ -0,0 +1,60 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def has_budget(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def timeout(self, default: float) -> float:
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'Request budget of {self.budget}s exhausted')
+        return min(default, remaining)
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar('deadline', default=None)
+
+
+def start_deadline(budget: float) -> Deadline:
+    deadline = Deadline(budget)
+    _current.set(deadline)
+    return deadline
+
+
+def clear_deadline() -> None:
+    _current.set(None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def call_timeout(default: float) -> float:
+    # Outside a request (scripts, background jobs) the client default applies
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    return deadline.timeout(default)
+
+
+def has_budget(seconds: float) -> bool:
+    deadline = _current.get()
+    if deadline is None:
+        return True
+    return deadline.has_budget(seconds)
@@ -1,26 +1,156 @@
+import atexit
+import itertools
+import json
 import logging
+import queue
 import sys
-from typing import Optional
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO
 
+from src.utils.config import Config
 
-def setup_logger(name: str = 'marites', level: Optional[int] = None) -> logging.Logger:
-    if level is None:
-        level = logging.INFO
+# Loggers whose INFO records are routine successes on every request; only a
+# sample of them is written
+HIGH_VOLUME_LOGGERS = ('src.storage.kv_store',)
+
+_ROOT_LOGGERS = ('marites', 'src')
+_TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None), BaseException)
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, _DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps one in every `interval` records below WARNING; warnings and
+    # errors always pass. A counter rather than random() keeps it cheap and
+    # the output predictable
+    def __init__(self, rate: float):
+        super().__init__()
+        self.interval = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if not self.interval:
+            return False
+        return next(self._counter) % self.interval == 0
+
+
+class _EnqueueHandler(QueueHandler):
+    # The stock QueueHandler formats the message on the calling thread;
+    # records are queued as they are and formatted by the writer thread.
+    # Mutable arguments could change before then, so those messages and
+    # tracebacks are still rendered here
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args if isinstance(record.args, tuple) else (record.args,)
+        if record.args and not all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _formatter(log_format: str) -> logging.Formatter:
+    if log_format == 'json':
+        return JsonFormatter()
+    return logging.Formatter(_TEXT_FORMAT, datefmt=_DATE_FORMAT)
 
+
+def sample_logger(name: str, rate: float) -> None:
     logger = logging.getLogger(name)
-    logger.setLevel(level)
+    for existing in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+        logger.removeFilter(existing)
+    if rate < 1:
+        logger.addFilter(SamplingFilter(rate))
+
 
-    if not logger.handlers:
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setLevel(level)
+def configure_logging(level: Optional[int] = None, log_format: Optional[str] = None,
+                      asynchronous: Optional[bool] = None,
+                      sample_rates: Optional[Dict[str, float]] = None,
+                      stream: Optional[TextIO] = None) -> None:
+    # One pipeline for the process. With LOG_ASYNC the app's loggers hand
+    # records to a queue and a background thread writes them, so a slow
+    # stdout never blocks a request thread; otherwise they are written on
+    # the calling thread, which is what runtimes that freeze the process
+    # after the response need
+    global _configured, _listener
+    config = Config()
+    if level is None:
+        level = logging.DEBUG if config.debug else logging.INFO
+    if log_format is None:
+        log_format = config.log_format
+    if asynchronous is None:
+        asynchronous = config.log_async
+    if sample_rates is None:
+        sample_rates = {name: config.log_sample_rate for name in HIGH_VOLUME_LOGGERS}
 
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        handler.setFormatter(formatter)
+    with _configure_lock:
+        if _listener:
+            _listener.stop()
+            _listener = None
 
-        logger.addHandler(handler)
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(_formatter(log_format))
+        if asynchronous:
+            records: 'queue.SimpleQueue[logging.LogRecord]' = queue.SimpleQueue()
+            handler: logging.Handler = _EnqueueHandler(records)
+            _listener = QueueListener(records, writer)
+            _listener.start()
+        else:
+            handler = writer
+
+        for name in _ROOT_LOGGERS:
+            logger = logging.getLogger(name)
+            for existing in list(logger.handlers):
+                logger.removeHandler(existing)
+            logger.addHandler(handler)
+            logger.setLevel(level)
+            logger.propagate = False
+        for name, rate in sample_rates.items():
+            sample_logger(name, rate)
+        _configured = True
+
+
+def flush_logging() -> None:
+    # Drains the queue; the writer thread is restarted for later records
+    with _configure_lock:
+        if _listener:
+            _listener.stop()
+            _listener.start()
 
-    return logger
 
+@atexit.register
+def _stop_listener() -> None:
+    if _listener:
+        _listener.stop()
+
+
+def setup_logger(name: str = 'marites', level: Optional[int] = None) -> logging.Logger:
+    if not _configured:
+        configure_logging()
+
+    logger = logging.getLogger(name)
+    if level is not None:
+        logger.setLevel(level)
+    return logger
@@ -0,0 +1,115 @@
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from src.utils.logger import setup_logger
+
+logger = setup_logger()
+
+_Job = Tuple[Hashable, Future, Callable[..., Any], tuple, dict]
+
+
+class _Lane:
+    def __init__(self, pool: 'OrderedWorkerPool', index: int):
+        self.pool = pool
+        self.index = index
+        self.jobs: Deque[_Job] = deque()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+
+    def push(self, job: _Job) -> None:
+        with self.condition:
+            self.jobs.append(job)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True,
+                                               name=f'{self.pool.thread_name_prefix}-{self.index}')
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.jobs and not self.pool.closed:
+                    self.condition.wait()
+                if not self.jobs:
+                    return
+                # Take everything queued so far in one go; the lock is not
+                # touched again until the batch is done
+                batch = [self.jobs.popleft() for _ in range(min(len(self.jobs), self.pool.batch_size))]
+
+            for key, future, func, args, kwargs in batch:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(func(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+                self.pool.done(key)
+
+
+# Runs jobs in parallel across partitions and strictly in submission order
+# within one. A job's key (e.g. repo and PR number) is hashed to one of
+# `width` lanes, each drained by a single thread, so two events on the same
+# PR never run at the same time or overtake each other, while events on
+# different PRs do not wait for one another.
+class OrderedWorkerPool:
+    def __init__(self, width: int, thread_name_prefix: str = 'marites-ordered', batch_size: int = 32):
+        self.width = max(1, width)
+        self.thread_name_prefix = thread_name_prefix
+        self.batch_size = batch_size
+        self.closed = False
+        self._lanes = [_Lane(self, i) for i in range(self.width)]
+        self._backlog: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def partition(self, key: Hashable) -> int:
+        # crc32 rather than hash(): string hashes are salted per process
+        return zlib.crc32(repr(key).encode()) % self.width
+
+    def submit(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self.closed:
+                raise RuntimeError('cannot submit to an ordered pool after shutdown')
+            self._backlog[key] = self._backlog.get(key, 0) + 1
+        self._lanes[self.partition(key)].push((key, future, func, args, kwargs))
+        return future
+
+    def done(self, key: Hashable) -> None:
+        with self._lock:
+            remaining = self._backlog.get(key, 0) - 1
+            if remaining > 0:
+                self._backlog[key] = remaining
+            else:
+                self._backlog.pop(key, None)
+
+    def backlog(self) -> Dict[Hashable, int]:
+        # Jobs queued or running, per partition key
+        with self._lock:
+            return dict(self._backlog)
+
+    def lane_backlog(self) -> List[int]:
+        return [len(lane.jobs) for lane in self._lanes]
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None) -> bool:
+        # Stops accepting jobs; the lanes finish what is queued and exit.
+        # Returns False if they had not drained within the timeout
+        with self._lock:
+            self.closed = True
+        for lane in self._lanes:
+            with lane.condition:
+                lane.condition.notify_all()
+        if not wait:
+            return True
+
+        until = None if timeout is None else time.monotonic() + timeout
+        for lane in self._lanes:
+            if lane.thread is None:
+                continue
+            lane.thread.join(None if until is None else max(0.0, until - time.monotonic()))
+            if lane.thread.is_alive():
+                logger.warning('Ordered pool shut down with %s job(s) still queued', sum(self.backlog().values()))
+                return False
+        return True
@@ -0,0 +1,180 @@
+import functools
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+from src.utils.config import Config
+from src.utils.logger import setup_logger
+
+logger = setup_logger()
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_MAX_DEPTH = 64
+
+# The innermost Python frame of a thread blocked in C is the stdlib or
+# urllib3 wrapper that called it, so samples are classified by that frame
+_NETWORK_FILES = ('socket.py', 'ssl.py', 'selectors.py', os.path.join('http', 'client.py'),
+                  os.path.join('urllib3', 'util', 'wait.py'))
+_WAIT_FILES = ('threading.py', 'queue.py', '<frozen importlib._bootstrap>')
+
+
+def _location(code) -> str:
+    path = code.co_filename
+    if 'site-packages' + os.sep in path:
+        path = path.split('site-packages' + os.sep, 1)[1]
+    elif path.startswith(_ROOT):
+        path = os.path.relpath(path, _ROOT)
+    else:
+        path = os.path.basename(path)
+    return f'{code.co_name} ({path}:{code.co_firstlineno})'
+
+
+def _classify(frame) -> str:
+    filename = frame.f_code.co_filename
+    if filename.endswith(_NETWORK_FILES):
+        return 'network'
+    if filename.endswith(_WAIT_FILES):
+        return 'wait'
+    return 'cpu'
+
+
+class Profile:
+    def __init__(self, name: str, thread_id: int, interval: float):
+        self.name = name
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.activity: Counter = Counter()
+        self.started_at = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def sample(self, frame) -> None:
+        self.activity[_classify(frame)] += 1
+        stack = []
+        while frame is not None and len(stack) < _MAX_DEPTH:
+            stack.append(_location(frame.f_code))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def finish(self) -> None:
+        # thread_time is per thread, so this runs on the profiled thread
+        self.wall = time.perf_counter() - self._wall_start
+        self.cpu = time.thread_time() - self._cpu_start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'handler': self.name,
+            'started_at': self.started_at,
+            'wall_ms': self.wall * 1000,
+            'cpu_ms': self.cpu * 1000,
+            'interval_ms': self.interval * 1000,
+            'samples': sum(self.activity.values()),
+            'activity': dict(self.activity),
+            'stacks': dict(self.stacks),
+        }
+
+
+# One sampler thread for the process reads the stacks of every profiled
+# thread from sys._current_frames() at a fixed interval, and sleeps while
+# nothing is being profiled. The profiled code itself runs untouched.
+class _Sampler:
+    def __init__(self):
+        self._profiles: Dict[int, Profile] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile) -> None:
+        with self._condition:
+            self._profiles[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='marites-profiler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def remove(self, profile: Profile) -> None:
+        with self._condition:
+            self._profiles.pop(profile.thread_id, None)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._profiles:
+                    self._condition.wait()
+                profiles = list(self._profiles.values())
+            frames = sys._current_frames()
+            for profile in profiles:
+                frame = frames.get(profile.thread_id)
+                if frame is not None:
+                    profile.sample(frame)
+            del frames
+            time.sleep(min(profile.interval for profile in profiles))
+
+
+_sampler = _Sampler()
+_write_lock = threading.Lock()
+
+
+def _should_profile(config: Config, headers) -> bool:
+    if config.profile_enabled:
+        return True
+    token = config.profile_token
+    if token and headers is not None:
+        # Constant time, so the token cannot be guessed from response times
+        if hmac.compare_digest(headers.get('X-Marites-Profile', '').encode(), token.encode()):
+            return True
+    rate = config.profile_sample_rate
+    return rate > 0 and random.random() < rate
+
+
+def _write(config: Config, profile: Profile) -> None:
+    # A bounded ring: each profile is its own file and the oldest are
+    # deleted once there are more than PROFILE_RING_SIZE
+    directory = config.profile_dir
+    with _write_lock:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{time.time_ns()}-{os.getpid()}-{profile.name}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(profile.to_dict(), f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+        profiles = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+        for name in profiles[:max(0, len(profiles) - config.profile_ring_size)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def profile_requests(name: str) -> Callable:
+    # Wraps a handler method; requests are profiled when PROFILE_ENABLED is
+    # set, when the X-Marites-Profile header carries PROFILE_TOKEN, or for a
+    # PROFILE_SAMPLE_RATE share of requests
+    def decorate(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            config = Config()
+            if not _should_profile(config, getattr(self, 'headers', None)):
+                return method(self, *args, **kwargs)
+
+            profile = Profile(name, threading.get_ident(), config.profile_interval_ms / 1000)
+            _sampler.add(profile)
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                _sampler.remove(profile)
+                profile.finish()
+                try:
+                    _write(config, profile)
+                except OSError as e:
+                    logger.warning('Could not write profile: %s', e)
+        return wrapper
+    return decorate
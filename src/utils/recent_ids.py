@@ -0,0 +1,31 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable
+
+
+# The last `capacity` ids seen by this process. A hit means the id was
+# claimed here recently; a miss says nothing, other instances may have
+# seen it, so callers fall back to a shared check.
+class RecentIds:
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self._ids: 'OrderedDict[Hashable, None]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, id: Hashable) -> bool:
+        # False if the id was already there
+        with self._lock:
+            if id in self._ids:
+                return False
+            self._ids[id] = None
+            if len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+            return True
+
+    def discard(self, id: Hashable) -> None:
+        with self._lock:
+            self._ids.pop(id, None)
+
+    def __contains__(self, id: Hashable) -> bool:
+        with self._lock:
+            return id in self._ids
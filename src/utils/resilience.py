@@ -0,0 +1,138 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.utils.deadline import DeadlineExceeded, current_deadline
+from src.utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str):
+        super().__init__(f'Circuit for {name} is open, failing fast')
+        self.name = name
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        # Full jitter: concurrent callers that failed together spread out
+        # instead of retrying in lockstep against a struggling dependency
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+NO_RETRY = RetryPolicy(attempts=1)
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let a single probe through; everyone else keeps failing fast
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info('Circuit for %s closed', self.name)
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def release(self) -> None:
+        # A probe that ended without an answer (e.g. the request ran out of
+        # budget) must not leave the breaker stuck half-open
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning('Circuit for %s opened after %s failures', self.name, self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    # Breakers live at module level so they survive across requests handled
+    # by the same (warm) process
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+            _breakers[name] = breaker
+        return breaker
+
+
+def call_with_resilience(breaker: CircuitBreaker, func: Callable[..., Any], *args,
+                         retry: Optional[RetryPolicy] = None,
+                         is_transient: Optional[Callable[[Exception], bool]] = None,
+                         **kwargs) -> Any:
+    retry = retry or NO_RETRY
+
+    for attempt in range(retry.attempts):
+        if not breaker.allow():
+            raise CircuitOpenError(breaker.name)
+
+        try:
+            result = func(*args, **kwargs)
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        except Exception as e:
+            if is_transient is not None and not is_transient(e):
+                # The dependency answered; the request itself was bad
+                breaker.record_success()
+                raise
+
+            breaker.record_failure()
+            if attempt + 1 >= retry.attempts:
+                raise
+
+            delay = retry.delay(attempt)
+            deadline = current_deadline()
+            if deadline is not None and deadline.remaining() <= delay:
+                raise
+
+            logger.warning('%s call failed (%s), retry %s in %.2fs', breaker.name, e, attempt + 1, delay)
+            time.sleep(delay)
+            continue
+
+        breaker.record_success()
+        return result
@@ -0,0 +1,58 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from src.utils.deadline import DeadlineExceeded, current_deadline
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+# Coalesces concurrent calls with the same key into one execution: the
+# first caller runs the function, callers arriving while it is in flight
+# wait for it and share its result or exception. Nothing is cached once the
+# call completes.
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            return self._wait(call)
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    @staticmethod
+    def _wait(call: _Call) -> Any:
+        # Followers still honour their own request deadline
+        deadline = current_deadline()
+        timeout = max(deadline.remaining(), 0) if deadline is not None else None
+        if not call.done.wait(timeout):
+            raise DeadlineExceeded('Request budget exhausted waiting for in-flight call')
+        if call.error is not None:
+            raise call.error
+        return call.result
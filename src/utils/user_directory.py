@@ -0,0 +1,142 @@
+import csv
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from src.utils.logger import setup_logger
+
+if TYPE_CHECKING:
+    from src.slack.client import SlackClient
+    from src.storage import KVStore
+
+logger = setup_logger()
+
+_GITHUB_LOGIN = re.compile(r'^[A-Za-z0-9](?:[A-Za-z0-9-]{0,38})$')
+
+
+def normalize_github_username(value: Optional[str]) -> Optional[str]:
+    # Accepts "octocat", "@octocat" and "https://github.com/octocat"
+    if not value:
+        return None
+    value = value.strip().rstrip('/')
+    if '/' in value:
+        value = value.rsplit('/', 1)[-1]
+    value = value.lstrip('@')
+    return value if _GITHUB_LOGIN.match(value) else None
+
+
+def load_csv_mappings(path: str) -> Dict[str, str]:
+    # Columns: github_username plus slack_user_id and/or email. Keys are
+    # Slack user IDs as-is and emails lowercased
+    mappings = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+            github_username = row.get('github_username') or row.get('github')
+            for key in (row.get('slack_user_id'), (row.get('email') or '').lower()):
+                if key and github_username:
+                    mappings[key] = github_username
+    return mappings
+
+
+def _is_person(member: Dict[str, Any]) -> bool:
+    return not member.get('is_bot') and not member.get('is_app_user') and member.get('id') != 'USLACKBOT'
+
+
+def _profile_field(profile: Optional[Dict[str, Any]], field_id: str) -> Optional[str]:
+    fields = (profile or {}).get('fields') or {}
+    return (fields.get(field_id) or {}).get('value')
+
+
+def _match_from_profiles(slack_client: 'SlackClient', members: List[Dict[str, Any]],
+                         field_id: str, workers: int) -> Dict[str, Optional[str]]:
+    # users.list leaves custom fields out, so they cost one users.profile.get
+    # per member unless the listing happened to include them
+    matches = {}
+    missing = []
+    for member in members:
+        value = _profile_field(member.get('profile'), field_id)
+        if value:
+            matches[member['id']] = value
+        else:
+            missing.append(member['id'])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        profiles = pool.map(slack_client.get_user_profile, missing)
+        for user_id, profile in zip(missing, profiles):
+            matches[user_id] = _profile_field(profile, field_id)
+    return matches
+
+
+def sync_users(slack_client: 'SlackClient', kv_store: 'KVStore',
+               csv_mappings: Optional[Dict[str, str]] = None,
+               profile_field: Optional[str] = None, prune: bool = False,
+               dry_run: bool = False, profile_workers: int = 8) -> Dict[str, Any]:
+    members = list(slack_client.list_users())
+    people = [member for member in members if _is_person(member)]
+    active = [member for member in people if not member.get('deleted')]
+    logger.info('Directory sync: %s Slack members, %s active people', len(members), len(active))
+
+    matches: Dict[str, Optional[str]] = {}
+    if profile_field:
+        matches.update(_match_from_profiles(slack_client, active, profile_field, profile_workers))
+    if csv_mappings:
+        # The CSV wins over profile fields: it is the explicit override
+        for member in active:
+            email = ((member.get('profile') or {}).get('email') or '').lower()
+            github_username = csv_mappings.get(member['id']) or csv_mappings.get(email)
+            if github_username:
+                matches[member['id']] = github_username
+
+    current = kv_store.get_user_mappings([member['id'] for member in people])
+
+    report: Dict[str, Any] = {
+        'added': [], 'changed': [], 'unchanged': 0, 'unmatched': 0,
+        'invalid': [], 'unknown': [], 'removed': [], 'saved': 0,
+    }
+    to_register = []
+    for member in active:
+        user_id = member['id']
+        raw = matches.get(user_id)
+        if not raw:
+            report['unmatched'] += 1
+            continue
+        github_username = normalize_github_username(raw)
+        if not github_username:
+            report['invalid'].append({'slack_user_id': user_id, 'value': raw})
+            continue
+
+        existing = (current.get(user_id) or {}).get('github_username')
+        if existing == github_username:
+            report['unchanged'] += 1
+            continue
+        if existing:
+            report['changed'].append({'slack_user_id': user_id, 'from': existing, 'to': github_username})
+        else:
+            report['added'].append({'slack_user_id': user_id, 'github_username': github_username})
+        to_register.append((user_id, github_username, {
+            'github_username': github_username,
+            'slack_user_id': user_id,
+            'active': True
+        }))
+
+    if csv_mappings:
+        known = {member['id'] for member in people}
+        known.update(((member.get('profile') or {}).get('email') or '').lower() for member in people)
+        report['unknown'] = sorted(key for key in csv_mappings if key not in known)
+
+    if prune:
+        # Only deactivated Slack accounts; people who registered themselves
+        # but are missing from the mapping source are left alone
+        report['removed'] = [member['id'] for member in people
+                             if member.get('deleted') and current.get(member['id'])]
+
+    if not dry_run:
+        report['saved'] = kv_store.register_users(to_register)
+        if report['removed']:
+            kv_store.unregister_users(report['removed'])
+
+    logger.info('Directory sync: %s added, %s changed, %s unchanged, %s removed%s',
+                len(report['added']), len(report['changed']), report['unchanged'],
+                len(report['removed']), ' (dry run)' if dry_run else '')
+    return report
@@ -1,12 +1,18 @@
-from typing import Optional, Dict
-from src.storage import KVStore
-from src.utils import setup_logger
+from typing import Optional, Dict, List, TYPE_CHECKING
+from src.utils.logger import setup_logger
+from src.utils.singleflight import SingleFlight
+
+if TYPE_CHECKING:
+    from src.storage import KVStore
 
 logger = setup_logger()
 
+# A burst of webhooks for the same PR looks up the same author concurrently
+_flights = SingleFlight()
+
 
 class UserManager:
-    def __init__(self, kv_store: KVStore):
+    def __init__(self, kv_store: 'KVStore'):
         self.kv_store = kv_store
 
     def register_user(self, slack_user_id: str, github_username: str) -> bool:
@@ -16,39 +22,25 @@ class UserManager:
             'active': True
         }
 
-        if not self.kv_store.save_user_mapping(slack_user_id, user_data):
-            logger.error(f'Failed to save Slack ID mapping for {slack_user_id}')
-            return False
-
-        if not self.kv_store.save_github_to_slack_mapping(github_username, slack_user_id):
-            logger.error(f'Failed to save GitHub username mapping for {github_username}')
-            self.kv_store.delete_user_mapping(slack_user_id)
+        if not self.kv_store.register_user(slack_user_id, github_username, user_data):
+            logger.error('Failed to register %s as %s', slack_user_id, github_username)
             return False
 
-        logger.info(f'User registered: GitHub={github_username}, Slack={slack_user_id}')
+        logger.info('User registered: GitHub=%s, Slack=%s', github_username, slack_user_id)
         return True
 
     def unregister_user(self, slack_user_id: str) -> bool:
-        user_data = self.kv_store.get_user_mapping(slack_user_id)
-        if not user_data:
-            logger.warning(f'Attempted to unregister non-existent user: {slack_user_id}')
+        user_data = self.kv_store.unregister_user(slack_user_id)
+        if user_data is None:
+            logger.warning('Attempted to unregister non-existent user: %s', slack_user_id)
             return False
 
-        github_username = user_data.get('github_username')
-
-        if not self.kv_store.delete_user_mapping(slack_user_id):
-            logger.error(f'Failed to delete Slack ID mapping for {slack_user_id}')
-            return False
-
-        if github_username and not self.kv_store.delete_github_to_slack_mapping(github_username):
-            logger.error(f'Failed to delete GitHub username mapping for {github_username}')
-            return False
-
-        logger.info(f'User unregistered: GitHub={github_username}, Slack={slack_user_id}')
+        logger.info('User unregistered: GitHub=%s, Slack=%s', user_data.get('github_username'), slack_user_id)
         return True
 
     def get_user_by_slack(self, slack_user_id: str) -> Optional[Dict]:
-        return self.kv_store.get_user_mapping(slack_user_id)
+        return _flights.do(('user:slack', slack_user_id),
+                           self.kv_store.get_user_mapping, slack_user_id)
 
     def get_user_by_github(self, github_username: str) -> Optional[Dict]:
         slack_user_id = self.kv_store.get_github_to_slack_mapping(github_username)
@@ -57,7 +49,41 @@ class UserManager:
         return self.kv_store.get_user_mapping(slack_user_id)
 
     def get_slack_user_id(self, github_username: str) -> Optional[str]:
-        return self.kv_store.get_github_to_slack_mapping(github_username)
+        return _flights.do(('user:github', github_username),
+                           self.kv_store.get_github_to_slack_mapping, github_username)
+
+    def get_slack_user_ids(self, github_usernames: List[str]) -> Dict[str, Optional[str]]:
+        return self.kv_store.get_github_to_slack_mappings(github_usernames)
+
+    def resolve_recipients(self, github_usernames: List[str], exclude: str = '',
+                           thread_root: Optional[int] = None) -> Dict[str, str]:
+        # The registered Slack users to notify, mapped to their GitHub login,
+        # in the order the logins were given and then the earlier
+        # participants of thread_root's review thread. One entry per Slack
+        # user, and none for `exclude`, who caused the event
+        key = ('recipients', tuple(github_usernames), exclude, thread_root)
+        return dict(_flights.do(key, self._resolve_recipients, github_usernames, exclude, thread_root))
+
+    def _resolve_recipients(self, github_usernames: List[str], exclude: str,
+                            thread_root: Optional[int]) -> Dict[str, str]:
+        logins = list(dict.fromkeys(login for login in github_usernames
+                                    if login and login.lower() != exclude.lower()))
+        if thread_root is None:
+            slack_user_ids = self.kv_store.get_github_to_slack_mappings(logins)
+        else:
+            participants, slack_user_ids = self.kv_store.get_thread_participants(thread_root, logins)
+            participants = [login for login in participants
+                            if login not in slack_user_ids and login.lower() != exclude.lower()]
+            if participants:
+                slack_user_ids.update(self.kv_store.get_github_to_slack_mappings(participants))
+                logins += participants
+
+        recipients: Dict[str, str] = {}
+        for login in logins:
+            slack_user_id = slack_user_ids.get(login)
+            if slack_user_id and slack_user_id not in recipients:
+                recipients[slack_user_id] = login
+        return recipients
 
     def get_github_username(self, slack_user_id: str) -> Optional[str]:
         user_data = self.kv_store.get_user_mapping(slack_user_id)